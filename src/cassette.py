@@ -0,0 +1,338 @@
+"""
+SAP SuccessFactors通信の記録と再生（カセット）
+実際のリクエスト/レスポンスを認証情報・個人情報を伏せてファイルに記録し、
+記録したレスポンスを元の（または倍率を掛けた）レイテンシで返すトランスポートを提供します
+テナントなしでペイロード構築・解析処理のベンチマークやプロファイリングを再現するために使用します
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+from urllib.parse import urlsplit, parse_qsl, unquote, urlencode, quote
+
+import requests
+from requests.exceptions import RequestException
+
+from .config.settings import get_settings
+from .odata_batch import _boundary
+from .timing import RequestTimingRecorder
+from .transport import TransportStats
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+
+# request()の引数名jsonがモジュール名を隠すため別名で参照する
+_dumps = json.dumps
+
+
+# ODataの文字列リテラル（'はエスケープとして''と書く）
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+# $countのレスポンス（数値のみのテキスト）は伏せずに記録する
+_NUMBER = re.compile(r"\s*-?\d+\s*")
+
+
+def pseudonym(value: Any) -> str:
+    """値を決定的な仮名に置き換える（既に仮名の値はそのまま）
+
+    リクエストキーとボディで同じ仮名を使うため、再生時にボディから得た仮名で
+    リクエストしても記録したキーと一致します。
+    """
+    text = str(value)
+    if text.startswith("redacted-"):
+        return text
+    return f"redacted-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _mask_literals(text: str) -> str:
+    """文字列リテラルの値を仮名に置き換える"""
+    return _STRING_LITERAL.sub(
+        lambda match: "'" + pseudonym(match.group(0)[1:-1].replace("''", "'")) + "'",
+        text
+    )
+
+
+def _request_key(method: str, url: str, params: Optional[Dict[str, Any]]) -> str:
+    """リクエストの照合キー（メソッドとパス・クエリ、ホストは含めない）
+
+    $filterの値やキー述語（User('...')）の文字列リテラルは個人情報を含むため、
+    ハッシュに置き換えてから記録します。
+    """
+    prepared = requests.Request(method.upper(), url, params=params).prepare()
+    parts = urlsplit(prepared.url)
+    path = quote(_mask_literals(unquote(parts.path)), safe="/$,'()=")
+    pairs = [(name, _mask_literals(value)) for name, value in parse_qsl(parts.query, keep_blank_values=True)]
+    query = "?" + urlencode(pairs, quote_via=quote, safe="$,'()") if pairs else ""
+    return f"{method.upper()} {path}{query}"
+
+
+class Redactor:
+    """JSON内の個人情報フィールドを決定的な仮名に置き換える
+
+    同じ値は同じ仮名になるため、記録内での参照関係（同じユーザーが複数のレスポンスに
+    現れる等）は保たれます。userId等のIDはリクエストキーの文字列リテラルと同じ仮名になり、
+    __metadata・__deferredのuriに含まれるキー述語（User('...')）も同様に置き換えます。
+    """
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = {field.lower() for field in fields}
+
+    def pseudonym(self, value: Any) -> str:
+        return pseudonym(value)
+
+    def redact(self, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {key: self._redact_property(key, value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self.redact(item) for item in data]
+        return data
+
+    def _redact_property(self, key: str, value: Any) -> Any:
+        if key.lower() in self.fields and value not in (None, ""):
+            return self.pseudonym(value)
+        if key == 'uri' and isinstance(value, str):
+            return _mask_literals(value)
+        return self.redact(value)
+
+    def redact_body(self, body: Optional[bytes], content_type: Optional[str] = None) -> Optional[str]:
+        """ボディを伏せ字にした文字列を返す
+
+        multipart（$batch）の場合はパートごとのJSONを伏せ字にします。
+        解析できないボディは、$countの数値と$metadataを除いて全体を仮名に置き換えます。
+        """
+        if not body:
+            return None
+        text = body.decode('utf-8', errors='replace') if isinstance(body, (bytes, bytearray)) else body
+        boundary = _boundary(content_type) if (content_type or "").startswith('multipart/') else None
+        if boundary:
+            return self._redact_multipart(text.replace("\r\n", "\n"), boundary)
+        return self._redact_text(text)
+
+    def _redact_text(self, text: str) -> str:
+        try:
+            return json.dumps(self.redact(json.loads(text)), ensure_ascii=False)
+        except ValueError:
+            pass
+        if _NUMBER.fullmatch(text) or '<edmx:Edmx' in text:
+            return text
+        return self.pseudonym(text)
+
+    def _redact_multipart(self, text: str, boundary: str) -> str:
+        delimiter = f"--{boundary}"
+        sections = text.split(delimiter)
+        redacted = [sections[0]]
+        for part in sections[1:]:
+            if part.startswith("--"):
+                # 終端の区切り以降
+                redacted.append(part)
+                continue
+            head, separator, payload = part.partition("\n\n")
+            content_type = ""
+            for line in head.split("\n"):
+                key, _, value = line.partition(':')
+                if key.strip().lower() == 'content-type':
+                    content_type = value.strip()
+            if content_type.startswith('multipart/'):
+                # チェンジセット
+                payload = self._redact_multipart(payload, _boundary(content_type) or "")
+            else:
+                # application/http: ステータス行・ヘッダーとボディ
+                message_head, message_separator, message_body = payload.partition("\n\n")
+                content = message_body.strip()
+                if content:
+                    message_body = self._redact_text(content) + message_body[len(message_body.rstrip()):]
+                payload = message_head + message_separator + message_body
+            redacted.append(head + separator + payload)
+        return delimiter.join(redacted)
+
+
+class RecordingTransport:
+    """実際のトランスポートを経由した通信をカセットファイルに追記するトランスポート
+
+    request以外の属性（warm_up, stats, timings等）は元のトランスポートに委譲します。
+    Authorizationヘッダーは記録しません。
+    """
+
+    def __init__(self, inner, path: str, redactor: Redactor):
+        self._inner = inner
+        self.path = path
+        self.redactor = redactor
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        logger.info(f"Recording SAP traffic to {path}")
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 30,
+        body: Optional[bytes] = None
+    ):
+        started = time.perf_counter()
+        response = self._inner.request(
+            method, url, params=params, json=json, headers=headers, timeout=timeout, body=body
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        interaction = {
+            'key': _request_key(method, url, params),
+            'request_body': self.redactor.redact(json) if json is not None else None,
+            'status_code': response.status_code,
+            'content_type': response.headers.get('Content-Type'),
+            'body': self.redactor.redact_body(response.content, response.headers.get('Content-Type')),
+            'elapsed_ms': round(elapsed_ms, 3),
+            'ttfb_ms': round(response.timings.get('ttfb_ms') or elapsed_ms, 3)
+        }
+        line = _dumps(interaction, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        return response
+
+
+class _ReplayResponse:
+    """記録したレスポンスをrequests互換のインターフェースで返す"""
+
+    def __init__(self, interaction: Dict[str, Any], url: str, elapsed_ms: float, ttfb_ms: float):
+        body = interaction.get('body')
+        self.status_code = interaction['status_code']
+        self.headers = {'Content-Type': interaction.get('content_type') or 'application/json'}
+        self.content = body.encode('utf-8') if body is not None else b''
+        self.text = body or ''
+        self.url = url
+        self.ok = self.status_code < 400
+        self.elapsed = timedelta(milliseconds=ttfb_ms)
+        self.request = SimpleNamespace(body=None)
+        self.timings: Dict[str, Any] = {
+            'connect_ms': None,
+            'tls_ms': None,
+            'tls_session_reused': None,
+            'ttfb_ms': ttfb_ms,
+            'body_ms': max(elapsed_ms - ttfb_ms, 0.0),
+            'http_version': 'replay',
+            'request_bytes': 0,
+            'response_bytes': len(self.content)
+        }
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ReplayTransport:
+    """カセットファイルに記録されたレスポンスを返すトランスポート
+
+    リクエストはメソッドとパス・クエリで照合し、同じキーの記録が複数ある場合は記録順に返します
+    （最後まで返したら先頭に戻ります）。記録にないリクエストは通信エラーとして扱います。
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        """トランスポートの初期化
+
+        Args:
+            path: カセットファイルのパス
+            latency_scale: 記録時のレイテンシに掛ける倍率（0で待機しない）
+        """
+        self.path = path
+        self.latency_scale = latency_scale
+        self.base_url = "replay"
+        self.http2 = False
+        self.headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        self.stats = TransportStats()
+        self.timings = RequestTimingRecorder()
+        self._interactions: Dict[str, List[Dict[str, Any]]] = {}
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions.setdefault(interaction['key'], []).append(interaction)
+        logger.info(
+            f"Replaying SAP traffic from {path} "
+            f"({sum(len(items) for items in self._interactions.values())} interactions, "
+            f"latency x{latency_scale})"
+        )
+
+    def _next(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                return None
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return interactions[position % len(interactions)]
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 30,
+        body: Optional[bytes] = None
+    ) -> _ReplayResponse:
+        key = _request_key(method, url, params)
+        interaction = self._next(key)
+        if interaction is None:
+            raise RequestException(f"No recorded interaction for {key}")
+
+        elapsed_ms, ttfb_ms = self._scaled_latency(interaction)
+        if elapsed_ms > 0:
+            time.sleep(elapsed_ms / 1000)
+
+        response = _ReplayResponse(interaction, url, elapsed_ms, ttfb_ms)
+        self.stats.record(response.timings)
+        return response
+
+    def _scaled_latency(self, interaction: Dict[str, Any]) -> Tuple[float, float]:
+        elapsed_ms = (interaction.get('elapsed_ms') or 0.0) * self.latency_scale
+        ttfb_ms = (interaction.get('ttfb_ms') or 0.0) * self.latency_scale
+        return elapsed_ms, min(ttfb_ms, elapsed_ms)
+
+    def warm_up(self, connections: Optional[int] = None) -> Dict[str, Any]:
+        return {'opened': 0, 'elapsed_ms': 0.0}
+
+    def start_keepalive(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def wrap_transport(base_url: str, create):
+    """設定値に従って記録・再生用のトランスポートを返す
+
+    Args:
+        base_url: SAP APIのベースURL
+        create: 実際のトランスポートを作成する関数（base_urlを受け取る）
+    """
+    settings = get_settings()
+    mode = settings.sap_cassette_mode
+    if not mode:
+        return create(base_url)
+    if mode not in CASSETTE_MODES:
+        raise ValueError(f"不正なカセットモードです: {mode}（{', '.join(CASSETTE_MODES)}のいずれか）")
+
+    if mode == "replay":
+        return ReplayTransport(settings.sap_cassette_path, latency_scale=settings.sap_cassette_latency_scale)
+
+    redactor = Redactor(field.strip() for field in settings.sap_cassette_redact_fields.split(',') if field.strip())
+    return RecordingTransport(create(base_url), settings.sap_cassette_path, redactor)
+
+# Made with Bob
@@ -0,0 +1,411 @@
+"""
+同時実行制御モジュール
+SAP APIへのリクエストレートを制限するトークンバケットと、
+エンドポイント種別ごとに同時実行数を適応的に制御するバルクヘッドを提供します
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Deque, Iterable
+
+from .config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# エンドポイント種別
+FAMILY_LIST = "list"
+FAMILY_LOOKUP = "lookup"
+FAMILY_WRITE = "write"
+FAMILY_GROUP = "group"
+
+
+class RateLimiter:
+    """トークンバケット方式のレートリミッター（スレッドセーフ）"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """レートリミッターの初期化
+
+        Args:
+            rate: 1秒あたりの最大リクエスト数（0以下の場合は無制限）
+            burst: バケット容量（省略時はrateの切り上げ値）
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(int(rate + 0.999), 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """トークンを1つ取得（不足している場合は補充されるまで待機）
+
+        Returns:
+            待機した秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class BulkheadFullError(Exception):
+    """バルクヘッドの待ち行列が上限に達した"""
+    pass
+
+
+class AdaptiveLimiter:
+    """AIMD方式で同時実行数の上限を調整するバルクヘッド
+
+    レイテンシが目標値以内で成功している間は上限を加算的に増やし、
+    429/5xxや通信エラーを受けた場合は乗算的に減らします。
+    上限を超えたリクエストは待ち行列で待機します。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        latency_target_ms: float = 2000,
+        max_queue: int = 100,
+        backoff_ratio: float = 0.5
+    ):
+        """バルクヘッドの初期化
+
+        Args:
+            name: エンドポイント種別名
+            initial_limit: 初期の同時実行数上限
+            min_limit: 同時実行数上限の下限
+            max_limit: 同時実行数上限の上限
+            latency_target_ms: 健全とみなすレイテンシ（ミリ秒）
+            max_queue: 待ち行列の最大長（超えた場合はBulkheadFullError）
+            backoff_ratio: スロットリング時に上限へ掛ける係数
+        """
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target_ms = latency_target_ms
+        self.max_queue = max_queue
+        self.backoff_ratio = backoff_ratio
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+        self.queued = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.completed = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None) -> float:
+        """実行枠を取得（空きがない場合は待機）
+
+        Args:
+            timeout: 最大待機秒数（Noneの場合は無制限）
+
+        Returns:
+            待機した秒数
+
+        Raises:
+            BulkheadFullError: 待ち行列が満杯、またはタイムアウトした場合
+        """
+        started = time.monotonic()
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return 0.0
+
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise BulkheadFullError(f"Bulkhead '{self.name}' queue is full ({self.queued})")
+
+            self.queued += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    remaining = None if timeout is None else timeout - (time.monotonic() - started)
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise BulkheadFullError(f"Bulkhead '{self.name}' wait timed out")
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+            finally:
+                self.queued -= 1
+
+        return time.monotonic() - started
+
+    def release(self, latency_ms: float, status_code: Optional[int]):
+        """実行枠を返却し、結果に応じて上限を調整
+
+        Args:
+            latency_ms: リクエストのレイテンシ（ミリ秒）
+            status_code: HTTPステータスコード（通信エラーの場合はNone）
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.completed += 1
+
+            if status_code is None or status_code == 429 or status_code >= 500:
+                # 乗算的減少
+                self.throttled += 1
+                previous = self.limit
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                if int(previous) != int(self.limit):
+                    logger.warning(
+                        f"Bulkhead '{self.name}' backing off: limit {int(previous)} -> {int(self.limit)} "
+                        f"(status={status_code})"
+                    )
+            elif latency_ms <= self.latency_target_ms:
+                # 加算的増加（上限分のリクエストが成功するごとに+1）
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'completed': self.completed,
+                'throttled': self.throttled,
+                'rejected': self.rejected
+            }
+
+
+class BulkheadRegistry:
+    """エンドポイント種別ごとのバルクヘッド"""
+
+    def __init__(
+        self,
+        limits: Dict[str, int],
+        max_limit: int = 32,
+        latency_target_ms: float = 2000,
+        max_queue: int = 100
+    ):
+        self.bulkheads = {
+            family: AdaptiveLimiter(
+                family,
+                initial_limit=limit,
+                max_limit=max(max_limit, limit),
+                latency_target_ms=latency_target_ms,
+                max_queue=max_queue
+            )
+            for family, limit in limits.items()
+        }
+
+    @staticmethod
+    def classify(method: str, endpoint: str) -> str:
+        """リクエストをエンドポイント種別に分類"""
+        if method.upper() != 'GET':
+            return FAMILY_WRITE
+        if endpoint.startswith('getExpandedDynamicGroupById'):
+            return FAMILY_GROUP
+        if '(' in endpoint.split('?', 1)[0]:
+            return FAMILY_LOOKUP
+        return FAMILY_LIST
+
+    def for_request(self, method: str, endpoint: str) -> AdaptiveLimiter:
+        family = self.classify(method, endpoint)
+        return self.bulkheads.get(family) or self.bulkheads[FAMILY_LIST]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {family: bulkhead.snapshot() for family, bulkhead in self.bulkheads.items()}
+
+
+def parse_bulkhead_limits(value: str) -> Dict[str, int]:
+    """「list=4,lookup=8」形式の設定を辞書に変換（未指定の種別は4）"""
+    limits = {FAMILY_LIST: 4, FAMILY_LOOKUP: 4, FAMILY_WRITE: 4, FAMILY_GROUP: 4}
+    for item in value.split(','):
+        if '=' in item:
+            family, limit = item.split('=', 1)
+            limits[family.strip()] = int(limit)
+    return limits
+
+
+class RequestHedger:
+    """冗長リクエスト（ヘッジ）の発行判断
+
+    冪等な読み取りリクエストが直近レイテンシのパーセンタイル値を超えても応答しない場合に、
+    同一リクエストをもう1本発行して先に返った方を採用するための遅延計算と予算管理を行います。
+    """
+
+    def __init__(
+        self,
+        families: Iterable[str] = (FAMILY_LOOKUP, FAMILY_GROUP),
+        percentile: float = 95,
+        min_delay_ms: float = 100,
+        initial_delay_ms: float = 1000,
+        budget_ratio: float = 0.05,
+        window: int = 200,
+        max_workers: int = 16
+    ):
+        """ヘッジの初期化
+
+        Args:
+            families: ヘッジ対象のエンドポイント種別
+            percentile: ヘッジ発行までの遅延に使うレイテンシのパーセンタイル
+            min_delay_ms: 遅延の下限（ミリ秒）
+            initial_delay_ms: サンプル不足時の遅延（ミリ秒）
+            budget_ratio: 対象リクエスト数に対するヘッジ数の上限割合
+            window: パーセンタイル計算に使う直近のサンプル数
+            max_workers: リクエストを並行実行するスレッド数
+        """
+        self.families = set(families)
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.initial_delay_ms = initial_delay_ms
+        self.budget_ratio = budget_ratio
+        self.window = window
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sap-hedge")
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def applies(self, method: str, family: str) -> bool:
+        """ヘッジ対象のリクエストか"""
+        return method.upper() == 'GET' and family in self.families
+
+    def record_latency(self, family: str, latency_ms: float):
+        """完了したリクエストのレイテンシを記録"""
+        with self._lock:
+            samples = self._latencies.get(family)
+            if samples is None:
+                samples = self._latencies[family] = deque(maxlen=self.window)
+            samples.append(latency_ms)
+
+    def delay_seconds(self, family: str) -> float:
+        """ヘッジを発行するまでの待機秒数（直近レイテンシのパーセンタイル）"""
+        with self._lock:
+            samples = sorted(self._latencies.get(family, ()))
+        if len(samples) < 20:
+            return max(self.initial_delay_ms, self.min_delay_ms) / 1000
+        index = min(int(len(samples) * self.percentile / 100), len(samples) - 1)
+        return max(samples[index], self.min_delay_ms) / 1000
+
+    def start_request(self):
+        """ヘッジ対象のリクエストを1件計上"""
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire_hedge(self) -> bool:
+        """予算内であればヘッジを1本発行できる"""
+        with self._lock:
+            # 予算割合に加えて常に1本分の余裕を持たせ、起動直後もヘッジできるようにする
+            if self.hedges + 1 > self.requests * self.budget_ratio + 1:
+                self.budget_exhausted += 1
+                return False
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        """ヘッジ側の応答が先に返った"""
+        with self._lock:
+            self.hedge_wins += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            families = list(self._latencies.keys())
+            result = {
+                'requests': self.requests,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_win_rate': round(self.hedge_wins / self.hedges, 3) if self.hedges else None,
+                'extra_load_ratio': round(self.hedges / self.requests, 4) if self.requests else 0.0,
+                'budget_exhausted': self.budget_exhausted
+            }
+        result['delay_ms'] = {family: round(self.delay_seconds(family) * 1000, 1) for family in families}
+        return result
+
+
+# グローバルレートリミッター
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """デフォルトテナントのレートリミッターを取得（シングルトンパターン）"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                settings = get_settings()
+                _rate_limiter = RateLimiter(settings.sap_rate_limit_per_second)
+    return _rate_limiter
+
+
+# グローバルバルクヘッド
+_bulkheads: Optional[BulkheadRegistry] = None
+_bulkheads_lock = threading.Lock()
+
+
+def create_bulkheads(limits: Optional[str] = None) -> BulkheadRegistry:
+    """設定値に従ってバルクヘッドを作成
+
+    Args:
+        limits: 種別ごとの初期同時実行数（省略時は共通設定）
+
+    Returns:
+        新しいバルクヘッド
+    """
+    settings = get_settings()
+    return BulkheadRegistry(
+        parse_bulkhead_limits(limits or settings.sap_bulkhead_limits),
+        max_limit=settings.sap_bulkhead_max_limit,
+        latency_target_ms=settings.sap_bulkhead_latency_target_ms,
+        max_queue=settings.sap_bulkhead_max_queue
+    )
+
+
+def get_bulkheads() -> BulkheadRegistry:
+    """デフォルトテナントのバルクヘッドを取得（シングルトンパターン）"""
+    global _bulkheads
+    if _bulkheads is None:
+        with _bulkheads_lock:
+            if _bulkheads is None:
+                _bulkheads = create_bulkheads()
+    return _bulkheads
+
+def create_hedger() -> Optional[RequestHedger]:
+    """設定値に従ってヘッジを作成（無効の場合はNone）"""
+    settings = get_settings()
+    if not settings.sap_hedge_enabled:
+        return None
+    return RequestHedger(
+        percentile=settings.sap_hedge_percentile,
+        min_delay_ms=settings.sap_hedge_min_delay_ms,
+        budget_ratio=settings.sap_hedge_budget_ratio
+    )
+
+
+# グローバルヘッジ
+_hedger: Optional[RequestHedger] = None
+_hedger_created = False
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Optional[RequestHedger]:
+    """デフォルトテナントのヘッジを取得（無効の場合はNone、シングルトンパターン）"""
+    global _hedger, _hedger_created
+    if not _hedger_created:
+        with _hedger_lock:
+            if not _hedger_created:
+                _hedger = create_hedger()
+                _hedger_created = True
+    return _hedger
+
+# Made with Bob
@@ -23,12 +23,92 @@ class Settings(BaseSettings):
     sap_oauth_client_secret: Optional[str] = Field(None, description="OAuth Client Secret")
     sap_oauth_token_url: Optional[str] = Field(None, description="OAuth Token URL")
     
+    # マルチテナント設定
+    default_tenant: str = Field(default="default", description="環境変数の接続設定に割り当てるテナントキー")
+    sap_tenants_file: Optional[str] = Field(None, description="追加テナントの設定ファイル（JSON）")
+    max_active_tenants: int = Field(default=20, description="同時に保持するテナントリソースの最大数")
+    tenant_idle_timeout: int = Field(default=1800, description="アイドルテナントのリソースを解放するまでの秒数")
+    
+    # HTTPトランスポート設定
+    sap_http2_enabled: bool = Field(default=False, description="HTTP/2を使用するか（httpx[http2]が必要）")
+    sap_pool_maxsize: int = Field(default=10, description="SAP APIへの最大プール接続数")
+    sap_warmup_connections: int = Field(default=2, description="起動時に事前に開く接続数（0で無効）")
+    sap_keepalive_interval: int = Field(default=60, description="接続を温め直す間隔（秒、0で無効）")
+    sap_dns_cache_ttl: int = Field(default=300, description="DNSキャッシュのTTL（秒、0で無効）")
+    
     # MCP Server設定
     mcp_auth_token: str = Field(default="default-token", description="MCP認証トークン")
     mcp_port: int = Field(default=8000, description="MCPサーバーポート")
+    mcp_response_max_bytes: int = Field(default=100000, description="一覧系ツールの応答データの最大バイト数")
+    mcp_progress_interval: float = Field(default=0.5, description="時間のかかるツールが進捗を通知する最小間隔（秒）")
+    mcp_stream_partial_results: bool = Field(default=True, description="進捗トークンを指定した呼び出しで部分結果をログ通知として先に送信するか")
+    mcp_stream_page_size: int = Field(default=200, description="部分結果を送信する場合に一覧を分割して取得する1ページの件数")
+    
+    # 同時実行制御設定
+    sap_rate_limit_per_second: float = Field(default=0, description="SAP APIへの最大リクエスト数/秒（0で無制限）")
+    sap_scan_workers: int = Field(default=4, description="パーティション並列スキャンのワーカー数")
+    sap_bulkhead_limits: str = Field(
+        default="list=4,lookup=8,write=4,group=2",
+        description="エンドポイント種別ごとの初期同時実行数（list/lookup/write/group）"
+    )
+    sap_bulkhead_max_limit: int = Field(default=32, description="適応制御で到達できる同時実行数の上限")
+    sap_bulkhead_latency_target_ms: int = Field(default=2000, description="同時実行数を増やす目安となるレイテンシ（ミリ秒）")
+    sap_bulkhead_max_queue: int = Field(default=100, description="種別ごとの待ち行列の最大長")
+    sap_batch_changeset_size: int = Field(default=100, description="$batchの1チェンジセットにまとめる更新数")
+    sap_batch_workers: int = Field(default=4, description="並行に送信する$batch・upsertリクエスト数")
+    sap_upsert_chunk_size: int = Field(default=100, description="1回のupsert呼び出しに含めるエンティティ数")
+    sap_entity_cache_ttl: int = Field(default=60, description="差分更新の比較に使うユーザー情報のキャッシュ秒数（0で無効）")
+    sap_filter_max_chars: int = Field(default=2000, description="複数ユーザーの一括取得で1リクエストの$filterに含める最大文字数")
+    sap_group_write_max_attempts: int = Field(default=3, description="Dynamic Groupの更新が競合した場合の最大試行回数")
+    sap_hedge_enabled: bool = Field(default=False, description="冪等な読み取りリクエストのヘッジを有効にするか")
+    sap_hedge_percentile: float = Field(default=95, description="ヘッジ発行までの遅延に使うレイテンシのパーセンタイル")
+    sap_hedge_min_delay_ms: int = Field(default=100, description="ヘッジ発行までの最小遅延（ミリ秒）")
+    sap_hedge_budget_ratio: float = Field(default=0.05, description="読み取りリクエスト数に対するヘッジ数の上限割合")
+    
+    # 通信の記録・再生設定
+    sap_cassette_mode: str = Field(default="", description="通信の記録・再生モード（record, replay、空で無効）")
+    sap_cassette_path: str = Field(default="cassettes/sap.jsonl", description="カセットファイルのパス")
+    sap_cassette_latency_scale: float = Field(default=1.0, description="再生時に記録時のレイテンシに掛ける倍率（0で待機しない）")
+    sap_cassette_redact_fields: str = Field(
+        default="userId,fieldValue,username,firstName,lastName,displayName,email,password,defaultFullName,businessPhone,cellPhone",
+        description="記録時に仮名に置き換えるフィールド（カンマ区切り）"
+    )
+    
+    # ツール結果キャッシュ設定
+    tool_cache_ttl: float = Field(default=60, description="読み取り専用ツールの結果を保持する秒数（0で無効）")
+    tool_cache_max_entries: int = Field(default=1000, description="ツール結果キャッシュの最大件数")
+    
+    # ユーザー検索インデックス設定
+    user_index_refresh_interval: int = Field(default=300, description="検索インデックスを差分同期する間隔（秒）")
+    user_index_full_sync_interval: int = Field(default=86400, description="検索インデックスを全件同期し直す間隔（秒）")
+    
+    # ヘルスチェック設定
+    health_probe_interval: int = Field(default=60, description="SAP接続の定期プローブ間隔（秒、0で無効）")
+    
+    # 起動時ウォームアップ設定
+    warmup_enabled: bool = Field(default=True, description="起動時にウォームアップを行い、完了までreadinessを準備中とするか")
+    warmup_timeout: float = Field(default=30, description="ウォームアップを待つ最大秒数（超えた場合は完了を待たずに準備完了とする）")
+    warmup_metadata: bool = Field(default=True, description="起動時に$metadataを取得するか")
+    warmup_groups: str = Field(default="8526", description="起動時にメンバーを取得するDynamic Group ID（カンマ区切り）")
+    warmup_users: str = Field(default="", description="起動時に取得するユーザーID（カンマ区切り）")
+    warmup_user_index: bool = Field(default=False, description="起動時にユーザー検索インデックスを同期するか")
+    
+    # エクスポート設定
+    export_dir: str = Field(default="exports", description="ユーザーエクスポートの出力ディレクトリ")
+    
+    # プロファイリング設定
+    profile_mode: str = Field(default="", description="ツール呼び出しのプロファイラー（cprofile, sampling、空で無効）")
+    profile_tools: str = Field(default="", description="常にプロファイルするツール名（カンマ区切り）")
+    profile_sample_rate: float = Field(default=0.0, description="その他のツール呼び出しをプロファイルする割合")
+    profile_dir: str = Field(default="profiles", description="プロファイルの出力ディレクトリ")
+    profile_sampling_interval_ms: float = Field(default=5, description="サンプリングプロファイラーの採取間隔（ミリ秒）")
     
     # ログ設定
     log_level: str = Field(default="INFO", description="ログレベル")
+    log_format: str = Field(default="text", description="ログ形式（text, json）")
+    log_sample_rates: str = Field(default="", description="メッセージ種別ごとの出力割合（例: request=0.1,group_members=0.01）")
+    log_max_field_chars: int = Field(default=2000, description="ログのメッセージ引数・フィールドごとの最大文字数")
+    log_queue_size: int = Field(default=10000, description="出力待ちログレコードの最大数（超えた分は破棄）")
     
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,83 @@
+"""
+テナント設定モジュール
+複数のSAP SuccessFactors企業（テナント）の接続設定をファイルから読み込みます
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from .settings import Settings
+
+
+class TenantConfig(BaseModel):
+    """テナント（SAP SuccessFactors企業）ごとの接続設定"""
+
+    key: str = Field(..., description="テナントキー（MCPツールのtenant引数で指定）")
+    sap_api_url: str = Field(..., description="SAP SuccessFactors API URL")
+    sap_company_id: str = Field(..., description="SAP Company ID")
+    sap_user_id: str = Field(..., description="SAP API User ID")
+    sap_password: str = Field(default="", description="SAP API User Password")
+    sap_password_env: Optional[str] = Field(None, description="パスワードを読み込む環境変数名")
+    sap_rate_limit_per_second: Optional[float] = Field(None, description="最大リクエスト数/秒（省略時は共通設定）")
+    sap_bulkhead_limits: Optional[str] = Field(None, description="種別ごとの初期同時実行数（省略時は共通設定）")
+
+    def password(self) -> str:
+        """パスワードを取得（環境変数名が指定されている場合はそちらを優先）"""
+        if self.sap_password_env:
+            return os.environ.get(self.sap_password_env, self.sap_password)
+        return self.sap_password
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "TenantConfig":
+        """環境変数の設定からデフォルトテナントを作成"""
+        return cls(
+            key=settings.default_tenant,
+            sap_api_url=settings.sap_api_url,
+            sap_company_id=settings.sap_company_id,
+            sap_user_id=settings.sap_user_id,
+            sap_password=settings.sap_password
+        )
+
+
+def load_tenant_configs(path: str) -> Dict[str, TenantConfig]:
+    """テナント設定ファイル（JSON）を読み込む
+
+    形式:
+        {
+            "tenants": {
+                "acme": {
+                    "sap_api_url": "https://api68sales.successfactors.com",
+                    "sap_company_id": "ACME",
+                    "sap_user_id": "apiuser",
+                    "sap_password_env": "ACME_SAP_PASSWORD"
+                }
+            }
+        }
+
+    Args:
+        path: 設定ファイルのパス
+
+    Returns:
+        テナントキーをキーとする設定の辞書
+
+    Raises:
+        ValueError: 設定内のkeyがテナントキーと一致しない場合
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    tenants = data.get('tenants', data)
+    configs = {}
+    for key, config in tenants.items():
+        # テナントキーは辞書のキーで指定する（"key"を書いた場合は一致する必要がある）
+        config = dict(config)
+        declared = config.pop('key', key)
+        if declared != key:
+            raise ValueError(f"テナント '{key}' の設定のkeyが一致しません: {declared}")
+        configs[key] = TenantConfig(key=key, **config)
+    return configs
+
+# Made with Bob
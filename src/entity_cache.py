@@ -0,0 +1,84 @@
+"""
+エンティティキャッシュ
+テナント（クライアント）ごとに取得・更新したエンティティのプロパティを短時間保持し、
+差分更新の比較などでAPI呼び出しを省略するために使用します
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+
+
+class EntityCache:
+    """キーごとにエンティティのプロパティを保持するTTL付きLRUキャッシュ
+
+    取得したプロパティは既存のエントリにマージされるため、$selectで一部の
+    プロパティだけを取得した場合も、既知のプロパティが蓄積されます。
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 10000):
+        """キャッシュの初期化
+
+        Args:
+            ttl: エントリを保持する秒数（0で無効）
+            max_entries: 保持する最大件数
+        """
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """エンティティのプロパティを取得（期限切れ・未登録の場合はNone）"""
+        if self.ttl <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            value = entry[1]
+            return dict(value) if isinstance(value, dict) else value
+
+    def merge(self, key: str, values: Dict[str, Any]):
+        """プロパティを既存のエントリにマージ（保持期間は更新される）"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry is not None and now - entry[0] <= self.ttl:
+                merged = {**entry[1], **values}
+            else:
+                merged = dict(values)
+            self._entries[key] = (now, merged)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key: str, value: Any):
+        """エントリを置き換える（変更されないレコード型の値を保持する場合に使用）"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Made with Bob
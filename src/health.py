@@ -0,0 +1,190 @@
+"""
+ヘルスチェックモジュール
+バックグラウンドでSAP SuccessFactorsへの軽量な疎通確認を定期実行し、
+結果をキャッシュしてliveness/readinessとして提供します
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from .config.settings import get_settings
+from .sap_client import SAPSuccessFactorsClient
+
+logger = logging.getLogger(__name__)
+
+
+def _default_probe():
+    SAPSuccessFactorsClient().ping()
+
+
+class HealthMonitor:
+    """SAP接続状態をキャッシュするヘルスモニター"""
+
+    def __init__(self, probe: Callable[[], Any], interval: int = 60):
+        """モニターの初期化
+
+        Args:
+            probe: 疎通確認を行う関数（例外を送出した場合は失敗とみなす）
+            interval: バックグラウンドプローブの実行間隔（秒、0で無効）
+        """
+        self.probe = probe
+        self.interval = interval
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._last_result: Optional[Dict[str, Any]] = None
+        self._last_checked: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._warming_up = False
+
+    def begin_warm_up(self):
+        """ウォームアップ中はreadinessを準備中とする"""
+        self._warming_up = True
+
+    def end_warm_up(self):
+        self._warming_up = False
+
+    def run_probe(self) -> Dict[str, Any]:
+        """プローブを実行して結果をキャッシュ
+
+        Returns:
+            プローブ結果
+        """
+        # 同時に複数のプローブが走らないようにする
+        with self._probe_lock:
+            started = time.perf_counter()
+            try:
+                self.probe()
+                healthy = True
+                error = None
+            except Exception as e:
+                healthy = False
+                error = str(e)
+            latency_ms = (time.perf_counter() - started) * 1000
+
+            checked = time.time()
+            result = {
+                'healthy': healthy,
+                'checked_at': datetime.fromtimestamp(checked, timezone.utc).isoformat(),
+                'latency_ms': round(latency_ms, 2),
+                'error': error
+            }
+            with self._lock:
+                self._last_result = result
+                self._last_checked = checked
+
+        if healthy:
+            logger.debug(f"Health probe succeeded in {latency_ms:.1f}ms")
+        else:
+            logger.warning(f"Health probe failed: {error}")
+        return result
+
+    def status(self, force: bool = False) -> Dict[str, Any]:
+        """キャッシュされた接続状態を取得
+
+        キャッシュが存在しない場合や、バックグラウンドプローブが停止していて
+        キャッシュが古い場合のみプローブを実行します。
+
+        Args:
+            force: キャッシュを無視してプローブを実行するか
+
+        Returns:
+            接続状態（age_secondsはキャッシュの経過秒数）
+        """
+        with self._lock:
+            result = self._last_result
+            checked = self._last_checked
+
+        stale = checked is None or (
+            not self.is_running() and time.time() - checked > max(self.interval, 1)
+        )
+        if force or result is None or stale:
+            self.run_probe()
+            with self._lock:
+                result = self._last_result
+                checked = self._last_checked
+
+        return {
+            **result,
+            'age_seconds': round(time.time() - checked, 3),
+            'probe_interval': self.interval
+        }
+
+    def liveness(self) -> Dict[str, Any]:
+        """プロセスの生存状態（SAPへの接続は確認しない）"""
+        return {
+            'status': 'alive',
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'probe_running': self.is_running()
+        }
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """リクエストを受け付けられる状態かどうか（キャッシュのみ参照）
+
+        Returns:
+            (準備完了か, 詳細)
+        """
+        with self._lock:
+            result = self._last_result
+            checked = self._last_checked
+
+        if self._warming_up:
+            return False, {'status': 'warming_up', 'reason': 'startup warm-up in progress'}
+        if result is None:
+            return False, {'status': 'starting', 'reason': 'no probe result yet'}
+
+        age = time.time() - checked
+        # 2回分のプローブが失われた結果は信用しない
+        if self.interval > 0 and age > self.interval * 2 + 30:
+            return False, {'status': 'stale', 'age_seconds': round(age, 3), **result}
+
+        ready = result['healthy']
+        return ready, {'status': 'ready' if ready else 'unavailable', 'age_seconds': round(age, 3), **result}
+
+    def start(self):
+        """バックグラウンドプローブを開始"""
+        if self.interval <= 0 or self.is_running():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.run_probe()
+                except Exception as e:
+                    logger.error(f"Health probe crashed: {str(e)}")
+                if self._stop_event.wait(self.interval):
+                    break
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=run, name="sap-health-probe", daemon=True)
+        self._thread.start()
+        logger.info(f"Health probe started (interval={self.interval}s)")
+
+    def stop(self):
+        """バックグラウンドプローブを停止"""
+        self._stop_event.set()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+
+# グローバルヘルスモニターインスタンス
+_monitor: Optional[HealthMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def get_health_monitor() -> HealthMonitor:
+    """ヘルスモニターインスタンスを取得（シングルトンパターン）"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                settings = get_settings()
+                _monitor = HealthMonitor(_default_probe, interval=settings.health_probe_interval)
+    return _monitor
+
+# Made with Bob
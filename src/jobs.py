@@ -0,0 +1,130 @@
+"""
+バックグラウンドジョブ管理モジュール
+エクスポートなどの長時間処理をスレッドで実行し、進捗と結果を保持します
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class Job:
+    """バックグラウンドジョブ"""
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.status = 'running'
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress):
+        """進捗情報を更新"""
+        with self._lock:
+            self.progress.update(progress)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.finished_at or time.time()
+            return {
+                'job_id': self.id,
+                'name': self.name,
+                'status': self.status,
+                'started_at': _isoformat(self.started_at),
+                'finished_at': _isoformat(self.finished_at),
+                'elapsed_seconds': round(finished - self.started_at, 3),
+                'progress': dict(self.progress),
+                'result': self.result,
+                'error': self.error
+            }
+
+
+class JobRegistry:
+    """ジョブの実行と状態保持（完了済みジョブは上限件数まで保持）"""
+
+    def __init__(self, max_finished: int = 50):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, func: Callable[..., Any], *args, **kwargs) -> Job:
+        """ジョブをバックグラウンドで開始
+
+        Args:
+            name: ジョブ名
+            func: 実行する関数（第1引数にJobを受け取り、戻り値がジョブ結果になる）
+
+        Returns:
+            開始されたジョブ
+        """
+        job = Job(name)
+
+        def run():
+            try:
+                result = func(job, *args, **kwargs)
+                with job._lock:
+                    job.result = result
+                    job.status = 'completed'
+            except Exception as e:
+                logger.error(f"Job {job.id} ({name}) failed: {str(e)}")
+                with job._lock:
+                    job.error = str(e)
+                    job.status = 'failed'
+            finally:
+                with job._lock:
+                    job.finished_at = time.time()
+                self._prune()
+
+        with self._lock:
+            self._jobs[job.id] = job
+
+        threading.Thread(target=run, name=f"job-{name}-{job.id}", daemon=True).start()
+        logger.info(f"Job started: {name} ({job.id})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def _prune(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.status != 'running']
+            for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+                del self._jobs[job_id]
+
+
+# グローバルジョブレジストリ
+_registry: Optional[JobRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_job_registry() -> JobRegistry:
+    """ジョブレジストリを取得（シングルトンパターン）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry()
+    return _registry
+
+# Made with Bob
@@ -0,0 +1,282 @@
+"""
+ログ設定モジュール
+キュー経由の非同期ハンドラー、構造化（JSON）出力、フィールド長の上限、
+メッセージ種別ごとのサンプリングを提供します
+
+ログ呼び出し側ではf-stringではなく%形式の引数を渡してください。
+引数の文字列化はリスナースレッドで上限付きで行われるため、
+大きなリストを渡してもリクエスト処理のスレッドでは整形されません。
+
+    logger.info("Found %d members in group %s: %s", len(members), group_id, members,
+                extra={'event': 'group_members'})
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Any, Optional
+
+# LogRecordの標準属性（extraで渡されたフィールドと区別するため）
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+# コレクションを文字列化する際に残す要素数
+_MAX_ITEMS = 20
+
+
+def cap_value(value: Any, max_chars: int) -> Any:
+    """ログ出力用に値の大きさを制限
+
+    大きなコレクションは先頭の要素と件数のみ、長い文字列は先頭max_chars文字のみを残します。
+    数値や真偽値はそのまま返します。
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+
+    if isinstance(value, (list, tuple, set, frozenset)) and len(value) > _MAX_ITEMS:
+        text = f"{list(islice(value, _MAX_ITEMS))!r}... ({len(value)} items)"
+    elif isinstance(value, dict) and len(value) > _MAX_ITEMS:
+        text = f"{dict(islice(value.items(), _MAX_ITEMS))!r}... ({len(value)} keys)"
+    elif isinstance(value, (bytes, bytearray)):
+        text = value[:max_chars].decode('utf-8', errors='replace')
+        if len(value) > max_chars:
+            text += f"... ({len(value)} bytes)"
+        return text
+    else:
+        text = value if isinstance(value, str) else str(value)
+
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... ({len(text)} chars)"
+    return text
+
+
+def _cap_record(record: logging.LogRecord, max_chars: int) -> str:
+    """レコードの引数を上限付きで展開したメッセージを返す"""
+    args = record.args
+    if isinstance(args, dict):
+        args = {key: cap_value(value, max_chars) for key, value in args.items()}
+    elif args:
+        args = tuple(cap_value(value, max_chars) for value in args)
+
+    message = str(record.msg)
+    if args:
+        try:
+            message = message % args
+        except (TypeError, ValueError):
+            message = f"{message} {args!r}"
+    return cap_value(message, max_chars * 2)
+
+
+class CappedFormatter(logging.Formatter):
+    """引数とメッセージの長さを制限するテキストフォーマッター"""
+
+    def __init__(self, fmt: Optional[str] = None, max_field_chars: int = 2000):
+        super().__init__(fmt)
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.message = _cap_record(record, self.max_field_chars)
+        record.asctime = self.formatTime(record, self.datefmt)
+        text = self.formatMessage(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            text = f"{text}\n{record.exc_text}"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコード1行のJSONを出力するフォーマッター
+
+    extraで渡されたフィールドはそのままトップレベルのキーとして出力します（長さは制限）。
+    """
+
+    def __init__(self, max_field_chars: int = 2000):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': _cap_record(record, self.max_field_chars)
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = cap_value(value, self.max_field_chars)
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = cap_value(record.exc_text, self.max_field_chars * 4)
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """メッセージ種別ごとのサンプリング
+
+    extra={'event': ...}で種別を指定したレコードのうち、設定された割合だけを通します。
+    WARNING以上のレコードと種別のないレコードは常に通します。
+    乱数ではなくカウンターで間引くため、出力される割合は設定値に一致します。
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+
+        rate = self.rates.get(event)
+        if rate is None or rate >= 1:
+            return True
+
+        with self._lock:
+            count = self._counters.get(event, 0)
+            self._counters[event] = count + 1
+            # 1/rate件ごとに1件を残す
+            keep = rate > 0 and int(count * rate) != int((count + 1) * rate)
+            if not keep:
+                self.dropped += 1
+        if keep:
+            record.sample_rate = rate
+        return keep
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """キューが満杯の場合にレコードを破棄するキューハンドラー
+
+    標準のQueueHandlerは投入前にメッセージを整形しますが、このハンドラーは整形を
+    リスナースレッドに任せ、呼び出し元ではレコードをキューに入れるだけにします。
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 例外のトレースバックは呼び出し元スレッドでしか確実に取得できないため文字列化しておく
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """サンプリング設定（例: "request=0.1,group_members=0.01"）を解析"""
+    rates = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        event, _, rate = item.partition('=')
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            raise ValueError(f"不正なログサンプリング設定です: {item}")
+    return rates
+
+
+# 設定済みのリスナーとハンドラー
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_sampling_filter: Optional[SamplingFilter] = None
+
+
+def configure_logging(
+    level: str = "INFO",
+    log_format: str = "text",
+    sample_rates: Optional[Dict[str, float]] = None,
+    max_field_chars: int = 2000,
+    queue_size: int = 10000,
+    stream=None
+):
+    """ルートロガーにキュー経由の非同期ハンドラーを設定
+
+    既存のハンドラーは置き換えます。複数回呼び出した場合は前回のリスナーを停止します。
+
+    Args:
+        level: ログレベル
+        log_format: "text" または "json"
+        sample_rates: メッセージ種別（extraのevent）ごとの出力割合
+        max_field_chars: メッセージ引数・フィールドごとの最大文字数
+        queue_size: 出力待ちで保持する最大レコード数（超えた分は破棄）
+        stream: 出力先（省略時は標準エラー出力）
+    """
+    global _listener, _queue_handler, _sampling_filter
+    shutdown_logging()
+
+    if log_format == "json":
+        formatter: logging.Formatter = JsonFormatter(max_field_chars)
+    elif log_format == "text":
+        formatter = CappedFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s', max_field_chars)
+    else:
+        raise ValueError(f"不正なログ形式です: {log_format}（text, jsonのいずれか）")
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _sampling_filter = SamplingFilter(sample_rates or {})
+    _queue_handler.addFilter(_sampling_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """リスナーを停止してキューに残ったレコードを出力"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging_from_settings():
+    """設定値に従ってログを設定"""
+    from .config.settings import get_settings
+
+    settings = get_settings()
+    configure_logging(
+        level=settings.log_level,
+        log_format=settings.log_format,
+        sample_rates=parse_sample_rates(settings.log_sample_rates),
+        max_field_chars=settings.log_max_field_chars,
+        queue_size=settings.log_queue_size
+    )
+
+
+def logging_stats() -> Dict[str, Any]:
+    """キュー溢れ・サンプリングで破棄したレコード数"""
+    return {
+        'queued': _queue_handler.queue.qsize() if _queue_handler else 0,
+        'dropped_queue_full': _queue_handler.dropped if _queue_handler else 0,
+        'dropped_sampled': _sampling_filter.dropped if _sampling_filter else 0
+    }
+
+# Made with Bob
@@ -0,0 +1,122 @@
+"""
+OData v2 $batchリクエストの構築とレスポンスの解析
+複数の書き込み操作を1つのチェンジセット（multipart/mixed）にまとめ、
+レスポンスの各パートからHTTPステータスとボディを取り出します
+"""
+
+import json
+import uuid
+from typing import Dict, Any, Optional, List, Tuple
+
+_CRLF = "\r\n"
+
+
+def build_changeset_batch(operations: List[Dict[str, Any]]) -> Tuple[bytes, str]:
+    """書き込み操作を1つのチェンジセットにまとめた$batchボディを作成
+
+    Args:
+        operations: 操作のリスト（method, url: サービスルートからの相対URL, body: JSONボディ）
+
+    Returns:
+        (リクエストボディ, Content-Typeヘッダー値)
+    """
+    batch_boundary = f"batch_{uuid.uuid4().hex}"
+    changeset_boundary = f"changeset_{uuid.uuid4().hex}"
+
+    lines = [
+        f"--{batch_boundary}",
+        f"Content-Type: multipart/mixed; boundary={changeset_boundary}",
+        "",
+    ]
+    for index, operation in enumerate(operations):
+        payload = json.dumps(operation.get('body') or {}, ensure_ascii=False)
+        lines.extend([
+            f"--{changeset_boundary}",
+            "Content-Type: application/http",
+            "Content-Transfer-Encoding: binary",
+            f"Content-ID: {index + 1}",
+            "",
+            f"{operation['method']} {operation['url']} HTTP/1.1",
+            "Content-Type: application/json",
+            "Accept: application/json",
+            "",
+            payload,
+        ])
+    lines.extend([
+        f"--{changeset_boundary}--",
+        "",
+        f"--{batch_boundary}--",
+        "",
+    ])
+    return _CRLF.join(lines).encode('utf-8'), f"multipart/mixed; boundary={batch_boundary}"
+
+
+def _boundary(content_type: Optional[str]) -> Optional[str]:
+    for item in (content_type or "").split(';'):
+        key, _, value = item.strip().partition('=')
+        if key.lower() == 'boundary':
+            return value.strip('"')
+    return None
+
+
+def _split_headers(text: str) -> Tuple[Dict[str, str], str]:
+    head, _, rest = text.partition("\n\n")
+    headers = {}
+    for line in head.split("\n"):
+        key, sep, value = line.partition(':')
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers, rest
+
+
+def _parse_http_response(text: str) -> Dict[str, Any]:
+    status_line, _, rest = text.lstrip("\n").partition("\n")
+    parts = status_line.split(' ', 2)
+    status_code = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+    _, body = _split_headers(rest)
+    body = body.strip()
+    return {'status_code': status_code, 'body': body}
+
+
+def _parse_multipart(text: str, boundary: str) -> List[Any]:
+    responses: List[Any] = []
+    delimiter = f"--{boundary}"
+    for part in text.split(delimiter)[1:]:
+        if part.startswith("--"):
+            break
+        headers, payload = _split_headers(part.lstrip("\n"))
+        content_type = headers.get('content-type', '')
+        if content_type.startswith('multipart/mixed'):
+            responses.append(_parse_multipart(payload, _boundary(content_type) or ""))
+        else:
+            responses.append(_parse_http_response(payload))
+    return responses
+
+
+def parse_batch_response(content: bytes, content_type: Optional[str]) -> List[Any]:
+    """$batchレスポンスを解析
+
+    Returns:
+        バッチ内のパートごとの結果。チェンジセットが成功した場合は操作ごとの
+        {status_code, body}のリスト、失敗した場合はチェンジセット全体に対する単一の{status_code, body}
+    """
+    boundary = _boundary(content_type)
+    if not boundary:
+        raise ValueError(f"$batchレスポンスにboundaryがありません: {content_type}")
+    text = content.decode('utf-8', errors='replace').replace("\r\n", "\n")
+    return _parse_multipart(text, boundary)
+
+
+def error_message(body: Any) -> str:
+    """ODataエラーレスポンス（文字列または解析済みの辞書）からメッセージを取り出す"""
+    try:
+        data = json.loads(body) if isinstance(body, str) else body
+        error = data.get('error', {})
+        message = error.get('message')
+        if isinstance(message, dict):
+            return message.get('value') or body
+        return message or body
+    except (ValueError, AttributeError):
+        return body if isinstance(body, str) else str(body)
+
+# Made with Bob
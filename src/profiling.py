@@ -0,0 +1,245 @@
+"""
+MCPツール呼び出しのプロファイリング
+指定したツール、または一定割合の呼び出しをプロファイラー付きで実行し、
+結果をプロファイルディレクトリへ書き出します
+
+- cprofile: 決定的プロファイラー（cProfile）、pstats形式（.pstats）で出力
+- sampling: 一定間隔でスタックを採取するサンプリングプロファイラー、speedscope形式（.speedscope.json）で出力
+
+無効時はツール呼び出しごとに属性を1つ確認するだけで、計測のオーバーヘッドはありません。
+"""
+
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Iterable
+
+from .config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+class _StackSampler:
+    """対象スレッドのスタックを一定間隔で採取する"""
+
+    def __init__(self, thread_id: int, interval_ms: float):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[tuple, int] = {}
+        self.samples: List[List[int]] = []
+        self.weights: List[float] = []
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tool-profiler-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self.elapsed_ms = (time.perf_counter() - self.started) * 1000
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                self.samples.append(self._stack(frame))
+                self.weights.append((now - last) * 1000)
+            last = now
+
+    def _stack(self, frame) -> List[int]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_name, code.co_filename, code.co_firstlineno)
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append({'name': code.co_name, 'file': code.co_filename, 'line': code.co_firstlineno})
+            stack.append(index)
+            frame = frame.f_back
+        # speedscopeはルートから末端の順
+        stack.reverse()
+        return stack
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'sap-successfactors-mcp',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(self.elapsed_ms, 3),
+                'samples': self.samples,
+                'weights': [round(weight, 3) for weight in self.weights]
+            }]
+        }
+
+
+class ToolProfiler:
+    """ツール呼び出しをプロファイルするかどうかの判断とプロファイルの書き出し"""
+
+    def __init__(
+        self,
+        mode: str = "",
+        tools: Iterable[str] = (),
+        sample_rate: float = 0.0,
+        output_dir: str = "profiles",
+        sampling_interval_ms: float = 5
+    ):
+        """プロファイラーの初期化
+
+        Args:
+            mode: "cprofile"、"sampling"、または空（無効）
+            tools: 常にプロファイルするツール名
+            sample_rate: それ以外のツール呼び出しをプロファイルする割合
+            output_dir: プロファイルの出力ディレクトリ
+            sampling_interval_ms: サンプリングプロファイラーの採取間隔（ミリ秒）
+        """
+        if mode and mode not in PROFILE_MODES:
+            raise ValueError(f"不正なプロファイルモードです: {mode}（{', '.join(PROFILE_MODES)}のいずれか）")
+        self.mode = mode
+        self.tools = set(tools)
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.sampling_interval_ms = sampling_interval_ms
+        self._armed: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # cProfileは同時に1つしか有効にできないため、実行中は他の呼び出しをプロファイルしない
+        self._cprofile_lock = threading.Lock()
+        self.recent: List[Dict[str, Any]] = []
+        self.enabled = bool(mode) and (bool(self.tools) or sample_rate > 0)
+
+    def arm(self, tool_name: str, count: int = 1, mode: Optional[str] = None):
+        """指定したツールの次のcount回の呼び出しをプロファイルする"""
+        if mode:
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"不正なプロファイルモードです: {mode}（{', '.join(PROFILE_MODES)}のいずれか）")
+            self.mode = mode
+        elif not self.mode:
+            self.mode = "cprofile"
+        with self._lock:
+            self._armed[tool_name] = self._armed.get(tool_name, 0) + count
+            self.enabled = True
+
+    def should_profile(self, tool_name: str) -> bool:
+        if tool_name in self.tools:
+            return True
+        with self._lock:
+            remaining = self._armed.get(tool_name, 0)
+            if remaining > 0:
+                if remaining == 1:
+                    del self._armed[tool_name]
+                else:
+                    self._armed[tool_name] = remaining - 1
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, tool_name: str, func: Callable, args, kwargs):
+        """プロファイラー付きでツールを実行"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(
+            self.output_dir,
+            f"{tool_name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
+        )
+
+        if self.mode == "sampling":
+            sampler = _StackSampler(threading.get_ident(), self.sampling_interval_ms)
+            sampler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.stop()
+                path = f"{base}.speedscope.json"
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(sampler.to_speedscope(tool_name), f)
+                self._remember(tool_name, path, sampler.elapsed_ms)
+
+        if not self._cprofile_lock.acquire(blocking=False):
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        finally:
+            self._cprofile_lock.release()
+            path = f"{base}.pstats"
+            profile.dump_stats(path)
+            self._remember(tool_name, path, (time.perf_counter() - started) * 1000)
+
+    def _remember(self, tool_name: str, path: str, elapsed_ms: float):
+        logger.info(f"Profiled {tool_name} ({elapsed_ms:.1f}ms): {path}")
+        with self._lock:
+            self.recent.append({'tool': tool_name, 'path': path, 'elapsed_ms': round(elapsed_ms, 2)})
+            del self.recent[:-20]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'mode': self.mode or None,
+                'tools': sorted(self.tools),
+                'sample_rate': self.sample_rate,
+                'armed': dict(self._armed),
+                'output_dir': self.output_dir,
+                'recent': list(self.recent)
+            }
+
+
+# グローバルプロファイラー
+_profiler: Optional[ToolProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_tool_profiler() -> ToolProfiler:
+    """ツールプロファイラーを取得（シングルトンパターン）"""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                settings = get_settings()
+                _profiler = ToolProfiler(
+                    mode=settings.profile_mode,
+                    tools=[name.strip() for name in settings.profile_tools.split(',') if name.strip()],
+                    sample_rate=settings.profile_sample_rate,
+                    output_dir=settings.profile_dir,
+                    sampling_interval_ms=settings.profile_sampling_interval_ms
+                )
+    return _profiler
+
+
+def profile_tool(func: Callable) -> Callable:
+    """ツール関数をプロファイル対象にするデコレーター（@mcp.tool()の内側に付ける）"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = get_tool_profiler()
+        if not profiler.enabled or not profiler.should_profile(name):
+            return func(*args, **kwargs)
+        return profiler.run(name, func, args, kwargs)
+
+    return wrapper
+
+# Made with Bob
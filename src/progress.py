@@ -0,0 +1,172 @@
+"""
+ツールの進捗通知と部分結果のストリーミング
+時間のかかるツールの実行中に、MCPの進捗通知（notifications/progress）を送信し、
+SuccessFactorsから取得・処理できた結果を部分結果としてログ通知（notifications/message）で先に送信します。
+
+ツールはスレッドプールで同期的に実行されるため、通知はイベントループへ
+スレッドセーフに投入して送信します（バルク操作のワーカースレッドからも呼び出せます）。
+クライアントが進捗トークンを指定しない場合やContextがない場合は何も送信しません。
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from typing import Any, Callable, Coroutine, List, Optional
+
+import anyio.from_thread
+
+from .config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# 部分結果を送信するロガー名（クライアントはこの名前で部分結果を識別する）
+PARTIAL_RESULTS_LOGGER = "sap_successfactors.partial_results"
+
+# 通知の送信を待つ最大秒数
+_SEND_TIMEOUT = 5.0
+
+
+def _progress_token(ctx: Any) -> Any:
+    try:
+        request_context = ctx.request_context
+        meta = request_context.meta if request_context is not None else None
+        if isinstance(meta, dict):
+            return meta.get('progressToken')
+        return getattr(meta, 'progressToken', None)
+    except Exception:
+        return None
+
+
+class ToolProgress:
+    """1回のツール呼び出しの進捗を通知する
+
+    advance()は複数のスレッドから呼び出せます。進捗通知は設定した間隔ごとに、
+    部分結果はその間にたまった分をまとめて送信し、close()で残りを送信します。
+    """
+
+    def __init__(self, ctx: Any = None, tool_name: str = "", total: Optional[int] = None):
+        self.tool_name = tool_name
+        self.total = total
+        self.completed = 0
+        self.interval = 0.0
+        self._ctx = ctx
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._context: Optional[contextvars.Context] = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._message: Optional[str] = None
+        self._sent_completed = -1
+        self._last_sent = 0.0
+        self._pending: List[Any] = []
+        self._sequence = 0
+        self.enabled = False
+        self.streaming = False
+
+        if ctx is None or _progress_token(ctx) is None:
+            return
+        try:
+            # ツールを実行しているスレッド（anyioのワーカースレッド）からイベントループを取得
+            self._loop = anyio.from_thread.run_sync(asyncio.get_running_loop)
+        except Exception as e:
+            logger.debug(f"Progress notifications unavailable for {tool_name}: {str(e)}")
+            return
+        # バルク操作のワーカースレッドにはリクエストのコンテキスト変数が引き継がれないため、ここで保持する
+        self._context = contextvars.copy_context()
+        settings = get_settings()
+        self.interval = settings.mcp_progress_interval
+        self.enabled = True
+        self.streaming = settings.mcp_stream_partial_results
+
+    def set_total(self, total: Optional[int]):
+        with self._lock:
+            self.total = total
+
+    def advance(self, count: int = 1, message: Optional[str] = None, items: Optional[List[Any]] = None):
+        """処理済みの件数を加算し、前回の通知から間隔が空いていれば進捗を通知
+
+        Args:
+            count: 処理済みとして加算する件数
+            message: 進捗のメッセージ
+            items: 部分結果として送信する結果（ストリーミングが無効の場合は破棄）
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.completed += count
+            if message is not None:
+                self._message = message
+            if items and self.streaming:
+                self._pending.extend(items)
+        self._flush(force=False)
+
+    def close(self, message: Optional[str] = None):
+        """残りの部分結果と最終的な進捗を送信"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if message is not None:
+                self._message = message
+        self._flush(force=True)
+
+    def _flush(self, force: bool):
+        with self._send_lock:
+            with self._lock:
+                now = time.monotonic()
+                if not force and now - self._last_sent < self.interval:
+                    return
+                items, self._pending = self._pending, []
+                completed, total, message = self.completed, self.total, self._message
+                changed = completed != self._sent_completed
+                self._last_sent = now
+                self._sent_completed = completed
+
+            if items:
+                self._sequence += 1
+                self._send(lambda: self._ctx.log(
+                    f"{self.tool_name}: {len(items)}件の部分結果",
+                    level="info",
+                    logger_name=PARTIAL_RESULTS_LOGGER,
+                    extra={
+                        'tool': self.tool_name,
+                        'sequence': self._sequence,
+                        'completed': completed,
+                        'total': total,
+                        'items': items
+                    }
+                ))
+            if changed or force:
+                self._send(lambda: self._ctx.report_progress(completed, total, message))
+
+    def _send(self, notification: Callable[[], Coroutine[Any, Any, None]]):
+        if not self.enabled:
+            return
+        try:
+            # 送信は_send_lockで直列化されているため、保持したコンテキストに同時に入ることはない
+            future = self._context.run(asyncio.run_coroutine_threadsafe, notification(), self._loop)
+            future.result(timeout=_SEND_TIMEOUT)
+        except Exception as e:
+            # 通知の失敗でツール自体は失敗させない（以降の通知は送信しない）
+            logger.warning(f"Failed to send progress notification for {self.tool_name}: {str(e)}")
+            self.enabled = False
+            self.streaming = False
+
+    def __enter__(self) -> "ToolProgress":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Contextがない呼び出し（直接呼び出しなど）で使用する、何も送信しないインスタンス
+NO_PROGRESS = ToolProgress()
+
+
+def tool_progress(ctx: Any, tool_name: str, total: Optional[int] = None) -> ToolProgress:
+    """ツール呼び出し用の進捗通知を作成（ツール関数を実行しているスレッドから呼び出す）"""
+    if ctx is None:
+        return NO_PROGRESS
+    return ToolProgress(ctx, tool_name, total)
+
+# Made with Bob
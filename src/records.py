@@ -0,0 +1,156 @@
+"""
+ユーザー・グループメンバーのレコード型
+APIレスポンスの辞書をそのまま保持する代わりに、__slots__を使った軽量なレコードとして保持します。
+よく使うプロパティは属性として、それ以外のプロパティはJSONのバイト列として保持し、
+参照されたときにだけデコードします。
+"""
+
+import hashlib
+import json
+import sys
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+# 属性として保持するUserのプロパティ（ODataのプロパティ名, 属性名）
+_USER_CORE_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ('userId', 'user_id'),
+    ('username', 'username'),
+    ('firstName', 'first_name'),
+    ('lastName', 'last_name'),
+    ('email', 'email'),
+    ('status', 'status'),
+)
+_USER_CORE_NAMES = {name: attribute for name, attribute in _USER_CORE_FIELDS}
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+class UserRecord:
+    """Userエンティティのスカラー値のプロパティを保持するレコード
+
+    __metadataやナビゲーションプロパティ（__deferred、展開結果）は保持しません。
+    """
+
+    __slots__ = ('user_id', 'username', 'first_name', 'last_name', 'email', 'status', '_extra')
+
+    def __init__(
+        self,
+        user_id: str,
+        username: Optional[str] = None,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None,
+        email: Optional[str] = None,
+        status: Optional[str] = None,
+        extra: Optional[Dict[str, Any]] = None
+    ):
+        self.user_id = user_id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        # statusは値の種類が少ないため、同じ文字列オブジェクトを共有する
+        self.status = sys.intern(status) if isinstance(status, str) else status
+        self._extra = json.dumps(extra, ensure_ascii=False, separators=(',', ':')).encode('utf-8') if extra else b''
+
+    @classmethod
+    def from_entity(cls, entity: Dict[str, Any]) -> "UserRecord":
+        """APIレスポンスのUserエンティティからレコードを作成"""
+        core = {}
+        extra = {}
+        for key, value in entity.items():
+            if key == '__metadata' or not _is_scalar(value):
+                continue
+            if key in _USER_CORE_NAMES:
+                core[_USER_CORE_NAMES[key]] = value
+            else:
+                extra[key] = value
+        return cls(extra=extra, **core)
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        """属性として保持していないプロパティ（参照のたびにデコード）"""
+        return json.loads(self._extra) if self._extra else {}
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """ODataのプロパティ名で値を取得"""
+        attribute = _USER_CORE_NAMES.get(name)
+        if attribute is not None:
+            value = getattr(self, attribute)
+            return default if value is None else value
+        return self.extra.get(name, default)
+
+    def to_dict(self, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """ODataのプロパティ名をキーとした辞書に変換
+
+        Args:
+            fields: 含めるプロパティ（Noneの場合は全プロパティ）。属性のみで足りる場合はデコードしない
+        """
+        if fields is not None:
+            fields = list(fields)
+            if all(field in _USER_CORE_NAMES for field in fields):
+                return {field: getattr(self, _USER_CORE_NAMES[field]) for field in fields}
+            values = self.to_dict()
+            return {field: values.get(field) for field in fields}
+        values = {
+            name: getattr(self, attribute)
+            for name, attribute in _USER_CORE_FIELDS
+            if getattr(self, attribute) is not None or name == 'userId'
+        }
+        values.update(self.extra)
+        return values
+
+    def merged(self, values: Dict[str, Any]) -> "UserRecord":
+        """プロパティを上書きした新しいレコードを返す"""
+        return UserRecord.from_entity({**self.to_dict(), **values})
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, UserRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"UserRecord(user_id={self.user_id!r}, username={self.username!r})"
+
+
+def membership_fingerprint(members: Iterable[str]) -> str:
+    """メンバー一覧のフィンガープリント（順序に依存しない）"""
+    digest = hashlib.sha256("\n".join(sorted(set(members))).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class GroupMembership:
+    """Dynamic Groupのメンバー一覧（読み取り時点のスナップショット）
+
+    グループのレスポンス全体（dgIncludePoolsの入れ子構造）は保持せず、
+    グループ名とメンバーのタプル、フィンガープリントのみを保持します。
+    """
+
+    __slots__ = ('group_id', 'group_name', 'members', 'fingerprint', 'exists')
+
+    def __init__(self, group_id: str, group_name: Optional[str], members: Iterable[str], exists: bool = True):
+        self.group_id = group_id
+        self.group_name = group_name
+        self.members: Tuple[str, ...] = tuple(dict.fromkeys(members))
+        self.fingerprint = membership_fingerprint(self.members)
+        self.exists = exists
+
+    def member_list(self) -> List[str]:
+        return list(self.members)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.members
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'groupId': self.group_id,
+            'groupName': self.group_name,
+            'members': list(self.members),
+            'fingerprint': self.fingerprint
+        }
+
+    def __repr__(self) -> str:
+        return f"GroupMembership(group_id={self.group_id!r}, members={len(self.members)})"
+
+# Made with Bob
@@ -5,11 +5,25 @@ OData API v2を使用してSAP SuccessFactorsと通信します
 
 import base64
 import logging
-from typing import Dict, Any, Optional, List
-import requests
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Callable
+from urllib.parse import urlsplit
 from requests.exceptions import RequestException, Timeout, ConnectionError
 
 from .config.settings import get_settings
+from .config.tenants import TenantConfig
+from .transport import SAPTransport, get_transport
+from .odata_batch import build_changeset_batch, parse_batch_response, error_message
+from .entity_cache import EntityCache
+from .records import GroupMembership, UserRecord, membership_fingerprint
+from .user_index import UserSearchIndex
+from .concurrency import (
+    RateLimiter, BulkheadRegistry, RequestHedger, BulkheadFullError,
+    get_rate_limiter, get_bulkheads, get_hedger
+)
 
 logger = logging.getLogger(__name__)
 
@@ -32,26 +46,77 @@ class SAPAPIError(SAPClientError):
         self.response_data = response_data
 
 
+class GroupConflictError(SAPAPIError):
+    """Dynamic Groupのメンバーが読み取り後に他の更新者によって変更された"""
+    def __init__(self, message: str):
+        super().__init__(message, status_code=409)
+
+
+# ユーザーキャッシュのエントリが全プロパティを取得したものであることを示すキー
+_COMPLETE_ENTITY = '__complete__'
+
+
+def _odata_string(value: str) -> str:
+    """OData v2の文字列リテラル（単一引用符はエスケープ）"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _scalar_properties(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """エンティティからスカラー値のプロパティのみを取り出す（__metadataやナビゲーションを除く）"""
+    return {
+        key: value for key, value in entity.items()
+        if not key.startswith('__') and not isinstance(value, (dict, list))
+    }
+
+
 class SAPSuccessFactorsClient:
     """SAP SuccessFactors APIクライアント"""
     
-    def __init__(self):
-        """クライアントの初期化"""
+    def __init__(
+        self,
+        tenant: Optional[TenantConfig] = None,
+        transport: Optional[SAPTransport] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        bulkheads: Optional[BulkheadRegistry] = None,
+        hedger: Optional[RequestHedger] = None
+    ):
+        """クライアントの初期化
+        
+        Args:
+            tenant: 接続先テナントの設定（省略時は環境変数の設定）
+            transport: 使用するトランスポート（省略時はデフォルトテナントの共有トランスポート）
+            rate_limiter: 使用するレートリミッター（省略時はデフォルトテナントのもの）
+            bulkheads: 使用するバルクヘッド（省略時はデフォルトテナントのもの）
+            hedger: 読み取りリクエストのヘッジ（省略時はデフォルトテナントのもの、無効の場合はNone）
+        """
         self.settings = get_settings()
-        self.base_url = self.settings.sap_api_url
-        self.company_id = self.settings.sap_company_id
-        self.user_id = self.settings.sap_user_id
-        self.password = self.settings.sap_password
+        self.tenant = tenant or TenantConfig.from_settings(self.settings)
+        self.base_url = self.tenant.sap_api_url
+        self.company_id = self.tenant.sap_company_id
+        self.user_id = self.tenant.sap_user_id
+        self.password = self.tenant.password()
         
         # OData API v2エンドポイント
         self.odata_endpoint = f"{self.base_url}/odata/v2"
         
-        # セッション設定
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Accept': 'application/json',
-            'Content-Type': 'application/json'
-        })
+        # 共有トランスポート（接続プール・DNSキャッシュ・TLSセッションを再利用）
+        self.transport = transport or get_transport()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.bulkheads = bulkheads or get_bulkheads()
+        self.hedger = hedger or get_hedger()
+        
+        # 取得・更新したユーザーのプロパティ（差分更新の比較に使用）
+        self.user_cache = EntityCache(ttl=self.settings.sap_entity_cache_ttl)
+        self.group_cache = EntityCache(ttl=self.settings.sap_entity_cache_ttl)
+        # 検索用のユーザーのスナップショット（最初の検索時に同期）
+        self.user_index = UserSearchIndex(
+            refresh_interval=self.settings.user_index_refresh_interval,
+            full_sync_interval=self.settings.user_index_full_sync_interval
+        )
+        self._metadata: Optional[str] = None
+        # 同じプロセス内のDynamic Group更新はグループごとに直列化する
+        self._group_locks: Dict[str, threading.Lock] = {}
+        self._group_locks_lock = threading.Lock()
         
         logger.info(f"SAP Client initialized for {self.base_url}")
     
@@ -68,89 +133,78 @@ class SAPSuccessFactorsClient:
         base64_bytes = base64.b64encode(auth_bytes)
         return base64_bytes.decode('ascii')
     
-    def _make_request(
+    def _send(
         self,
         method: str,
         endpoint: str,
         params: Optional[Dict[str, Any]] = None,
         data: Optional[Dict[str, Any]] = None,
-        timeout: int = 30
-    ) -> Dict[str, Any]:
-        """APIリクエストを実行
+        headers: Optional[Dict[str, str]] = None,
+        timeout: int = 30,
+        body: Optional[bytes] = None
+    ):
+        """HTTPリクエストを送信
+        
+        エンドポイント種別ごとのバルクヘッドとレートリミッターを経由して送信し、
+        通信エラーをSAPAPIErrorに変換します。ステータスコードは検査しません。
         
         Args:
-            method: HTTPメソッド (GET, POST, PUT, DELETE)
+            method: HTTPメソッド
             endpoint: APIエンドポイント
             params: クエリパラメータ
             data: リクエストボディ
+            headers: 追加のリクエストヘッダー
             timeout: タイムアウト秒数
+            body: JSON以外のリクエストボディ（dataの代わりに送信）
             
         Returns:
-            APIレスポンス
+            HTTPレスポンス
             
         Raises:
-            SAPAuthenticationError: 認証エラー
-            SAPAPIError: APIエラー
+            SAPAPIError: 通信エラー、またはリクエストが混雑している場合
         """
         # 認証ヘッダーを追加
         auth_header = self._create_auth_header()
-        headers = {
+        request_headers = {
             'Authorization': f'Basic {auth_header}',
-            **self.session.headers
+            **(headers or {})
         }
         
         # 完全なURL
         url = f"{self.odata_endpoint}/{endpoint}"
         
-        logger.debug(f"Making {method} request to {url}")
+        logger.debug("Making %s request to %s", method, url, extra={'event': 'request'})
+        
+        # エンドポイント種別ごとの同時実行数を制限（書き込みが一覧取得に埋もれないようにする）
+        bulkhead = self.bulkheads.for_request(method, endpoint)
+        queued = time.perf_counter()
+        try:
+            bulkhead.acquire()
+        except BulkheadFullError as e:
+            logger.error(f"Request rejected: {str(e)}")
+            raise SAPAPIError(f"リクエストが混雑しています。しばらくしてから再試行してください: {str(e)}")
         
+        status_code = None
+        started = time.perf_counter()
         try:
-            response = self.session.request(
+            # テナント全体のリクエストレートを制限
+            self.rate_limiter.acquire()
+            # レート制限の待ち時間はqueue_msに含め、レイテンシには含めない
+            started = time.perf_counter()
+            queue_ms = (started - queued) * 1000
+            
+            response = self.transport.request(
                 method=method,
                 url=url,
                 params=params,
                 json=data,
-                headers=headers,
-                timeout=timeout
+                headers=request_headers,
+                timeout=timeout,
+                body=body
             )
-            
-            # ステータスコードのチェック
-            if response.status_code == 401:
-                logger.error("Authentication failed")
-                raise SAPAuthenticationError(
-                    "認証に失敗しました。Company ID、User ID、Passwordを確認してください。"
-                )
-            
-            if response.status_code == 403:
-                logger.error("Access forbidden")
-                raise SAPAPIError(
-                    "アクセスが拒否されました。APIユーザーの権限を確認してください。",
-                    status_code=403
-                )
-            
-            if response.status_code == 404:
-                logger.error(f"Endpoint not found: {url}")
-                raise SAPAPIError(
-                    f"エンドポイントが見つかりません: {endpoint}",
-                    status_code=404
-                )
-            
-            if not response.ok:
-                error_data = None
-                try:
-                    error_data = response.json()
-                except:
-                    pass
-                
-                logger.error(f"API error: {response.status_code} - {response.text}")
-                raise SAPAPIError(
-                    f"APIエラー: {response.status_code}",
-                    status_code=response.status_code,
-                    response_data=error_data
-                )
-            
-            # レスポンスをJSON形式で返す
-            return response.json()
+            status_code = response.status_code
+            response.timings['queue_ms'] = queue_ms
+            return response
             
         except Timeout:
             logger.error("Request timeout")
@@ -163,6 +217,163 @@ class SAPSuccessFactorsClient:
         except RequestException as e:
             logger.error(f"Request exception: {str(e)}")
             raise SAPAPIError(f"リクエストエラー: {str(e)}")
+        
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            bulkhead.release(latency_ms, status_code)
+            if self.hedger is not None and status_code is not None:
+                self.hedger.record_latency(bulkhead.name, latency_ms)
+    
+    def _send_hedged(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        timeout: int = 30
+    ):
+        """冪等な読み取りリクエストをヘッジ付きで送信
+        
+        直近レイテンシのパーセンタイル値を過ぎても応答がない場合、予算の範囲内で
+        同じリクエストをもう1本送信し、先に返ったレスポンスを採用します。
+        遅れた方のリクエストは完了まで実行され、結果は破棄されます。
+        
+        Returns:
+            HTTPレスポンス
+        """
+        hedger = self.hedger
+        family = self.bulkheads.classify(method, endpoint)
+        hedger.start_request()
+        
+        primary = hedger.executor.submit(self._send, method, endpoint, params, None, None, timeout)
+        done, _ = wait([primary], timeout=hedger.delay_seconds(family))
+        if done or not hedger.try_acquire_hedge():
+            return primary.result()
+        
+        logger.debug(f"Hedging slow {family} request: {endpoint}")
+        hedge = hedger.executor.submit(self._send, method, endpoint, params, None, None, timeout)
+        pending = {primary, hedge}
+        error = None
+        fallback = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except SAPAPIError as e:
+                    # 通信エラーの場合はもう一方の結果を待つ
+                    error = e
+                    continue
+                if response.status_code >= 500 and pending:
+                    fallback = response
+                    continue
+                if future is hedge:
+                    hedger.record_win()
+                return response
+        if fallback is not None:
+            return fallback
+        raise error
+    
+    def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """APIリクエストを実行
+        
+        Args:
+            method: HTTPメソッド (GET, POST, PUT, DELETE)
+            endpoint: APIエンドポイント
+            params: クエリパラメータ
+            data: リクエストボディ
+            timeout: タイムアウト秒数
+            headers: 追加のリクエストヘッダー
+            
+        Returns:
+            APIレスポンス
+            
+        Raises:
+            SAPAuthenticationError: 認証エラー
+            SAPAPIError: APIエラー
+        """
+        started = time.perf_counter()
+        if self.hedger is not None and data is None and self.hedger.applies(method, self.bulkheads.classify(method, endpoint)):
+            response = self._send_hedged(method, endpoint, params=params, timeout=timeout)
+        else:
+            response = self._send(method, endpoint, params=params, data=data, headers=headers, timeout=timeout)
+        
+        if not response.ok:
+            self._record_timing(method, endpoint, response, started)
+        
+        # ステータスコードのチェック
+        if response.status_code == 401:
+            logger.error("Authentication failed")
+            raise SAPAuthenticationError(
+                "認証に失敗しました。Company ID、User ID、Passwordを確認してください。"
+            )
+        
+        if response.status_code == 403:
+            logger.error("Access forbidden")
+            raise SAPAPIError(
+                "アクセスが拒否されました。APIユーザーの権限を確認してください。",
+                status_code=403
+            )
+        
+        if response.status_code == 404:
+            logger.error(f"Endpoint not found: {self.odata_endpoint}/{endpoint}")
+            raise SAPAPIError(
+                f"エンドポイントが見つかりません: {endpoint}",
+                status_code=404
+            )
+        
+        if not response.ok:
+            error_data = None
+            try:
+                error_data = response.json()
+            except:
+                pass
+            
+            # 本文はログ出力時に上限文字数まで切り詰められる
+            logger.error("API error: %s - %s", response.status_code, response.content, extra={'event': 'api_error'})
+            raise SAPAPIError(
+                f"APIエラー: {response.status_code}",
+                status_code=response.status_code,
+                response_data=error_data
+            )
+        
+        # 204 No Content（MERGE等）はボディを持たない
+        if not response.content:
+            self._record_timing(method, endpoint, response, started)
+            return {}
+        
+        # レスポンスをJSON形式で返す（デコード時間も計測）
+        decode_started = time.perf_counter()
+        result = response.json()
+        self._record_timing(method, endpoint, response, started, (time.perf_counter() - decode_started) * 1000)
+        return result
+    
+    def _record_timing(
+        self,
+        method: str,
+        endpoint: str,
+        response,
+        started: float,
+        decode_ms: Optional[float] = None
+    ):
+        """リクエストの時間内訳をトランスポートの計測に記録"""
+        timing = dict(getattr(response, 'timings', None) or {})
+        timing.update(
+            method=method,
+            endpoint=endpoint,
+            family=self.bulkheads.classify(method, endpoint),
+            status_code=response.status_code,
+            decode_ms=decode_ms,
+            total_ms=(time.perf_counter() - started) * 1000
+        )
+        self.transport.timings.record(timing)
     
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """ユーザー情報を取得
@@ -179,22 +390,135 @@ class SAPSuccessFactorsClient:
                 endpoint=f"User('{user_id}')"
             )
             
-            if 'd' in response:
-                return response['d']
-            return response
+            user = response['d'] if 'd' in response else response
+            self.user_cache.merge(user_id, {**_scalar_properties(user), _COMPLETE_ENTITY: True})
+            if self.user_index.ready:
+                self.user_index.put(UserRecord.from_entity(user))
+            return user
             
         except SAPAPIError as e:
             if e.status_code == 404:
+                self.user_cache.invalidate(user_id)
+                self.user_index.remove(user_id)
                 return None
             raise
     
-    def list_users(self, top: int = 10, skip: int = 0, filter_query: Optional[str] = None) -> List[Dict[str, Any]]:
+    def _cached_user(self, user_id: str, select: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+        """キャッシュから要求されたプロパティが揃ったユーザーを取得"""
+        cached = self.user_cache.get(user_id)
+        if cached is None:
+            return None
+        if select is None:
+            return cached if cached.get(_COMPLETE_ENTITY) else None
+        return cached if all(name in cached for name in select) else None
+    
+    def _user_id_chunks(self, user_ids: List[str], chunk_size: int) -> List[List[str]]:
+        """$filterの長さが上限を超えないようにユーザーIDを分割"""
+        limit = self.settings.sap_filter_max_chars
+        chunks: List[List[str]] = []
+        chunk: List[str] = []
+        length = len("userId in ")
+        for user_id in user_ids:
+            literal = len(_odata_string(user_id)) + 1
+            if chunk and (len(chunk) >= chunk_size or length + literal > limit):
+                chunks.append(chunk)
+                chunk, length = [], len("userId in ")
+            chunk.append(user_id)
+            length += literal
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+    
+    def _fetch_users_by_id(self, user_ids: List[str], select: Optional[List[str]]) -> List[Dict[str, Any]]:
+        params = {
+            '$filter': "userId in " + ",".join(_odata_string(user_id) for user_id in user_ids),
+            '$top': len(user_ids),
+            '$format': 'json'
+        }
+        if select:
+            params['$select'] = ','.join(select)
+        response = self._make_request(method='GET', endpoint='User', params=params)
+        return response.get('d', {}).get('results', [])
+    
+    def get_users(
+        self,
+        user_ids: List[str],
+        select: Optional[List[str]] = None,
+        chunk_size: int = 100,
+        workers: int = 1
+    ) -> Dict[str, Any]:
+        """複数のユーザーをまとめて取得
+        
+        重複を除いたユーザーIDのうち、キャッシュにあるものはAPIを呼ばずに返し、
+        残りを$filter=userId in ...で1リクエストあたりchunk_size件ずつ
+        （$filterの長さがsap_filter_max_charsを超えない範囲で）並行に取得します。
+        
+        Args:
+            user_ids: ユーザーIDのリスト
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
+            chunk_size: 1リクエストで取得する最大件数
+            workers: 並行に送信するリクエスト数
+            
+        Returns:
+            {"users": {ユーザーID: ユーザー情報}, "missing": 見つからなかったユーザーID, "cached": キャッシュから返した件数, "requests": リクエスト数}
+            
+        Raises:
+            SAPAPIError: API呼び出しエラー
+        """
+        if select and 'userId' not in select:
+            select = ['userId'] + list(select)
+        unique_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+        
+        users: Dict[str, Dict[str, Any]] = {}
+        to_fetch = []
+        for user_id in unique_ids:
+            cached = self._cached_user(user_id, select)
+            if cached is not None:
+                users[user_id] = cached
+            else:
+                to_fetch.append(user_id)
+        cached_count = len(users)
+        
+        chunks = self._user_id_chunks(to_fetch, chunk_size)
+        if chunks:
+            logger.info(f"Fetching {len(to_fetch)} user(s) in {len(chunks)} request(s) ({cached_count} cached)")
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as executor:
+                pages = list(executor.map(lambda chunk: self._fetch_users_by_id(chunk, select), chunks))
+            for user in (user for page in pages for user in page):
+                user_id = user.get('userId')
+                values = _scalar_properties(user)
+                self.user_cache.merge(user_id, values if select else {**values, _COMPLETE_ENTITY: True})
+                if not select and self.user_index.ready:
+                    self.user_index.put(UserRecord.from_entity(user))
+                users[user_id] = values
+        
+        for user_id, values in users.items():
+            if select:
+                users[user_id] = {name: values.get(name) for name in select}
+            else:
+                users[user_id] = {key: value for key, value in values.items() if key != _COMPLETE_ENTITY}
+        
+        return {
+            'users': {user_id: users[user_id] for user_id in unique_ids if user_id in users},
+            'missing': [user_id for user_id in unique_ids if user_id not in users],
+            'cached': cached_count,
+            'requests': len(chunks)
+        }
+    
+    def list_users(
+        self,
+        top: int = 10,
+        skip: int = 0,
+        filter_query: Optional[str] = None,
+        select: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
         """ユーザー一覧を取得
         
         Args:
             top: 取得件数
             skip: スキップ件数
             filter_query: フィルタクエリ（OData形式）
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
             
         Returns:
             ユーザー一覧
@@ -208,6 +532,9 @@ class SAPSuccessFactorsClient:
         if filter_query:
             params['$filter'] = filter_query
         
+        if select:
+            params['$select'] = ','.join(select)
+        
         response = self._make_request(
             method='GET',
             endpoint='User',
@@ -218,6 +545,181 @@ class SAPSuccessFactorsClient:
             return response['d']['results']
         return []
     
+    def count_users(self, filter_query: Optional[str] = None) -> int:
+        """条件に一致するユーザー数を取得（$count）
+        
+        エンティティ本体を返さないため、全件取得して数えるよりはるかに低コストです。
+        
+        Args:
+            filter_query: フィルタクエリ（OData形式）
+            
+        Returns:
+            ユーザー数
+        """
+        params = {}
+        if filter_query:
+            params['$filter'] = filter_query
+        
+        # $countは数値のみのテキストを返すため、JSONとしてそのまま整数に変換される
+        response = self._make_request(
+            method='GET',
+            endpoint='User/$count',
+            params=params
+        )
+        return int(response)
+    
+    def list_users_page(
+        self,
+        top: int = 10,
+        skip: int = 0,
+        filter_query: Optional[str] = None,
+        select: Optional[List[str]] = None,
+        inline_count: bool = False,
+        order_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """ユーザー一覧を1ページ取得（総件数付き）
+        
+        Args:
+            top: 取得件数
+            skip: スキップ件数
+            filter_query: フィルタクエリ（OData形式）
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
+            inline_count: 条件に一致する総件数も取得するか（$inlinecount=allpages）
+            order_by: 並び順（$orderby、複数ページに分けて取得する場合は安定した順序を指定）
+            
+        Returns:
+            {"results": ユーザー一覧, "count": 総件数（inline_count=Falseの場合はNone）}
+        """
+        params = {
+            '$top': top,
+            '$skip': skip,
+            '$format': 'json'
+        }
+        
+        if filter_query:
+            params['$filter'] = filter_query
+        
+        if select:
+            params['$select'] = ','.join(select)
+        
+        if inline_count:
+            params['$inlinecount'] = 'allpages'
+        
+        if order_by:
+            params['$orderby'] = order_by
+        
+        response = self._make_request(
+            method='GET',
+            endpoint='User',
+            params=params
+        )
+        
+        data = response.get('d', {})
+        count = data.get('__count')
+        return {
+            'results': data.get('results', []),
+            'count': int(count) if count is not None else None
+        }
+    
+    def iter_user_pages(
+        self,
+        page_size: int = 1000,
+        filter_query: Optional[str] = None,
+        select: Optional[List[str]] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """ユーザーをページ単位で順次取得するジェネレータ
+        
+        スナップショットページング（paging=snapshot）で返される__nextリンクを辿ります。
+        __nextが返されない場合は$skipによるページングにフォールバックします。
+        常に1ページ分のみを保持するため、全件取得でもメモリ使用量は一定です。
+        
+        Args:
+            page_size: 1ページあたりの取得件数
+            filter_query: フィルタクエリ（OData形式）
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
+            
+        Yields:
+            1ページ分のユーザー一覧
+        """
+        params: Optional[Dict[str, Any]] = {
+            '$format': 'json',
+            '$orderby': 'userId',
+            'customPageSize': page_size,
+            'paging': 'snapshot'
+        }
+        if filter_query:
+            params['$filter'] = filter_query
+        if select:
+            params['$select'] = ','.join(select)
+        
+        endpoint = 'User'
+        skip = 0
+        while True:
+            response = self._make_request(method='GET', endpoint=endpoint, params=params)
+            data = response.get('d', {})
+            results = data.get('results', [])
+            if results:
+                yield results
+            
+            next_link = data.get('__next')
+            if next_link:
+                endpoint = self._next_endpoint(next_link)
+                params = None
+                continue
+            
+            if len(results) < page_size:
+                return
+            
+            # __nextをサポートしない場合は$skipで次のページへ（順序を固定して重複・欠落を防ぐ）
+            skip += len(results)
+            endpoint = 'User'
+            params = {'$format': 'json', '$orderby': 'userId', '$top': page_size, '$skip': skip}
+            if filter_query:
+                params['$filter'] = filter_query
+            if select:
+                params['$select'] = ','.join(select)
+    
+    def _next_endpoint(self, next_link: str) -> str:
+        """__nextリンクをOData APIエンドポイントからの相対パス（クエリ含む）に変換
+        
+        __nextは完全なURLで返されるのが通常ですが、相対パスの場合もそのまま使用します。
+        接続先と異なるホスト・パスのURLには認証情報を送信しないため、エラーとします。
+        
+        Raises:
+            SAPAPIError: __nextが接続先のOData APIエンドポイント外を指している場合
+        """
+        link = urlsplit(next_link)
+        if not link.scheme and not link.netloc:
+            return next_link.lstrip('/')
+        
+        base = urlsplit(self.odata_endpoint)
+        base_path = base.path.rstrip('/') + '/'
+        if (link.scheme.lower(), link.netloc.lower()) != (base.scheme.lower(), base.netloc.lower()) \
+                or not link.path.startswith(base_path):
+            raise SAPAPIError(f"Unexpected __next link outside {self.odata_endpoint}: {next_link}")
+        
+        endpoint = link.path[len(base_path):]
+        return f"{endpoint}?{link.query}" if link.query else endpoint
+    
+    def iter_users(
+        self,
+        page_size: int = 1000,
+        filter_query: Optional[str] = None,
+        select: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """全ユーザーを1件ずつ返すジェネレータ
+        
+        Args:
+            page_size: 1ページあたりの取得件数
+            filter_query: フィルタクエリ（OData形式）
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
+            
+        Yields:
+            ユーザー情報
+        """
+        for page in self.iter_user_pages(page_size=page_size, filter_query=filter_query, select=select):
+            yield from page
+    
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """新規ユーザーを作成
         
@@ -238,6 +740,8 @@ class SAPSuccessFactorsClient:
             data=user_data
         )
         
+        self.user_index.apply(user_data.get('userId'), user_data)
+        
         if 'd' in response:
             logger.info(f"User created successfully: {response['d'].get('userId')}")
             return response['d']
@@ -245,6 +749,164 @@ class SAPSuccessFactorsClient:
         logger.info("User created successfully")
         return response
     
+    def update_user_fields(self, user_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """変更のあるフィールドのみを更新（差分MERGE）
+        
+        現在の値（キャッシュ、なければ対象フィールドのみを$selectで取得）と比較し、
+        変更がなければAPIを呼び出さず、変更があれば変更されたフィールドのみをMERGEで送信します。
+        キャッシュは短時間（SAP_ENTITY_CACHE_TTL）のみ保持されるため、その間に他の経路で
+        変更された値との比較になる場合があります。
+        
+        Args:
+            user_id: ユーザーID
+            fields: 更新するフィールド
+            
+        Returns:
+            更新結果（changed: {フィールド: {from, to}}, unchanged: [フィールド], skipped: 更新を省略したか）
+            
+        Raises:
+            SAPAPIError: ユーザーが存在しない場合、またはAPI呼び出しエラー
+        """
+        current = self._current_user_fields(user_id, list(fields.keys()))
+        if current is None:
+            raise SAPAPIError(f"ユーザーが見つかりません: {user_id}", status_code=404)
+        
+        changed = {
+            name: {'from': current.get(name), 'to': value}
+            for name, value in fields.items()
+            if current.get(name) != value
+        }
+        unchanged = [name for name in fields if name not in changed]
+        
+        if not changed:
+            logger.info(f"No changes for user {user_id}, skipping update")
+            return {'changed': {}, 'unchanged': unchanged, 'skipped': True}
+        
+        self.merge_user(user_id, {name: change['to'] for name, change in changed.items()})
+        return {'changed': changed, 'unchanged': unchanged, 'skipped': False}
+    
+    def _current_user_fields(self, user_id: str, names: List[str]) -> Optional[Dict[str, Any]]:
+        """ユーザーの指定プロパティの現在値を取得（キャッシュに揃っていればAPIを呼ばない）"""
+        cached = self.user_cache.get(user_id)
+        if cached is not None and all(name in cached for name in names):
+            return cached
+        
+        try:
+            response = self._make_request(
+                method='GET',
+                endpoint=f"User('{user_id}')",
+                params={'$select': ','.join(names), '$format': 'json'}
+            )
+        except SAPAPIError as e:
+            if e.status_code == 404:
+                return None
+            raise
+        
+        user = response['d'] if 'd' in response else response
+        values = {name: user.get(name) for name in names}
+        self.user_cache.merge(user_id, values)
+        return {**(cached or {}), **values}
+    
+    def upsert_users(
+        self,
+        entities: List[Dict[str, Any]],
+        chunk_size: int = 100,
+        workers: int = 1,
+        on_chunk: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """複数のUserエンティティをupsert APIで作成または更新
+        
+        chunk_size件ずつ1回のupsert呼び出しにまとめて送信し、レスポンスに含まれる
+        エンティティごとのステータスを解析します。呼び出し自体が失敗したチャンクは、
+        そのチャンクの全エンティティを失敗として返します。
+        
+        Args:
+            entities: Userエンティティのリスト（userId必須、__metadataは自動で付与）
+            chunk_size: 1回のupsert呼び出しに含めるエンティティ数
+            workers: 並行に送信するupsert呼び出し数
+            on_chunk: チャンクの結果が得られるたびに呼び出す関数（完了順、ワーカースレッドから呼び出される）
+            
+        Returns:
+            エンティティごとの結果（index, userId, status: created/updated/upserted/failed,
+            edit_status, http_code, message）、entitiesと同じ順序
+        """
+        chunk_size = max(chunk_size, 1)
+        chunks = [
+            (offset, entities[offset:offset + chunk_size])
+            for offset in range(0, len(entities), chunk_size)
+        ]
+        logger.info(f"Upserting {len(entities)} user(s) in {len(chunks)} chunk(s)")
+        
+        def upsert_chunk(chunk: Tuple[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+            results = self._upsert_user_chunk(*chunk)
+            if on_chunk is not None:
+                on_chunk(results)
+            return results
+        
+        if workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                chunk_results = list(executor.map(upsert_chunk, chunks))
+        else:
+            chunk_results = [upsert_chunk(chunk) for chunk in chunks]
+        
+        return [result for results in chunk_results for result in results]
+    
+    def _upsert_user_chunk(self, offset: int, entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        payload = [
+            {'__metadata': {'uri': f"User('{entity.get('userId')}')"}, **entity}
+            for entity in entities
+        ]
+        
+        try:
+            response = self._make_request(
+                method='POST',
+                endpoint='upsert',
+                params={'$format': 'json'},
+                data=payload
+            )
+        except SAPClientError as e:
+            logger.error(f"User upsert failed for {len(entities)} entit(ies): {str(e)}")
+            return [
+                {
+                    'index': offset + i,
+                    'userId': entity.get('userId'),
+                    'status': 'failed',
+                    'edit_status': None,
+                    'http_code': getattr(e, 'status_code', None),
+                    'message': str(e)
+                }
+                for i, entity in enumerate(entities)
+            ]
+        
+        statuses = response.get('d', response) if isinstance(response, dict) else response
+        if isinstance(statuses, dict):
+            statuses = statuses.get('results', [statuses])
+        
+        results = []
+        for i, entity in enumerate(entities):
+            self.user_cache.invalidate(entity.get('userId'))
+            status = statuses[i] if i < len(statuses) else {}
+            edit_status = status.get('editStatus')
+            if status.get('status') != 'OK':
+                outcome = 'failed'
+            elif edit_status == 'INSERTED':
+                outcome = 'created'
+            elif edit_status == 'UPDATED':
+                outcome = 'updated'
+            else:
+                outcome = 'upserted'
+            if outcome != 'failed':
+                self.user_index.apply(entity.get('userId'), entity)
+            results.append({
+                'index': offset + i,
+                'userId': entity.get('userId'),
+                'status': outcome,
+                'edit_status': edit_status,
+                'http_code': status.get('httpCode'),
+                'message': status.get('message') or (None if status else "upsertレスポンスに結果が含まれていません")
+            })
+        return results
+    
     def update_user(self, user_id: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """ユーザー情報を更新
         
@@ -262,10 +924,113 @@ class SAPSuccessFactorsClient:
             endpoint=f"User('{user_id}')",
             data=user_data
         )
+        # PUTは指定しなかったプロパティもリセットされ得るため、キャッシュは破棄する
+        self.user_cache.invalidate(user_id)
+        self.user_index.apply(user_id, user_data)
         
         logger.info(f"User updated successfully: {user_id}")
         return response
     
+    def merge_user(self, user_id: str, fields: Dict[str, Any]) -> None:
+        """ユーザーの指定したフィールドのみを更新（MERGE）
+        
+        PUTと異なり、指定しなかったフィールドは変更されません。
+        
+        Args:
+            user_id: ユーザーID
+            fields: 更新するフィールド
+        """
+        logger.info(f"Merging user: {user_id} ({', '.join(fields.keys())})")
+        
+        self._make_request(
+            method='POST',
+            endpoint=f"User('{user_id}')",
+            data=fields,
+            headers={'X-HTTP-Method': 'MERGE'}
+        )
+        self.user_cache.merge(user_id, fields)
+        self.user_index.apply(user_id, fields)
+    
+    def batch_merge_users(self, updates: List[Tuple[str, Dict[str, Any]]], timeout: int = 120) -> List[Dict[str, Any]]:
+        """複数ユーザーの部分更新（MERGE）を1つの$batchチェンジセットで送信
+        
+        チェンジセットはアトミックに処理されるため、1件でも失敗した場合は
+        すべての更新がロールバックされ、全件がchangeset_failed=Trueの失敗として返ります。
+        
+        Args:
+            updates: (ユーザーID, 更新するフィールド)のリスト
+            timeout: タイムアウト秒数
+            
+        Returns:
+            更新ごとの結果（userId, success, status_code, error, changeset_failed）、updatesと同じ順序
+            
+        Raises:
+            SAPAuthenticationError: 認証エラー
+            SAPAPIError: $batchリクエスト自体が失敗した場合
+        """
+        operations = [
+            {'method': 'MERGE', 'url': f"User('{user_id}')", 'body': fields}
+            for user_id, fields in updates
+        ]
+        body, content_type = build_changeset_batch(operations)
+        
+        logger.info(f"Sending $batch changeset with {len(operations)} user update(s)")
+        started = time.perf_counter()
+        response = self._send(
+            'POST',
+            '$batch',
+            headers={'Content-Type': content_type, 'Accept': 'multipart/mixed'},
+            timeout=timeout,
+            body=body
+        )
+        self._record_timing('POST', '$batch', response, started)
+        
+        if response.status_code == 401:
+            logger.error("Authentication failed")
+            raise SAPAuthenticationError(
+                "認証に失敗しました。Company ID、User ID、Passwordを確認してください。"
+            )
+        if not response.ok:
+            logger.error("$batch error: %s - %s", response.status_code, response.content, extra={'event': 'api_error'})
+            raise SAPAPIError(f"$batchエラー: {response.status_code}", status_code=response.status_code)
+        
+        try:
+            parts = parse_batch_response(response.content, response.headers.get('Content-Type'))
+        except ValueError as e:
+            raise SAPAPIError(f"$batchレスポンスを解析できません: {str(e)}", status_code=response.status_code)
+        changeset = parts[0] if parts else []
+        
+        if isinstance(changeset, list) and len(changeset) == len(updates):
+            for (user_id, fields), part in zip(updates, changeset):
+                if 200 <= part['status_code'] < 300:
+                    self.user_cache.merge(user_id, fields)
+                    self.user_index.apply(user_id, fields)
+            return [
+                {
+                    'userId': user_id,
+                    'success': 200 <= part['status_code'] < 300,
+                    'status_code': part['status_code'],
+                    'error': None if 200 <= part['status_code'] < 300 else error_message(part['body']),
+                    'changeset_failed': False
+                }
+                for (user_id, _), part in zip(updates, changeset)
+            ]
+        
+        # チェンジセット全体が失敗した場合は単一のエラーレスポンスが返る
+        failure = changeset if isinstance(changeset, dict) else (changeset[0] if changeset else {})
+        error = error_message(failure.get('body', '')) or "チェンジセットの処理に失敗しました"
+        logger.warning(f"$batch changeset failed ({failure.get('status_code')}): {error}")
+        return [
+            {
+                'userId': user_id,
+                'success': False,
+                'status_code': failure.get('status_code'),
+                'error': error,
+                'changeset_failed': True
+            }
+            for user_id, _ in updates
+        ]
+    
     def delete_user(self, user_id: str) -> bool:
         """ユーザーを削除
         
@@ -281,10 +1046,59 @@ class SAPSuccessFactorsClient:
             method='DELETE',
             endpoint=f"User('{user_id}')"
         )
+        self.user_cache.invalidate(user_id)
+        self.user_index.remove(user_id)
         
         logger.info(f"User deleted successfully: {user_id}")
         return True
     
+    def ping(self) -> None:
+        """最小限のリクエストでAPIの疎通を確認
+        
+        ユーザー1件のuserIdのみを取得するため、応答サイズと処理コストが最小になります。
+        
+        Raises:
+            SAPClientError: 疎通確認に失敗した場合
+        """
+        self._make_request(
+            method='GET',
+            endpoint='User',
+            params={
+                '$top': 1,
+                '$select': 'userId',
+                '$format': 'json'
+            },
+            timeout=10
+        )
+    
+    def get_metadata(self, refresh: bool = False) -> str:
+        """サービスの$metadata（EDMX）を取得
+        
+        初回の取得はSuccessFactors側でも生成コストが高いため、クライアントごとに保持します。
+        
+        Args:
+            refresh: 保持している$metadataを使わずに取得し直すか
+            
+        Returns:
+            $metadataのXML文字列
+            
+        Raises:
+            SAPAPIError: API呼び出しエラー
+        """
+        if self._metadata is not None and not refresh:
+            return self._metadata
+        
+        started = time.perf_counter()
+        response = self._send('GET', '$metadata', headers={'Accept': 'application/xml'}, timeout=60)
+        self._record_timing('GET', '$metadata', response, started)
+        if not response.ok:
+            logger.error("$metadata error: %s - %s", response.status_code, response.content, extra={'event': 'api_error'})
+            raise SAPAPIError(f"$metadataの取得に失敗しました: {response.status_code}", status_code=response.status_code)
+        
+        self._metadata = response.text
+        logger.info(f"Loaded $metadata ({len(response.content)} bytes)")
+        return self._metadata
+    
     def test_connection(self) -> bool:
         """API接続をテスト
         
@@ -292,7 +1106,7 @@ class SAPSuccessFactorsClient:
             接続成功の場合True
         """
         try:
-            self.list_users(top=1)
+            self.ping()
             logger.info("Connection test successful")
             return True
         except Exception as e:
@@ -330,6 +1144,155 @@ class SAPSuccessFactorsClient:
                 return None
             raise
     
+    @staticmethod
+    def _group_members_of(expanded_group: Dict[str, Any]) -> List[str]:
+        """Expanded Dynamic Groupのレスポンスからメンバーのユーザー名を抽出"""
+        # レスポンスからユーザー名を抽出
+        # 構造: dgIncludePools -> filters -> expressions -> values -> fieldValue
+        members = []
+        
+        # dgIncludePoolsを探索
+        if 'dgIncludePools' in expanded_group:
+            pools = expanded_group['dgIncludePools']
+            # resultsがある場合
+            if isinstance(pools, dict) and 'results' in pools:
+                pools = pools['results']
+            
+            for pool in pools if isinstance(pools, list) else [pools]:
+                if 'filters' in pool:
+                    filters = pool['filters']
+                    if isinstance(filters, dict) and 'results' in filters:
+                        filters = filters['results']
+                    
+                    for filter_item in filters if isinstance(filters, list) else [filters]:
+                        if 'expressions' in filter_item:
+                            expressions = filter_item['expressions']
+                            if isinstance(expressions, dict) and 'results' in expressions:
+                                expressions = expressions['results']
+                            
+                            for expr in expressions if isinstance(expressions, list) else [expressions]:
+                                if 'values' in expr:
+                                    values = expr['values']
+                                    if isinstance(values, dict) and 'results' in values:
+                                        values = values['results']
+                                    
+                                    for value in values if isinstance(values, list) else [values]:
+                                        if 'fieldValue' in value:
+                                            members.append(value['fieldValue'])
+        return members
+    
+    def _read_group(self, group_id: str) -> GroupMembership:
+        """Dynamic Groupを取得してメンバーのスナップショットを返す
+        
+        get_dynamic_group_membersと異なり取得エラーは送出するため、
+        取得に失敗したグループを空として上書きすることはありません。
+        グループが存在しない場合はexists=Falseの空のスナップショットを返します。
+        """
+        expanded_group = self.get_expanded_dynamic_group(group_id)
+        if expanded_group:
+            membership = GroupMembership(group_id, expanded_group.get('groupName'), self._group_members_of(expanded_group))
+        else:
+            membership = GroupMembership(group_id, None, (), exists=False)
+        self.group_cache.put(group_id, membership)
+        return membership
+    
+    def _cached_group(self, group_id: str) -> Optional[GroupMembership]:
+        """キャッシュ済みの_read_groupの結果（期限切れ・未取得の場合はNone）"""
+        return self.group_cache.get(group_id)
+    
+    def prefetch_group(self, group_id: str) -> int:
+        """Dynamic Groupを取得してキャッシュに格納し、メンバー数を返す"""
+        return len(self._read_group(group_id))
+    
+    def _update_group_members(
+        self,
+        group_id: str,
+        group_name: Optional[str],
+        compute,
+        snapshot: Optional[GroupMembership] = None
+    ) -> Dict[str, Any]:
+        """読み取ったメンバーから新しいメンバーを計算して書き込む（楽観的同時実行制御）
+        
+        書き込み直前の再取得でメンバーの変更を検出した場合、または書き込み後の再取得で
+        自分の変更が上書きされていた場合は、最新のメンバーを読み直して
+        compute(現在のメンバー)を再計算し、sap_group_write_max_attempts回まで再試行します。
+        computeは差分（追加・削除）を適用する関数のため、他の更新者の変更は保持されます。
+        snapshotには取得済みの_read_groupの結果を渡すと、最初の試行で再利用します
+        （省略時は起動時のウォームアップ等でキャッシュしたメンバーを使用）。
+        同じプロセス内の更新はグループごとのロックで直列化し、競合の検出は他のレプリカや
+        SuccessFactorsの画面からの更新を対象とします。
+        
+        Returns:
+            status（unchanged / updated）、previous（更新前のメンバー）、members（更新後のメンバー）、attempts
+            
+        Raises:
+            GroupConflictError: 試行回数内に競合が解消しなかった場合
+        """
+        with self._group_locks_lock:
+            lock = self._group_locks.setdefault(group_id, threading.Lock())
+        with lock:
+            return self._update_group_members_locked(group_id, group_name, compute, snapshot)
+    
+    def _update_group_members_locked(
+        self,
+        group_id: str,
+        group_name: Optional[str],
+        compute,
+        snapshot: Optional[GroupMembership]
+    ) -> Dict[str, Any]:
+        max_attempts = max(self.settings.sap_group_write_max_attempts, 1)
+        written_from: Optional[List[str]] = None
+        # キャッシュしたメンバーを更新の元にしても、書き込み前の確認で古さは検出される
+        from_cache = False
+        if snapshot is None:
+            snapshot = self._cached_group(group_id)
+            from_cache = snapshot is not None
+        attempt = 0
+        while attempt < max_attempts:
+            attempt += 1
+            membership = snapshot if snapshot is not None else self._read_group(group_id)
+            snapshot = None
+            current = membership.member_list()
+            name = group_name or membership.group_name
+            if not name:
+                raise SAPAPIError(f"Dynamic Groupの名前を取得できませんでした (ID: {group_id})")
+            
+            new_members = compute(current)
+            if new_members == current:
+                # 前の試行で書き込んだ変更が他の更新者の書き込みに含まれて残っている場合も更新済みとする
+                if written_from is not None:
+                    return {'status': 'updated', 'groupName': name, 'previous': written_from, 'members': current, 'attempts': attempt}
+                return {'status': 'unchanged', 'groupName': name, 'previous': current, 'members': current, 'attempts': attempt}
+            
+            try:
+                self.upsert_dynamic_group(name, new_members, group_id, expected_fingerprint=membership.fingerprint)
+                written_from = current
+                # upsertは条件付き書き込みができないため、確認から書き込みまでの間に
+                # 他の更新者に上書きされていないかを書き込み後にも確認する
+                written = self._read_group(group_id).member_list()
+                if compute(written) != written:
+                    raise GroupConflictError(
+                        f"Dynamic Groupの更新が他の更新者に上書きされました (ID: {group_id})"
+                    )
+            except GroupConflictError:
+                if from_cache and written_from is None:
+                    # キャッシュが古かっただけの場合は試行回数に数えずに読み直す
+                    logger.debug(f"Cached membership of dynamic group {group_id} was stale")
+                    from_cache = False
+                    attempt -= 1
+                    continue
+                from_cache = False
+                logger.warning(f"Dynamic group {group_id} changed concurrently (attempt {attempt}/{max_attempts})")
+                if attempt < max_attempts:
+                    time.sleep(random.uniform(0, 0.2 * attempt))
+                continue
+            
+            return {'status': 'updated', 'groupName': name, 'previous': current, 'members': written, 'attempts': attempt}
+        
+        raise GroupConflictError(
+            f"Dynamic Groupの更新が{max_attempts}回競合しました (ID: {group_id})"
+        )
+    
     def get_dynamic_group_members(self, group_id: str = "8526") -> List[str]:
         """Dynamic Groupのメンバー一覧を取得
         
@@ -345,57 +1308,49 @@ class SAPSuccessFactorsClient:
                 logger.warning(f"Expanded dynamic group not found for ID: {group_id}, returning empty list")
                 return []
             
-            # レスポンスからユーザー名を抽出
-            # 構造: dgIncludePools -> filters -> expressions -> values -> fieldValue
-            members = []
-            
-            # dgIncludePoolsを探索
-            if 'dgIncludePools' in expanded_group:
-                pools = expanded_group['dgIncludePools']
-                # resultsがある場合
-                if isinstance(pools, dict) and 'results' in pools:
-                    pools = pools['results']
-                
-                for pool in pools if isinstance(pools, list) else [pools]:
-                    if 'filters' in pool:
-                        filters = pool['filters']
-                        if isinstance(filters, dict) and 'results' in filters:
-                            filters = filters['results']
-                        
-                        for filter_item in filters if isinstance(filters, list) else [filters]:
-                            if 'expressions' in filter_item:
-                                expressions = filter_item['expressions']
-                                if isinstance(expressions, dict) and 'results' in expressions:
-                                    expressions = expressions['results']
-                                
-                                for expr in expressions if isinstance(expressions, list) else [expressions]:
-                                    if 'values' in expr:
-                                        values = expr['values']
-                                        if isinstance(values, dict) and 'results' in values:
-                                            values = values['results']
-                                        
-                                        for value in values if isinstance(values, list) else [values]:
-                                            if 'fieldValue' in value:
-                                                members.append(value['fieldValue'])
-            
-            logger.info(f"Found {len(members)} members in group ID {group_id}: {members}")
+            members = self._group_members_of(expanded_group)
+            
+            logger.info(
+                "Found %d members in group ID %s: %s", len(members), group_id, members,
+                extra={'event': 'group_members'}
+            )
             return members
         except Exception as e:
             logger.error(f"Error getting dynamic group members: {str(e)}")
             logger.exception("Full traceback:")
             return []
     
-    def upsert_dynamic_group(self, group_name: str, user_ids: List[str], group_id: str = "8526") -> Dict[str, Any]:
+    def upsert_dynamic_group(
+        self,
+        group_name: str,
+        user_ids: List[str],
+        group_id: str = "8526",
+        expected_fingerprint: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Dynamic Groupを作成または更新（upsert）
         
+        upsertはdgIncludePools全体を置き換えるため、読み取ったメンバーを元に更新する場合は
+        expected_fingerprintを指定します。書き込み直前にメンバーを再取得し、
+        フィンガープリントが一致しない場合は書き込まずにGroupConflictErrorを送出します。
+        
         Args:
             group_name: グループ名
             user_ids: 追加するユーザーIDのリスト
             group_id: グループID（デフォルト: 8526 = IBM管理者用権限グループ）
+            expected_fingerprint: 更新の元にしたメンバーのフィンガープリント（省略時は確認しない）
             
         Returns:
             upsert結果
+            
+        Raises:
+            GroupConflictError: メンバーが読み取り後に変更されていた場合
         """
+        if expected_fingerprint is not None:
+            if self._read_group(group_id).fingerprint != expected_fingerprint:
+                raise GroupConflictError(
+                    f"Dynamic Groupのメンバーが読み取り後に変更されました (ID: {group_id})"
+                )
+        
         try:
             logger.info(f"Upserting dynamic group: {group_name} (ID: {group_id}) with {len(user_ids)} users")
             
@@ -547,40 +1502,185 @@ class SAPSuccessFactorsClient:
         try:
             logger.info(f"Adding user {user_id} to permission role: {role_name} (ID: {group_id})")
             
-            # 既存のメンバーを取得
-            existing_members = self.get_dynamic_group_members(group_id)
-            logger.info(f"Existing members: {existing_members}")
+            # 既存のメンバーを保持したまま追加（競合時は最新のメンバーに対して再計算）
+            result = self._update_group_members(
+                group_id,
+                role_name,
+                lambda members: members if user_id in members else members + [user_id]
+            )
             
-            # ユーザーが既に存在するかチェック
-            if user_id in existing_members:
+            if result['status'] == 'unchanged':
                 logger.info(f"User {user_id} is already a member of {role_name}")
                 return {
                     'groupName': role_name,
                     'userId': user_id,
                     'status': 'already_exists',
-                    'totalMembers': len(existing_members),
+                    'totalMembers': len(result['members']),
                     'message': f"ユーザーは既に権限グループのメンバーです"
                 }
             
-            # 新しいメンバーリストを作成（既存 + 新規）
-            new_members = existing_members + [user_id]
-            logger.info(f"New members list: {new_members}")
-            
-            # upsertで全メンバーを更新
-            result = self.upsert_dynamic_group(role_name, new_members, group_id)
-            
+            logger.debug("New members list: %s", result['members'], extra={'event': 'group_members'})
             logger.info(f"User {user_id} added to permission role {role_name} successfully")
             
             return {
                 'groupName': role_name,
                 'userId': user_id,
                 'status': 'added',
-                'totalMembers': len(new_members),
+                'totalMembers': len(result['members']),
+                'attempts': result['attempts'],
                 'message': f"ユーザーを権限グループに追加しました"
             }
             
         except Exception as e:
             logger.error(f"Failed to add user to permission role: {str(e)}")
             raise SAPAPIError(f"権限グループへのユーザー追加に失敗しました: {str(e)}")
+    
+    def remove_users_from_permission_role(self, user_ids: List[str], role_name: str, group_id: str = "8526") -> Dict[str, Any]:
+        """複数のユーザーを権限グループ（Dynamic Group）から削除
+        
+        メンバーを取得して削除後のメンバー一覧を計算し、1回のupsertで反映します。
+        書き込み前に他の更新者による変更を検出した場合は、最新のメンバーに対して再計算します。
+        削除対象がメンバーに含まれていない場合はupsertを行いません。
+        
+        Args:
+            user_ids: 削除するユーザーIDのリスト
+            role_name: 権限グループ名
+            group_id: グループID（デフォルト: 8526）
+            
+        Returns:
+            削除結果（removed: 削除したユーザー, not_members: メンバーでなかったユーザー, totalMembers）
+            
+        Raises:
+            SAPAPIError: API呼び出しエラー
+        """
+        try:
+            logger.info(f"Removing {len(user_ids)} user(s) from permission role: {role_name} (ID: {group_id})")
+            
+            targets = set(user_ids)
+            result = self._update_group_members(
+                group_id,
+                role_name,
+                lambda members: [user_id for user_id in members if user_id not in targets]
+            )
+            removed = [user_id for user_id in result['previous'] if user_id in targets]
+            not_members = sorted(targets.difference(removed))
+            
+            if result['status'] == 'unchanged':
+                logger.info(f"No members to remove from {role_name}")
+                return {
+                    'groupName': role_name,
+                    'status': 'unchanged',
+                    'removed': [],
+                    'not_members': not_members,
+                    'totalMembers': len(result['members'])
+                }
+            
+            logger.info(f"Removed {len(removed)} user(s) from permission role {role_name}")
+            return {
+                'groupName': role_name,
+                'status': 'removed',
+                'removed': removed,
+                'not_members': not_members,
+                'totalMembers': len(result['members']),
+                'attempts': result['attempts']
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to remove users from permission role: {str(e)}")
+            raise SAPAPIError(f"権限グループからのユーザー削除に失敗しました: {str(e)}")
+    
+    def reconcile_dynamic_group(
+        self,
+        desired_members: List[str],
+        group_id: str = "8526",
+        group_name: Optional[str] = None,
+        dry_run: bool = False,
+        allow_empty: bool = False
+    ) -> Dict[str, Any]:
+        """Dynamic Groupのメンバーを指定した一覧と一致させる
+        
+        現在のメンバーを取得して差分を計算し、追加・削除をまとめて1回のupsertで反映します。
+        書き込み前に他の更新者による変更を検出した場合は、最新のメンバーに対して再計算します。
+        既に一致している場合、またはdry_runの場合は書き込みを行いません。
+        
+        Args:
+            desired_members: あるべきメンバーのユーザー名リスト
+            group_id: グループID（デフォルト: 8526 = IBM管理者用権限グループ）
+            group_name: グループ名（省略時は取得したグループの名前）
+            dry_run: Trueの場合は差分の計算のみ行う
+            allow_empty: 空の一覧（全メンバーの削除）を反映する場合はTrue
+            
+        Returns:
+            差分（to_add, to_remove）と反映結果（status: converged / dry_run / applied）
+            
+        Raises:
+            SAPClientError: 空の一覧をallow_emptyなしで反映しようとした場合
+            SAPAPIError: グループが存在しない場合、またはAPI呼び出しエラー
+        """
+        desired = list(dict.fromkeys(member for member in desired_members if member))
+        if not desired and not allow_empty and not dry_run:
+            # 誤った呼び出しで権限グループの全員を削除しないよう、明示的な指定を求める
+            raise SAPClientError(
+                f"desired_membersが空です。Dynamic Group (ID: {group_id}) の全メンバーを削除する場合はallow_emptyを指定してください"
+            )
+        
+        snapshot = self._read_group(group_id)
+        if not snapshot.exists:
+            raise SAPAPIError(f"Dynamic Groupが見つかりません (ID: {group_id})", status_code=404)
+        current = snapshot.member_list()
+        group_name = group_name or snapshot.group_name
+        if not group_name:
+            raise SAPAPIError(f"Dynamic Groupの名前を取得できませんでした (ID: {group_id})")
+        
+        desired_set = set(desired)
+        
+        def diff(members: List[str]) -> Tuple[List[str], List[str]]:
+            present = set(members)
+            return (
+                [member for member in desired if member not in present],
+                [member for member in members if member not in desired_set]
+            )
+        
+        def converge(members: List[str]) -> List[str]:
+            # 既存メンバーの順序を保ったまま、削除対象を除いて追加対象を末尾に加える
+            to_add, _ = diff(members)
+            return [member for member in members if member in desired_set] + to_add
+        
+        to_add, to_remove = diff(current)
+        result = {
+            'groupId': group_id,
+            'groupName': group_name,
+            'to_add': to_add,
+            'to_remove': to_remove,
+            'currentMembers': len(current),
+            'desiredMembers': len(desired),
+            'fingerprint': snapshot.fingerprint
+        }
+        if not to_add and not to_remove:
+            logger.info(f"Dynamic group {group_name} (ID: {group_id}) already converged")
+            return {**result, 'status': 'converged'}
+        if dry_run:
+            logger.info(
+                f"Dry run for dynamic group {group_name} (ID: {group_id}): "
+                f"{len(to_add)} to add, {len(to_remove)} to remove"
+            )
+            return {**result, 'status': 'dry_run'}
+        
+        update = self._update_group_members(group_id, group_name, converge, snapshot=snapshot)
+        # 競合して再試行した場合は、実際に書き込んだ時点のメンバーに対する差分を返す
+        to_add, to_remove = diff(update['previous'])
+        logger.info(
+            f"Dynamic group {group_name} (ID: {group_id}) reconciled: "
+            f"{len(to_add)} added, {len(to_remove)} removed"
+        )
+        return {
+            **result,
+            'to_add': to_add,
+            'to_remove': to_remove,
+            'currentMembers': len(update['previous']),
+            'fingerprint': membership_fingerprint(update['members']),
+            'attempts': update['attempts'],
+            'status': 'applied' if update['status'] == 'updated' else 'converged'
+        }
 
 # Made with Bob
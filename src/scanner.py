@@ -0,0 +1,247 @@
+"""
+Userエンティティのパーティション並列スキャン
+userIdの範囲でキー空間を重複のない$filter条件に分割し、
+複数ワーカーで同時に取得して1つのストリームにマージします
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterator
+
+from .sap_client import SAPSuccessFactorsClient
+from .tenants import get_client
+
+logger = logging.getLogger(__name__)
+
+# userIdの分割に使用する文字（数字 < 英小文字の順で、多くの照合順序と一致する）
+DEFAULT_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+_DONE = object()
+
+
+def _quote(value: str) -> str:
+    """ODataの文字列リテラルとしてエスケープ"""
+    return "'" + value.replace("'", "''") + "'"
+
+
+class UserPartition:
+    """userIdの半開区間 [lower, upper)"""
+
+    def __init__(self, lower: Optional[str] = None, upper: Optional[str] = None, depth: int = 0):
+        self.lower = lower
+        self.upper = upper
+        self.depth = depth
+
+    def to_filter(self, base_filter: Optional[str] = None) -> Optional[str]:
+        """パーティション条件を$filter式に変換（base_filterとAND結合）"""
+        conditions = []
+        if base_filter:
+            conditions.append(f"({base_filter})")
+        if self.lower is not None:
+            conditions.append(f"userId ge {_quote(self.lower)}")
+        if self.upper is not None:
+            conditions.append(f"userId lt {_quote(self.upper)}")
+        return " and ".join(conditions) if conditions else None
+
+    def split(self, alphabet: str) -> List["UserPartition"]:
+        """下限値に1文字付け足した境界で細分化
+
+        区間は連続して隙間なく分割されるため、子パーティションの和は元の区間と一致します。
+
+        Returns:
+            子パーティション（分割できない場合は空リスト）
+        """
+        prefix = self.lower or ""
+        bounds = [
+            prefix + char for char in alphabet
+            if (self.lower is None or prefix + char > self.lower)
+            and (self.upper is None or prefix + char < self.upper)
+        ]
+        if not bounds:
+            return []
+
+        edges = [self.lower] + bounds + [self.upper]
+        return [
+            UserPartition(edges[i], edges[i + 1], self.depth + 1)
+            for i in range(len(edges) - 1)
+        ]
+
+    def __repr__(self) -> str:
+        return f"UserPartition({self.lower!r}, {self.upper!r})"
+
+
+class PartitionedUserScanner:
+    """Userエンティティを並列に全件スキャンするスキャナー
+
+    各パーティションの1ページ目で総件数（$inlinecount）を取得し、
+    件数がmax_partition_rowsを超える偏ったパーティションは自動的に再分割します。
+    出力順序はパーティションの完了順となり、userId順は保証されません。
+    """
+
+    def __init__(
+        self,
+        client: Optional[SAPSuccessFactorsClient] = None,
+        max_workers: int = 4,
+        page_size: int = 1000,
+        filter_query: Optional[str] = None,
+        select: Optional[List[str]] = None,
+        alphabet: str = DEFAULT_ALPHABET,
+        max_partition_rows: int = 20000,
+        max_depth: int = 3,
+        buffer_pages: Optional[int] = None
+    ):
+        """スキャナーの初期化
+
+        Args:
+            client: 使用するクライアント（省略時はデフォルトテナント）
+            max_workers: 同時にスキャンするパーティション数
+            page_size: 1ページあたりの取得件数
+            filter_query: すべてのパーティションに適用するフィルタクエリ（OData形式）
+            select: 取得するプロパティ（Noneの場合は全プロパティ）
+            alphabet: userIdの分割に使用する文字
+            max_partition_rows: これを超える件数のパーティションは再分割する
+            max_depth: 再分割の最大深さ
+            buffer_pages: 消費待ちで保持する最大ページ数（省略時はワーカー数の2倍）
+        """
+        self.client = client or get_client()
+        self.max_workers = max(max_workers, 1)
+        self.page_size = page_size
+        self.filter_query = filter_query
+        self.select = select
+        self.alphabet = "".join(sorted(set(alphabet)))
+        self.max_partition_rows = max_partition_rows
+        self.max_depth = max_depth
+        self.buffer_pages = buffer_pages or self.max_workers * 2
+        self.stats: Dict[str, int] = {'partitions': 0, 'splits': 0, 'pages': 0, 'rows': 0}
+        self._stats_lock = threading.Lock()
+
+    def initial_partitions(self) -> List[UserPartition]:
+        """キー空間全体を1文字目で分割した初期パーティション"""
+        return UserPartition().split(self.alphabet)
+
+    def scan(self) -> Iterator[Dict[str, Any]]:
+        """全ユーザーを並列に取得して1件ずつ返すジェネレータ
+
+        消費側が途中で反復をやめた場合、未処理のパーティションは破棄されます。
+        """
+        for page in self.scan_pages():
+            yield from page
+
+    def scan_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        """全ユーザーを並列に取得してページ単位で返すジェネレータ"""
+        pages: "queue.Queue[Any]" = queue.Queue(maxsize=self.buffer_pages)
+        stop_event = threading.Event()
+        # 初期パーティションの投入が終わるまで完了とみなさないよう1から始める
+        pending = [1]
+        pending_lock = threading.Lock()
+        errors: List[Exception] = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sap-scan")
+
+        def put(item) -> bool:
+            # 消費側が停止した場合に備えてタイムアウト付きで待つ
+            while not stop_event.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def release():
+            with pending_lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                put(_DONE)
+
+        def submit(partition: UserPartition):
+            with pending_lock:
+                pending[0] += 1
+            self._count('partitions')
+            executor.submit(run, partition)
+
+        def run(partition: UserPartition):
+            try:
+                self._scan_partition(partition, put, submit, stop_event)
+            except Exception as e:
+                errors.append(e)
+                stop_event.set()
+            finally:
+                release()
+
+        for partition in self.initial_partitions():
+            submit(partition)
+        release()
+
+        try:
+            while True:
+                try:
+                    item = pages.get(timeout=0.5)
+                except queue.Empty:
+                    if errors:
+                        break
+                    continue
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if errors:
+            raise errors[0]
+
+        logger.info(
+            f"Partitioned scan finished: {self.stats['rows']} rows, {self.stats['pages']} pages, "
+            f"{self.stats['partitions']} partitions ({self.stats['splits']} splits)"
+        )
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _scan_partition(self, partition: UserPartition, put, submit, stop_event: threading.Event):
+        filter_query = partition.to_filter(self.filter_query)
+
+        first = self.client.list_users_page(
+            top=self.page_size,
+            skip=0,
+            filter_query=filter_query,
+            select=self.select,
+            inline_count=True,
+            order_by='userId'
+        )
+        total = first['count']
+
+        if total is not None and total > self.max_partition_rows and partition.depth < self.max_depth:
+            children = partition.split(self.alphabet)
+            if children:
+                logger.debug(f"Splitting skewed partition {partition} ({total} rows) into {len(children)}")
+                self._count('splits')
+                for child in children:
+                    submit(child)
+                return
+
+        results = first['results']
+        skip = 0
+        while results and not stop_event.is_set():
+            self._count('pages')
+            self._count('rows', len(results))
+            if not put(results):
+                return
+
+            skip += len(results)
+            if len(results) < self.page_size or (total is not None and skip >= total):
+                return
+
+            results = self.client.list_users_page(
+                top=self.page_size,
+                skip=skip,
+                filter_query=filter_query,
+                select=self.select,
+                order_by='userId'
+            )['results']
+
+# Made with Bob
@@ -3,31 +3,52 @@ SAP SuccessFactors MCP Server
 FastMCPを使用してMCPサーバーを実装します
 """
 
+import atexit
+import json
 import logging
 from typing import Any
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from .tools.user_management import (
     create_sap_user,
     get_sap_user,
+    get_sap_users,
     update_sap_user,
     list_sap_users,
+    count_sap_users,
     test_sap_connection,
     add_user_to_admin_role as add_user_to_admin_role_impl,
+    reconcile_group_membership as reconcile_group_membership_impl,
     create_sap_user_with_admin_role as create_user_with_admin_role_impl
 )
-from .config.settings import get_settings
-
-# ログ設定
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from .tools.bulk_operations import (
+    bulk_update_users as bulk_update_users_impl,
+    upsert_users as upsert_users_impl,
+    bulk_deactivate_users as bulk_deactivate_users_impl
 )
-logger = logging.getLogger(__name__)
+from .tools.diagnostics import get_sap_diagnostics
+from .tools.search import search_users as search_users_impl
+from .tools.export import start_user_export, get_job_status as get_job_status_impl
+from .config.settings import get_settings
+from .transport import get_transport
+from .health import get_health_monitor
+from .warmup import start_warm_up
+from .logging_setup import configure_logging_from_settings, shutdown_logging
+from .profiling import profile_tool, get_tool_profiler
+from .tool_cache import cached_tool, invalidates_cache
+from .tenants import leases_tenant
+from .progress import tool_progress
 
 # 設定の読み込み
 settings = get_settings()
 
+# ログ設定（キュー経由で非同期に出力し、終了時に残りを書き出す）
+configure_logging_from_settings()
+atexit.register(shutdown_logging)
+logger = logging.getLogger(__name__)
+
 # FastMCPサーバーの初期化
 mcp = FastMCP("SAP SuccessFactors User Management")
 
@@ -35,6 +56,9 @@ logger.info("MCP Server initialized")
 
 
 @mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
 def create_user(
     user_id: str,
     username: str,
@@ -43,7 +67,8 @@ def create_user(
     email: str = "",
     locale: str = "ja_JP",
     timezone: str = "Asia/Tokyo",
-    add_to_admin_role: bool = True
+    add_to_admin_role: bool = True,
+    tenant: str = ""
 ) -> dict[str, Any]:
     """SAP SuccessFactorsに新規ユーザーを作成します
     
@@ -59,6 +84,7 @@ def create_user(
         locale: ロケール（デフォルト: ja_JP）
         timezone: タイムゾーン（デフォルト: Asia/Tokyo）
         add_to_admin_role: IBM管理者用権限グループに追加するか（デフォルト: True）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
         作成結果を含む辞書
@@ -73,35 +99,99 @@ def create_user(
         email=email if email else None,
         locale=locale,
         timezone=timezone,
-        add_to_admin_role=add_to_admin_role
+        add_to_admin_role=add_to_admin_role,
+        tenant=tenant if tenant else None
     )
 
 
 @mcp.tool()
-def get_user(user_id: str) -> dict[str, Any]:
+@profile_tool
+@cached_tool
+@leases_tenant
+def get_user(user_id: str, tenant: str = "") -> dict[str, Any]:
     """SAP SuccessFactorsからユーザー情報を取得します
     
     Args:
         user_id: ユーザーID
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
         ユーザー情報を含む辞書
     """
     logger.info(f"Tool called: get_user for {user_id}")
-    return get_sap_user(user_id)
+    return get_sap_user(user_id, tenant=tenant if tenant else None)
 
 
 @mcp.tool()
+@profile_tool
+@cached_tool
+@leases_tenant
+def get_users(user_ids: list[str], fields: str = "", tenant: str = "") -> dict[str, Any]:
+    """複数のユーザー情報をまとめて取得します（名簿の照合など）
+    
+    get_userを繰り返し呼ぶ代わりに使用してください。数十〜数百件のユーザーIDを
+    少数のリクエストでまとめて取得し、見つからなかったユーザーIDも返します。
+    
+    Args:
+        user_ids: ユーザーIDのリスト
+        fields: 取得するフィールド（カンマ区切り、例: "userId,email,status"）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        見つかったユーザー一覧（data）と見つからなかったユーザーID（missing）を含む辞書
+    """
+    logger.info(f"Tool called: get_users for {len(user_ids)} user(s)")
+    return get_sap_users(
+        user_ids,
+        fields=fields if fields else None,
+        tenant=tenant if tenant else None
+    )
+
+
+@mcp.tool()
+@profile_tool
+@leases_tenant
+def search_users(query: str, limit: int = 20, fields: str = "", tenant: str = "") -> dict[str, Any]:
+    """ユーザーをuserId・ユーザー名・氏名・メールアドレスの一部で検索します
+    
+    サーバー内のインデックスで検索するため、filter_queryのsubstringofより高速で、
+    APIの呼び出し回数も消費しません。前方一致（"yam"）やつづりの揺れ（"yamda"）にも一致します。
+    
+    Args:
+        query: 検索語（空白区切りで複数指定するとすべてに一致するユーザーを返す）
+        limit: 返す最大件数（デフォルト: 20）
+        fields: 出力するフィールド（カンマ区切り、例: "userId,email"）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        一致度（score）順のユーザー一覧を含む辞書
+    """
+    logger.info(f"Tool called: search_users for {query!r}")
+    return search_users_impl(
+        query,
+        limit=limit,
+        fields=fields if fields else None,
+        tenant=tenant if tenant else None
+    )
+
+
+@mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
 def update_user(
     user_id: str,
     first_name: str = "",
     last_name: str = "",
     email: str = "",
     locale: str = "",
-    timezone: str = ""
+    timezone: str = "",
+    tenant: str = ""
 ) -> dict[str, Any]:
     """SAP SuccessFactorsのユーザー情報を更新します
     
+    現在の値から変更のあるフィールドのみを更新し、変更がなければ何も書き込みません。
+    
     Args:
         user_id: ユーザーID
         first_name: 名
@@ -109,6 +199,7 @@ def update_user(
         email: メールアドレス
         locale: ロケール
         timezone: タイムゾーン
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
         更新結果を含む辞書
@@ -128,60 +219,267 @@ def update_user(
     if timezone:
         kwargs['timeZone'] = timezone
     
-    return update_sap_user(user_id, **kwargs)
+    return update_sap_user(user_id, tenant=tenant if tenant else None, **kwargs)
+
+
+@mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
+def bulk_update_users(
+    updates: list[dict[str, Any]],
+    changeset_size: int = 0,
+    tenant: str = "",
+    ctx: Context | None = None
+) -> dict[str, Any]:
+    """複数ユーザーのフィールドを$batchで一括更新します（例: タイムゾーンの一斉変更）
+    
+    指定したフィールドのみを更新し（MERGE）、それ以外のフィールドは変更しません。
+    一部の更新が失敗しても他の更新は反映され、ユーザーごとの結果が返ります。
+    進捗トークンを指定した場合は、チェンジセットの完了ごとに進捗と部分結果を通知します。
+    
+    Args:
+        updates: 更新のリスト。各要素は {"user_id": "...", "fields": {"timeZone": "Asia/Tokyo"}} の形式
+                 （fieldsのキーはSAP SuccessFactorsのUserプロパティ名）
+        changeset_size: 1つのチェンジセットにまとめる更新数（0の場合は設定値）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        ユーザーごとの結果と更新・失敗件数を含む辞書
+    """
+    logger.info(f"Tool called: bulk_update_users for {len(updates)} user(s)")
+    with tool_progress(ctx, "bulk_update_users") as progress:
+        return bulk_update_users_impl(
+            updates,
+            changeset_size=changeset_size if changeset_size > 0 else None,
+            tenant=tenant if tenant else None,
+            progress=progress
+        )
 
 
 @mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
+def upsert_users(
+    users: list[dict[str, Any]],
+    chunk_size: int = 0,
+    tenant: str = "",
+    ctx: Context | None = None
+) -> dict[str, Any]:
+    """複数ユーザーを一括で作成または更新します（upsert）
+    
+    既存のユーザーは更新、存在しないユーザーは作成されます。
+    権限グループへの追加は行いません。
+    進捗トークンを指定した場合は、upsert呼び出しの完了ごとに進捗と部分結果を通知します。
+    
+    Args:
+        users: Userエンティティのリスト。各要素は {"userId": "...", "username": "...", "firstName": "...",
+               "lastName": "...", "email": "...", "status": "active"} の形式（SAP SuccessFactorsのプロパティ名）
+        chunk_size: 1回のupsert呼び出しにまとめるユーザー数（0の場合は設定値）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        ユーザーごとの結果と作成・更新・失敗件数を含む辞書
+    """
+    logger.info(f"Tool called: upsert_users for {len(users)} user(s)")
+    with tool_progress(ctx, "upsert_users") as progress:
+        return upsert_users_impl(
+            users,
+            chunk_size=chunk_size if chunk_size > 0 else None,
+            tenant=tenant if tenant else None,
+            progress=progress
+        )
+
+
+@mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
+def bulk_deactivate_users(
+    user_ids: list[str],
+    delete: bool = False,
+    remove_from_admin_role: bool = True,
+    tenant: str = "",
+    ctx: Context | None = None
+) -> dict[str, Any]:
+    """複数ユーザーを一括で無効化（または削除）します（退職者対応）
+    
+    無効化・削除に成功したユーザーは、IBM管理者用権限グループからまとめて削除されます。
+    進捗トークンを指定した場合は、ユーザーごとの結果を進捗と部分結果として通知します。
+    
+    Args:
+        user_ids: 対象のユーザーIDのリスト
+        delete: Trueの場合は無効化ではなくユーザーを削除
+        remove_from_admin_role: IBM管理者用権限グループから削除するか（デフォルト: True）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        ユーザーごとの結果と権限グループの更新結果を含む辞書
+    """
+    logger.info(f"Tool called: bulk_deactivate_users for {len(user_ids)} user(s)")
+    with tool_progress(ctx, "bulk_deactivate_users") as progress:
+        return bulk_deactivate_users_impl(
+            user_ids,
+            delete=delete,
+            remove_from_admin_role=remove_from_admin_role,
+            tenant=tenant if tenant else None,
+            progress=progress
+        )
+
+
+@mcp.tool()
+@profile_tool
+@cached_tool
+@leases_tenant
 def list_users(
     top: int = 10,
     skip: int = 0,
-    filter_query: str = ""
+    filter_query: str = "",
+    fields: str = "",
+    output_format: str = "records",
+    max_bytes: int = 0,
+    cursor: str = "",
+    tenant: str = "",
+    ctx: Context | None = None
 ) -> dict[str, Any]:
     """SAP SuccessFactorsからユーザー一覧を取得します
     
+    進捗トークンを指定した場合は、件数の多い一覧をページごとに取得し、
+    取得できたページから進捗と部分結果を通知します。
+    
     Args:
         top: 取得件数（デフォルト: 10）
         skip: スキップ件数（デフォルト: 0）
         filter_query: フィルタクエリ（OData形式）
+        fields: 取得するフィールド（カンマ区切り、例: "userId,firstName,email"）
+        output_format: "records"（辞書のリスト）または "table"（columns + rows形式でよりコンパクト）
+        max_bytes: 応答データの最大バイト数（0の場合はサーバー設定値）
+        cursor: 前回の応答のnext_cursor（続きを取得する場合）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
-        ユーザー一覧を含む辞書
+        ユーザー一覧を含む辞書（skip=0の場合は総件数total_countを含む）
     """
     logger.info(f"Tool called: list_users (top={top}, skip={skip})")
     
-    return list_sap_users(
-        top=top,
-        skip=skip,
-        filter_query=filter_query if filter_query else None
+    with tool_progress(ctx, "list_users") as progress:
+        return list_sap_users(
+            top=top,
+            skip=skip,
+            filter_query=filter_query if filter_query else None,
+            fields=fields if fields else None,
+            output_format=output_format,
+            max_bytes=max_bytes,
+            cursor=cursor if cursor else None,
+            tenant=tenant if tenant else None,
+            progress=progress
+        )
+
+
+@mcp.tool()
+@profile_tool
+@cached_tool
+@leases_tenant
+def count_users(filter_query: str = "", tenant: str = "") -> dict[str, Any]:
+    """条件に一致するSAP SuccessFactorsのユーザー数を取得します
+    
+    ユーザー一覧を取得して数えるのではなく、件数のみを1回のリクエストで取得します。
+    
+    Args:
+        filter_query: フィルタクエリ（OData形式、例: "status eq 'active'"）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        ユーザー数を含む辞書
+    """
+    logger.info("Tool called: count_users")
+    return count_sap_users(
+        filter_query=filter_query if filter_query else None,
+        tenant=tenant if tenant else None
     )
 
 
 @mcp.tool()
-def test_connection() -> dict[str, Any]:
+@profile_tool
+@leases_tenant
+def test_connection(force: bool = False, tenant: str = "") -> dict[str, Any]:
     """SAP SuccessFactors API接続をテストします
     
+    通常はバックグラウンドで定期実行されるヘルスプローブの結果（キャッシュ）を返します。
+    
+    Args:
+        force: キャッシュを無視して実際に接続を確認するか（デフォルト: False）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+    
     Returns:
         接続テスト結果を含む辞書
     """
-    logger.info("Tool called: test_connection")
-    return test_sap_connection()
+    logger.info(f"Tool called: test_connection (force={force})")
+    return test_sap_connection(force=force, tenant=tenant if tenant else None)
 
 
 @mcp.tool()
-def add_user_to_admin_role(user_id: str) -> dict[str, Any]:
+@profile_tool
+@invalidates_cache
+@leases_tenant
+def add_user_to_admin_role(user_id: str, tenant: str = "") -> dict[str, Any]:
     """既存ユーザーをIBM管理者用権限グループに追加します
     
     Args:
         user_id: ユーザーID
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
         追加結果を含む辞書
     """
     logger.info(f"Tool called: add_user_to_admin_role for {user_id}")
-    return add_user_to_admin_role_impl(user_id)
+    return add_user_to_admin_role_impl(user_id, tenant=tenant if tenant else None)
 
 
 @mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
+def reconcile_group_membership(
+    desired_members: list[str],
+    group_id: str = "8526",
+    group_name: str = "",
+    dry_run: bool = False,
+    allow_empty: bool = False,
+    tenant: str = ""
+) -> dict[str, Any]:
+    """権限グループのメンバーを指定した一覧と完全に一致させます
+    
+    現在のメンバーとの差分（追加・削除）を計算し、1回の更新でまとめて反映します。
+    dry_run=Trueの場合は差分を返すだけで変更しません。
+    
+    Args:
+        desired_members: あるべきメンバーのユーザー名リスト
+        group_id: グループID（デフォルト: 8526 = IBM管理者用権限グループ）
+        group_name: グループ名（省略時はグループから取得）
+        dry_run: 差分の確認のみ行う場合はTrue
+        allow_empty: 空の一覧で全メンバーを削除する場合のみTrue（デフォルトでは空の一覧は拒否されます）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        差分と反映結果を含む辞書
+    """
+    logger.info(f"Tool called: reconcile_group_membership for group {group_id}")
+    return reconcile_group_membership_impl(
+        desired_members,
+        group_id=group_id,
+        group_name=group_name if group_name else None,
+        dry_run=dry_run,
+        allow_empty=allow_empty,
+        tenant=tenant if tenant else None
+    )
+
+
+@mcp.tool()
+@profile_tool
+@invalidates_cache
+@leases_tenant
 def create_user_with_admin_role(
     user_id: str,
     username: str,
@@ -189,7 +487,8 @@ def create_user_with_admin_role(
     last_name: str = "",
     email: str = "",
     locale: str = "ja_JP",
-    timezone: str = "Asia/Tokyo"
+    timezone: str = "Asia/Tokyo",
+    tenant: str = ""
 ) -> dict[str, Any]:
     """SAP SuccessFactorsに新規ユーザーを作成し、IBM管理者用権限グループに追加します
     
@@ -205,6 +504,7 @@ def create_user_with_admin_role(
         email: メールアドレス
         locale: ロケール（デフォルト: ja_JP）
         timezone: タイムゾーン（デフォルト: Asia/Tokyo）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
         
     Returns:
         作成結果を含む辞書
@@ -218,20 +518,159 @@ def create_user_with_admin_role(
         last_name=last_name if last_name else None,
         email=email if email else None,
         locale=locale,
-        timezone=timezone
+        timezone=timezone,
+        tenant=tenant if tenant else None
     )
 
 
+@mcp.tool()
+@profile_tool
+@leases_tenant
+def export_users(
+    file_name: str = "",
+    file_format: str = "jsonl",
+    fields: str = "",
+    filter_query: str = "",
+    page_size: int = 1000,
+    parallel: bool = False,
+    tenant: str = ""
+) -> dict[str, Any]:
+    """全ユーザーをファイル（JSONLまたはCSV）へエクスポートします
+    
+    バックグラウンドジョブとして実行され、ページ単位で逐次書き込むため
+    大規模テナントでもメモリ使用量は一定です。進捗はget_job_statusで確認できます。
+    
+    Args:
+        file_name: 出力ファイル名（省略時は日時から生成）
+        file_format: "jsonl" または "csv"（デフォルト: jsonl）
+        fields: 出力するフィールド（カンマ区切り、例: "userId,username,email"）
+        filter_query: フィルタクエリ（OData形式）
+        page_size: 1ページあたりの取得件数（デフォルト: 1000）
+        parallel: userIdの範囲で分割して並列に取得するか（高速だが出力順は不定）
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        開始したジョブ情報を含む辞書
+    """
+    logger.info(f"Tool called: export_users (format={file_format})")
+    
+    return start_user_export(
+        file_name=file_name if file_name else None,
+        file_format=file_format,
+        fields=fields if fields else None,
+        filter_query=filter_query if filter_query else None,
+        page_size=page_size,
+        parallel=parallel,
+        tenant=tenant if tenant else None
+    )
+
+
+@mcp.tool()
+@profile_tool
+def get_job_status(job_id: str) -> dict[str, Any]:
+    """バックグラウンドジョブ（エクスポート等）の進捗と結果を取得します
+    
+    Args:
+        job_id: ジョブID
+        
+    Returns:
+        ジョブ状態を含む辞書（進捗件数、件数/秒、結果）
+    """
+    logger.info(f"Tool called: get_job_status for {job_id}")
+    return get_job_status_impl(job_id)
+
+
+@mcp.tool()
+@profile_tool
+@leases_tenant
+def get_diagnostics(tenant: str = "") -> dict[str, Any]:
+    """SAP APIクライアントの診断情報（接続統計、同時実行数の上限と待ち行列長）を取得します
+    
+    Args:
+        tenant: テナントキー（複数テナント構成の場合、省略時はデフォルトテナント）
+        
+    Returns:
+        診断情報を含む辞書
+    """
+    logger.info("Tool called: get_diagnostics")
+    return get_sap_diagnostics(tenant=tenant if tenant else None)
+
+
+
+@mcp.tool()
+def profile_tool_calls(tool_name: str = "", count: int = 1, mode: str = "") -> dict[str, Any]:
+    """指定したツールの次の呼び出しをプロファイルします（管理用）
+    
+    プロファイルはプロファイルディレクトリに書き出されます（cprofile: pstats形式、
+    sampling: speedscope形式）。tool_nameを省略した場合は現在の設定と直近のプロファイルを返します。
+    
+    Args:
+        tool_name: プロファイルするツール名
+        count: プロファイルする呼び出し回数
+        mode: "cprofile" または "sampling"（省略時は設定値、未設定の場合はcprofile）
+        
+    Returns:
+        プロファイラーの状態を含む辞書
+    """
+    logger.info(f"Tool called: profile_tool_calls for {tool_name}")
+    
+    profiler = get_tool_profiler()
+    if tool_name:
+        try:
+            profiler.arm(tool_name, count=count, mode=mode or None)
+        except ValueError as e:
+            return {
+                "success": False,
+                "message": str(e),
+                "error": str(e)
+            }
+    
+    return {
+        "success": True,
+        "message": f"ツール '{tool_name}' の次の{count}回の呼び出しをプロファイルします" if tool_name else "プロファイラーの状態を取得しました",
+        "profiler": profiler.snapshot()
+    }
+
+
 # ヘルスチェックエンドポイント
 @mcp.resource("health://status")
 def health_check() -> str:
-    """ヘルスチェック"""
-    return "OK"
+    """ヘルスチェック（キャッシュされたSAP接続状態）"""
+    ready, detail = get_health_monitor().readiness()
+    return json.dumps({'ready': ready, **detail}, ensure_ascii=False)
+
+
+@mcp.custom_route("/health", methods=["GET"])
+@mcp.custom_route("/health/live", methods=["GET"])
+async def health_live(request: Request) -> JSONResponse:
+    """Liveness: プロセスが応答可能か（SAPへの接続は確認しない）"""
+    return JSONResponse(get_health_monitor().liveness())
+
+
+@mcp.custom_route("/health/ready", methods=["GET"])
+async def health_ready(request: Request) -> JSONResponse:
+    """Readiness: 最新のプローブ結果に基づきSAPへ接続可能か"""
+    ready, detail = get_health_monitor().readiness()
+    return JSONResponse(detail, status_code=200 if ready else 503)
 
 
 def main():
     """サーバーを起動"""
     logger.info(f"Starting MCP Server on port {settings.mcp_port}")
+    
+    # 接続確立・$metadata・権限グループ等をバックグラウンドで並行に取得し、
+    # 完了（または制限時間超過）までreadinessを準備中とする
+    monitor = get_health_monitor()
+    transport = get_transport()
+    if start_warm_up(monitor) is None:
+        transport.warm_up()
+    
+    # アイドル切断されないよう接続を定期的に温め直す
+    transport.start_keepalive()
+    
+    # SAP接続状態の定期プローブを開始（ツールとHTTPヘルスチェックはキャッシュを参照）
+    monitor.start()
+    
     mcp.run(
         transport="sse",
         host="0.0.0.0",
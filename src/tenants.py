@@ -0,0 +1,263 @@
+"""
+マルチテナント管理モジュール
+テナントごとにクライアント・接続プール・レートリミッター・キャッシュを保持し、
+アイドル状態のテナントのリソースはLRU方式で解放します
+"""
+
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable
+
+from .config.settings import get_settings
+from .config.tenants import TenantConfig, load_tenant_configs
+from .sap_client import SAPSuccessFactorsClient, SAPClientError
+from .transport import create_transport
+from .concurrency import RateLimiter, create_bulkheads, create_hedger, get_hedger
+from .health import HealthMonitor, get_health_monitor
+
+logger = logging.getLogger(__name__)
+
+
+class TenantNotFoundError(SAPClientError):
+    """指定されたテナントが設定されていない"""
+    pass
+
+
+class TenantResources:
+    """1テナント分のクライアントとリソース"""
+
+    def __init__(self, config: TenantConfig, client: SAPSuccessFactorsClient, health: HealthMonitor):
+        self.config = config
+        self.client = client
+        self.health = health
+        # 機能ごとのキャッシュ（テナント間で共有しない）
+        self.caches: Dict[str, Any] = {}
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # 実行中のツール・バックグラウンドジョブによる使用中の数（0より大きい間は解放しない）
+        self.leases = 0
+
+    def close(self):
+        """接続とバックグラウンド処理を停止"""
+        self.health.stop()
+        self.client.transport.close()
+        if self.client.hedger is not None and self.client.hedger is not get_hedger():
+            self.client.hedger.executor.shutdown(wait=False)
+        self.caches.clear()
+
+
+class TenantRegistry:
+    """テナントキーからテナントリソースを解決するレジストリ"""
+
+    def __init__(
+        self,
+        configs: Dict[str, TenantConfig],
+        default_key: str,
+        max_active: int = 20,
+        idle_timeout: int = 1800
+    ):
+        """レジストリの初期化
+
+        Args:
+            configs: テナントキーをキーとする設定
+            default_key: テナント未指定時に使用するテナントキー
+            max_active: 同時に保持するテナントリソースの最大数
+            idle_timeout: アイドルテナントのリソースを解放するまでの秒数
+        """
+        self.configs = configs
+        self.default_key = default_key
+        self.max_active = max(max_active, 1)
+        self.idle_timeout = idle_timeout
+        self._active: "OrderedDict[str, TenantResources]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def keys(self) -> List[str]:
+        """設定済みのテナントキー一覧"""
+        return list(self.configs.keys())
+
+    def resources(self, tenant: Optional[str] = None) -> TenantResources:
+        """テナントのリソースを取得（未作成の場合は作成）
+
+        Args:
+            tenant: テナントキー（省略時はデフォルトテナント）
+
+        Returns:
+            テナントリソース
+
+        Raises:
+            TenantNotFoundError: テナントが設定されていない場合
+        """
+        return self._resources(tenant, lease=False)
+
+    def acquire(self, tenant: Optional[str] = None) -> TenantResources:
+        """テナントのリソースを使用中として取得
+
+        release()するまでアイドル・件数超過による解放の対象外になります。
+        ツール呼び出しの実行中（leases_tenant）や、ツール呼び出しの完了後も使い続ける
+        バックグラウンドジョブで使用します。
+
+        Raises:
+            TenantNotFoundError: テナントが設定されていない場合
+        """
+        return self._resources(tenant, lease=True)
+
+    def release(self, resources: TenantResources):
+        """acquire()で取得したリソースの使用を終了"""
+        with self._lock:
+            resources.leases = max(resources.leases - 1, 0)
+            resources.last_used = time.monotonic()
+
+    def _resources(self, tenant: Optional[str], lease: bool) -> TenantResources:
+        key = tenant or self.default_key
+        config = self.configs.get(key)
+        if config is None:
+            raise TenantNotFoundError(f"テナントが見つかりません: {key}")
+
+        with self._lock:
+            resources = self._active.get(key)
+            if resources is None:
+                resources = self._create(config)
+                self._active[key] = resources
+            self._active.move_to_end(key)
+            resources.last_used = time.monotonic()
+            if lease:
+                resources.leases += 1
+            evicted = self._evict_locked(keep=key)
+
+        for stale in evicted:
+            stale.close()
+        return resources
+
+    def get_client(self, tenant: Optional[str] = None) -> SAPSuccessFactorsClient:
+        """テナントのクライアントを取得"""
+        return self.resources(tenant).client
+
+    def _create(self, config: TenantConfig) -> TenantResources:
+        settings = get_settings()
+
+        if config.key == self.default_key:
+            # デフォルトテナントはプロセス共有のリソース（起動時ウォームアップ・ヘルスプローブ対象）を使用
+            client = SAPSuccessFactorsClient(config)
+            return TenantResources(config, client, get_health_monitor())
+
+        rate = config.sap_rate_limit_per_second
+        client = SAPSuccessFactorsClient(
+            config,
+            transport=create_transport(config.sap_api_url),
+            rate_limiter=RateLimiter(settings.sap_rate_limit_per_second if rate is None else rate),
+            bulkheads=create_bulkheads(config.sap_bulkhead_limits),
+            hedger=create_hedger()
+        )
+        # 追加テナントはバックグラウンドプローブを行わず、プローブ間隔をキャッシュ期間として使う
+        health = HealthMonitor(client.ping, interval=settings.health_probe_interval)
+        logger.info(f"Tenant resources created: {config.key}")
+        return TenantResources(config, client, health)
+
+    def _evict_locked(self, keep: str) -> List[TenantResources]:
+        evicted = []
+        now = time.monotonic()
+
+        for key in list(self._active.keys()):
+            if key in (self.default_key, keep):
+                continue
+            resources = self._active[key]
+            if resources.leases > 0:
+                # 実行中のツール・ジョブがある間は接続を閉じない（件数の上限を一時的に超えうる）
+                continue
+            over_capacity = len(self._active) > self.max_active
+            idle = self.idle_timeout > 0 and now - resources.last_used > self.idle_timeout
+            if over_capacity or idle:
+                # 最も長く使われていないものから順に解放（OrderedDictは使用順）
+                del self._active[key]
+                evicted.append(resources)
+                self.evictions += 1
+                logger.info(f"Tenant resources evicted: {key}")
+
+        return evicted
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'configured': len(self.configs),
+                'active': {
+                    key: {'idle_seconds': round(now - resources.last_used, 1), 'leases': resources.leases}
+                    for key, resources in self._active.items()
+                },
+                'evictions': self.evictions
+            }
+
+
+# グローバルテナントレジストリ
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """テナントレジストリを取得（シングルトンパターン）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                settings = get_settings()
+                configs = {}
+                if settings.sap_tenants_file:
+                    configs = load_tenant_configs(settings.sap_tenants_file)
+                    logger.info(f"Loaded {len(configs)} tenant(s) from {settings.sap_tenants_file}")
+                if settings.default_tenant in configs:
+                    logger.warning(
+                        f"Tenant '{settings.default_tenant}' in {settings.sap_tenants_file} is ignored; "
+                        f"the default tenant is configured by environment variables"
+                    )
+                configs[settings.default_tenant] = TenantConfig.from_settings(settings)
+                _registry = TenantRegistry(
+                    configs,
+                    default_key=settings.default_tenant,
+                    max_active=settings.max_active_tenants,
+                    idle_timeout=settings.tenant_idle_timeout
+                )
+    return _registry
+
+
+def get_client(tenant: Optional[str] = None) -> SAPSuccessFactorsClient:
+    """テナントのクライアントを取得
+
+    Args:
+        tenant: テナントキー（省略時はデフォルトテナント）
+
+    Raises:
+        TenantNotFoundError: テナントが設定されていない場合
+    """
+    return get_tenant_registry().get_client(tenant)
+
+
+def leases_tenant(func: Callable) -> Callable:
+    """ツールの実行中、tenant引数のテナントのリソースを使用中として保持するデコレーター
+
+    実行中のツールが使っているクライアントの接続が、他のテナントへの呼び出しによる
+    アイドル・件数超過の解放で閉じられないようにします。
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        registry = get_tenant_registry()
+        tenant = signature.bind(*args, **kwargs).arguments.get('tenant')
+        try:
+            resources = registry.acquire(tenant or None)
+        except TenantNotFoundError:
+            # 未設定のテナントのエラーはツール自身が結果として返す
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            registry.release(resources)
+
+    return wrapper
+
+# Made with Bob
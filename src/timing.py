@@ -0,0 +1,106 @@
+"""
+リクエスト単位の時間内訳計測
+待ち行列・接続確立・TLS・TTFB・ボディ転送・JSONデコードの各時間と送受信バイト数を記録し、
+フック（コールバック）への通知と直近リクエストの集計を行います
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, List, Callable, Deque
+
+logger = logging.getLogger(__name__)
+
+# 集計対象の時間内訳（ミリ秒）
+PHASES = ("queue_ms", "connect_ms", "tls_ms", "ttfb_ms", "body_ms", "decode_ms", "total_ms")
+
+TimingHook = Callable[[Dict[str, Any]], None]
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    index = min(int(len(sorted_values) * percentile / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class RequestTimingRecorder:
+    """リクエストごとの時間内訳を受け取り、フックへの通知と直近の集計を行う
+
+    記録される辞書のキー:
+        method, endpoint, family, status_code, http_version,
+        queue_ms: バルクヘッドとレートリミッターでの待ち時間
+        connect_ms, tls_ms: 新規接続の場合のTCP接続・TLSハンドシェイク時間（再利用時はNone）
+        ttfb_ms: リクエスト送信開始からレスポンスヘッダー受信まで
+        body_ms: レスポンスボディの受信時間
+        decode_ms: JSONデコード時間
+        total_ms: 待ち行列からデコード完了まで
+        request_bytes, response_bytes: 送受信したボディのバイト数
+    """
+
+    def __init__(self, window: int = 500):
+        """計測の初期化
+
+        Args:
+            window: 集計に使う直近のリクエスト数
+        """
+        self.window = window
+        self._records: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self._hooks: List[TimingHook] = []
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: TimingHook):
+        """リクエスト完了ごとに時間内訳の辞書を受け取るコールバックを登録
+
+        フックはリクエストを実行したスレッドで同期的に呼ばれるため、重い処理は避けてください。
+        """
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook: TimingHook):
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def record(self, timing: Dict[str, Any]):
+        """完了したリクエストの時間内訳を記録"""
+        with self._lock:
+            self._records.append(timing)
+            hooks = list(self._hooks)
+
+        for hook in hooks:
+            try:
+                hook(timing)
+            except Exception as e:
+                logger.warning(f"Request timing hook failed: {str(e)}")
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """直近のリクエストの時間内訳（新しい順）"""
+        with self._lock:
+            records = list(self._records)
+        return records[::-1][:limit]
+
+    def summary(self) -> Dict[str, Any]:
+        """直近のリクエストについて時間内訳ごとのp50/p95/最大値とバイト数を集計"""
+        with self._lock:
+            records = list(self._records)
+
+        phases: Dict[str, Any] = {}
+        for phase in PHASES:
+            values = sorted(record[phase] for record in records if record.get(phase) is not None)
+            if values:
+                phases[phase] = {
+                    'count': len(values),
+                    'p50': round(_percentile(values, 50), 2),
+                    'p95': round(_percentile(values, 95), 2),
+                    'max': round(values[-1], 2)
+                }
+
+        slowest = max(records, key=lambda record: record.get('total_ms') or 0.0, default=None)
+        return {
+            'requests': len(records),
+            'phases': phases,
+            'request_bytes': sum(record.get('request_bytes') or 0 for record in records),
+            'response_bytes': sum(record.get('response_bytes') or 0 for record in records),
+            'slowest': slowest
+        }
+
+# Made with Bob
@@ -0,0 +1,199 @@
+"""
+読み取り専用MCPツールの結果キャッシュ
+正規化した引数をキーとしてツールの結果をTTL付き・件数上限付き（LRU）で保持し、
+書き込み系ツールの実行時に該当テナントのキャッシュを無効化します
+"""
+
+import copy
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from .config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# キャッシュキーに含めない引数（FastMCPが注入するリクエストごとのContext）
+_UNKEYED_ARGUMENTS = frozenset({'ctx'})
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+class ToolResultCache:
+    """ツール結果のTTL付きLRUキャッシュ"""
+
+    def __init__(self, ttl: float = 60, max_entries: int = 1000):
+        """キャッシュの初期化
+
+        Args:
+            ttl: 結果を保持する秒数（0で無効）
+            max_entries: 保持する最大件数（超えた場合は最も長く使われていないものから破棄）
+        """
+        self.ttl = ttl
+        self.max_entries = max(max_entries, 1)
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # テナントごとの無効化の世代（実行中に無効化された読み取り結果を格納しないために使用）
+        self._generations: Dict[str, int] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """キャッシュされた(格納時刻, 結果)を取得（期限切れの場合はNone）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self, tenant: str) -> int:
+        """テナントの無効化の世代（無効化のたびに増加）"""
+        with self._lock:
+            return self._generation + self._generations.get(tenant, 0)
+
+    def put(self, key: Tuple[str, str, str], result: Dict[str, Any], generation: Optional[int] = None):
+        """結果を格納（generationが指定され、その後に無効化されていた場合は格納しない）"""
+        with self._lock:
+            if generation is not None and generation != self._generation + self._generations.get(key[1], 0):
+                return
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tenant: Optional[str] = None):
+        """テナントのキャッシュを破棄（省略時はすべて）"""
+        with self._lock:
+            if tenant is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._generation += 1
+            else:
+                self._generations[tenant] = self._generations.get(tenant, 0) + 1
+                keys = [key for key in self._entries if key[1] == tenant]
+                removed = len(keys)
+                for key in keys:
+                    del self._entries[key]
+            self.invalidations += 1
+        logger.debug(f"Tool result cache invalidated (tenant={tenant}, entries={removed})")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'ttl_seconds': self.ttl,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'invalidations': self.invalidations
+            }
+
+
+# グローバルキャッシュ
+_cache: Optional[ToolResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_tool_cache() -> ToolResultCache:
+    """ツール結果キャッシュを取得（シングルトンパターン）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                settings = get_settings()
+                _cache = ToolResultCache(ttl=settings.tool_cache_ttl, max_entries=settings.tool_cache_max_entries)
+    return _cache
+
+
+def _tenant_of(arguments: Dict[str, Any]) -> str:
+    return _normalize(arguments.get('tenant')) or get_settings().default_tenant
+
+
+def cached_tool(func: Callable) -> Callable:
+    """読み取り専用ツールの結果をキャッシュするデコレーター
+
+    引数はデフォルト値を補完して正規化するため、位置引数・キーワード引数の違いや
+    省略の有無に関わらず同じ呼び出しは同じキーになります。成功した結果（success=True）のみ
+    キャッシュし、レスポンスにはcacheメタデータ（hit, age_seconds, ttl_seconds）を付けます。
+    """
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        cache = get_tool_cache()
+        if not cache.enabled:
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {
+            key: _normalize(value)
+            for key, value in bound.arguments.items()
+            if key not in _UNKEYED_ARGUMENTS
+        }
+        key = (name, _tenant_of(arguments), json.dumps(arguments, sort_keys=True, default=str))
+
+        entry = cache.get(key)
+        if entry is not None:
+            stored_at, result = entry
+            return {
+                **copy.deepcopy(result),
+                'cache': {
+                    'hit': True,
+                    'age_seconds': round(time.monotonic() - stored_at, 1),
+                    'ttl_seconds': cache.ttl
+                }
+            }
+
+        # 実行中に書き込み系ツールが同じテナントを無効化した場合、古い可能性のある結果は格納しない
+        generation = cache.generation(key[1])
+        result = func(*args, **kwargs)
+        if isinstance(result, dict) and result.get('success'):
+            cache.put(key, copy.deepcopy(result), generation)
+            return {**result, 'cache': {'hit': False, 'age_seconds': 0.0, 'ttl_seconds': cache.ttl}}
+        return result
+
+    return wrapper
+
+
+def invalidates_cache(func: Callable) -> Callable:
+    """書き込み系ツールの実行後に同じテナントのキャッシュを無効化するデコレーター"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            cache = get_tool_cache()
+            if cache.enabled:
+                bound = signature.bind(*args, **kwargs)
+                cache.invalidate(_tenant_of(bound.arguments))
+
+    return wrapper
+
+# Made with Bob
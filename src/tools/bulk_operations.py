@@ -0,0 +1,332 @@
+"""
+SAP SuccessFactors 一括操作ツール
+多数のユーザーに対する書き込みを$batchチェンジセットやupsert呼び出しにまとめて並行に送信します
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+from ..sap_client import SAPSuccessFactorsClient, SAPClientError
+from ..odata_batch import error_message
+from ..tenants import get_client
+from ..config.settings import get_settings
+from ..progress import ToolProgress, NO_PROGRESS
+from .user_management import ADMIN_ROLE_NAME, ADMIN_GROUP_ID
+
+logger = logging.getLogger(__name__)
+
+
+def _chunks(items: List[Any], size: int) -> List[List[Any]]:
+    size = max(size, 1)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _retry_individually(client: SAPSuccessFactorsClient, chunk: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """失敗したチェンジセットの更新を1件ずつMERGEし、どの更新が失敗したかを特定"""
+    results = []
+    for user_id, fields in chunk:
+        try:
+            client.merge_user(user_id, fields)
+            results.append({'userId': user_id, 'success': True, 'status_code': 204, 'error': None, 'retried': True})
+        except SAPClientError as e:
+            error = str(e)
+            response_data = getattr(e, 'response_data', None)
+            if response_data:
+                error = f"{error}: {error_message(response_data)}"
+            results.append({
+                'userId': user_id,
+                'success': False,
+                'status_code': getattr(e, 'status_code', None),
+                'error': error,
+                'retried': True
+            })
+    return results
+
+
+def _update_chunk(client: SAPSuccessFactorsClient, chunk: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    try:
+        results = client.batch_merge_users(chunk)
+    except SAPClientError as e:
+        logger.error(f"$batch request failed for {len(chunk)} update(s): {str(e)}")
+        return [
+            {'userId': user_id, 'success': False, 'status_code': getattr(e, 'status_code', None), 'error': str(e)}
+            for user_id, _ in chunk
+        ]
+
+    if len(chunk) > 1 and any(result.get('changeset_failed') for result in results):
+        # チェンジセットはアトミックなため、失敗した更新以外もロールバックされている
+        return _retry_individually(client, chunk)
+
+    for result in results:
+        result.pop('changeset_failed', None)
+    return results
+
+
+def bulk_update_users(
+    updates: List[Dict[str, Any]],
+    changeset_size: Optional[int] = None,
+    tenant: Optional[str] = None,
+    progress: ToolProgress = NO_PROGRESS
+) -> Dict[str, Any]:
+    """複数ユーザーのフィールドを$batchチェンジセットで一括更新
+
+    更新はchangeset_size件ずつのチェンジセットにまとめ、複数の$batchリクエストを並行に送信します
+    （同時実行数は書き込み用のバルクヘッドとレートリミッターで制限されます）。
+    各更新はMERGEのため、指定したフィールド以外は変更されません。
+    失敗したチェンジセットは1件ずつ再送し、成功した更新と失敗した更新を切り分けます。
+
+    Args:
+        updates: 更新のリスト（{"user_id": "...", "fields": {"timeZone": "Asia/Tokyo", ...}}）
+        changeset_size: 1つのチェンジセットに含める更新数（省略時は設定値）
+        tenant: テナントキー（省略時はデフォルトテナント）
+        progress: 進捗通知（チェンジセットの完了ごとに通知し、その結果を部分結果として送信）
+
+    Returns:
+        ユーザーごとの結果と成功・失敗件数を含む辞書
+    """
+    settings = get_settings()
+    changeset_size = changeset_size or settings.sap_batch_changeset_size
+    logger.info(f"Bulk updating {len(updates)} user(s) (changeset_size={changeset_size})")
+
+    try:
+        client = get_client(tenant)
+    except SAPClientError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+
+    # 結果は入力と同じ順序で返す
+    results: List[Optional[Dict[str, Any]]] = [None] * len(updates)
+    valid: List[Tuple[str, Dict[str, Any]]] = []
+    positions: List[int] = []
+    for index, update in enumerate(updates):
+        user_id = update.get('user_id') or update.get('userId')
+        fields = {key: value for key, value in (update.get('fields') or {}).items() if value is not None}
+        if not user_id or not fields:
+            results[index] = {
+                'userId': user_id,
+                'success': False,
+                'status_code': None,
+                'error': "user_idと更新するfieldsを指定してください"
+            }
+            continue
+        valid.append((user_id, fields))
+        positions.append(index)
+
+    def update_chunk(chunk: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        results_of_chunk = _update_chunk(client, chunk)
+        progress.advance(len(chunk), items=results_of_chunk)
+        return results_of_chunk
+
+    started = time.perf_counter()
+    chunks = _chunks(valid, changeset_size)
+    progress.set_total(len(valid))
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(settings.sap_batch_workers, len(chunks))) as executor:
+            chunk_results = [
+                result
+                for results_of_chunk in executor.map(update_chunk, chunks)
+                for result in results_of_chunk
+            ]
+        for index, result in zip(positions, chunk_results):
+            results[index] = result
+    elapsed = time.perf_counter() - started
+
+    updated = sum(1 for result in results if result['success'])
+    failed = len(results) - updated
+    logger.info(f"Bulk update finished: {updated} updated, {failed} failed in {elapsed:.1f}s")
+
+    return {
+        "success": failed == 0,
+        "message": f"{updated}件のユーザーを更新しました" + (f"（{failed}件失敗）" if failed else ""),
+        "total": len(results),
+        "updated": updated,
+        "failed": failed,
+        "batches": len(chunks),
+        "elapsed_seconds": round(elapsed, 3),
+        "results": results
+    }
+
+
+def upsert_users(
+    users: List[Dict[str, Any]],
+    chunk_size: Optional[int] = None,
+    tenant: Optional[str] = None,
+    progress: ToolProgress = NO_PROGRESS
+) -> Dict[str, Any]:
+    """複数ユーザーをupsert APIで一括作成・更新
+
+    chunk_size件ずつ1回のupsert呼び出しにまとめ、複数の呼び出しを並行に送信します。
+    $batchを使わない書き込み経路のため、$batchが制限されている環境でも使用できます。
+
+    Args:
+        users: Userエンティティのリスト（{"userId": "...", "username": "...", "firstName": "...", ...}）
+        chunk_size: 1回のupsert呼び出しに含めるユーザー数（省略時は設定値）
+        tenant: テナントキー（省略時はデフォルトテナント）
+        progress: 進捗通知（upsert呼び出しの完了ごとに通知し、その結果を部分結果として送信）
+
+    Returns:
+        ユーザーごとの結果と作成・更新・失敗件数を含む辞書
+    """
+    settings = get_settings()
+    chunk_size = chunk_size or settings.sap_upsert_chunk_size
+    logger.info(f"Upserting {len(users)} user(s) (chunk_size={chunk_size})")
+
+    try:
+        client = get_client(tenant)
+    except SAPClientError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(users)
+    valid: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for index, user in enumerate(users):
+        if not user.get('userId'):
+            results[index] = {
+                'index': index,
+                'userId': None,
+                'status': 'failed',
+                'edit_status': None,
+                'http_code': None,
+                'message': "userIdを指定してください"
+            }
+            continue
+        valid.append({key: value for key, value in user.items() if value is not None})
+        positions.append(index)
+
+    def on_chunk(chunk_results: List[Dict[str, Any]]):
+        # 部分結果のindexも入力全体での位置に変換する
+        progress.advance(
+            len(chunk_results),
+            items=[{**result, 'index': positions[result['index']]} for result in chunk_results]
+        )
+
+    started = time.perf_counter()
+    progress.set_total(len(valid))
+    upserted = client.upsert_users(valid, chunk_size=chunk_size, workers=settings.sap_batch_workers, on_chunk=on_chunk)
+    for index, result in zip(positions, upserted):
+        results[index] = {**result, 'index': index}
+    elapsed = time.perf_counter() - started
+
+    counts = {'created': 0, 'updated': 0, 'upserted': 0, 'failed': 0}
+    for result in results:
+        counts[result['status']] += 1
+    logger.info(
+        f"User upsert finished: {counts['created']} created, {counts['updated']} updated, "
+        f"{counts['upserted']} upserted, {counts['failed']} failed in {elapsed:.1f}s"
+    )
+
+    succeeded = len(results) - counts['failed']
+    return {
+        "success": counts['failed'] == 0,
+        "message": f"{succeeded}件のユーザーを作成・更新しました" + (f"（{counts['failed']}件失敗）" if counts['failed'] else ""),
+        "total": len(results),
+        **counts,
+        "elapsed_seconds": round(elapsed, 3),
+        "results": results
+    }
+
+
+def _deactivate_user(client: SAPSuccessFactorsClient, user_id: str, delete: bool) -> Dict[str, Any]:
+    try:
+        if delete:
+            client.delete_user(user_id)
+        else:
+            client.merge_user(user_id, {'status': 'inactive'})
+        return {'userId': user_id, 'success': True, 'action': 'deleted' if delete else 'deactivated', 'error': None}
+    except SAPClientError as e:
+        return {'userId': user_id, 'success': False, 'action': None, 'error': str(e)}
+
+
+def bulk_deactivate_users(
+    user_ids: List[str],
+    delete: bool = False,
+    remove_from_admin_role: bool = True,
+    tenant: Optional[str] = None,
+    progress: ToolProgress = NO_PROGRESS
+) -> Dict[str, Any]:
+    """複数ユーザーを並行に無効化（または削除）し、管理者権限グループから外す
+
+    ユーザーごとの無効化（status=inactive）・削除はレートリミッターの範囲で並行に実行します。
+    成功したユーザーは、権限グループのメンバーを1回取得して再計算した一覧を
+    1回のupsertで反映することでまとめて削除します。
+
+    Args:
+        user_ids: 対象のユーザーIDのリスト
+        delete: Trueの場合は無効化ではなく削除する
+        remove_from_admin_role: IBM管理者用権限グループから削除するか
+        tenant: テナントキー（省略時はデフォルトテナント）
+        progress: 進捗通知（ユーザーごとの結果を部分結果として送信）
+
+    Returns:
+        ユーザーごとの結果と権限グループの更新結果を含む辞書
+    """
+    user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+    logger.info(f"Bulk deactivating {len(user_ids)} user(s) (delete={delete})")
+
+    try:
+        client = get_client(tenant)
+    except SAPClientError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+
+    def deactivate(user_id: str) -> Dict[str, Any]:
+        result = _deactivate_user(client, user_id, delete)
+        progress.advance(items=[dict(result)])
+        return result
+
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    # 権限グループの更新も1ステップとして数える
+    progress.set_total(len(user_ids) + (1 if remove_from_admin_role else 0))
+    if user_ids:
+        with ThreadPoolExecutor(max_workers=min(get_settings().sap_batch_workers, len(user_ids))) as executor:
+            results = list(executor.map(deactivate, user_ids))
+
+    succeeded = [result['userId'] for result in results if result['success']]
+    group_result = None
+    if remove_from_admin_role and succeeded:
+        try:
+            group_result = client.remove_users_from_permission_role(succeeded, ADMIN_ROLE_NAME, ADMIN_GROUP_ID)
+        except SAPClientError as e:
+            group_result = {'status': 'failed', 'error': str(e)}
+    if remove_from_admin_role:
+        progress.advance(message="権限グループを更新しました" if group_result else None)
+
+    removed = set(group_result.get('removed', [])) if group_result else set()
+    for result in results:
+        result['removed_from_admin_role'] = result['userId'] in removed
+    elapsed = time.perf_counter() - started
+
+    failed = len(results) - len(succeeded)
+    group_failed = group_result is not None and group_result.get('status') == 'failed'
+    logger.info(f"Bulk deactivation finished: {len(succeeded)} succeeded, {failed} failed in {elapsed:.1f}s")
+
+    action = "削除" if delete else "無効化"
+    message = f"{len(succeeded)}件のユーザーを{action}しました" + (f"（{failed}件失敗）" if failed else "")
+    if group_failed:
+        message += f"。権限グループからの削除に失敗しました: {group_result['error']}"
+
+    return {
+        "success": failed == 0 and not group_failed,
+        "message": message,
+        "total": len(results),
+        "succeeded": len(succeeded),
+        "failed": failed,
+        "admin_role": group_result,
+        "elapsed_seconds": round(elapsed, 3),
+        "results": results
+    }
+
+# Made with Bob
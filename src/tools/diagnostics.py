@@ -0,0 +1,68 @@
+"""
+SAP SuccessFactors 診断ツール
+接続・同時実行制御の状態をMCPツールとして公開します
+"""
+
+import logging
+from typing import Dict, Any, Optional
+
+from ..sap_client import SAPClientError
+from ..tenants import get_tenant_registry
+from ..logging_setup import logging_stats
+from ..tool_cache import get_tool_cache
+from ..warmup import get_warm_up_status
+
+logger = logging.getLogger(__name__)
+
+
+def get_sap_diagnostics(tenant: Optional[str] = None) -> Dict[str, Any]:
+    """SAP APIクライアントの診断情報を取得
+    
+    Args:
+        tenant: テナントキー（省略時はデフォルトテナント）
+    
+    Returns:
+        診断情報を含む辞書
+        {
+            "success": bool,
+            "tenant": str,
+            "transport": 接続・TLS・TTFBの集計,
+            "request_timings": 直近リクエストの時間内訳（待ち行列・接続・TLS・TTFB・ボディ・デコード）の集計,
+            "bulkheads": エンドポイント種別ごとの同時実行数上限・実行中・待ち行列長,
+            "hedging": ヘッジの発行数・勝率・追加負荷（無効の場合はNone）,
+            "tenants": 保持中のテナントリソース,
+            "logging": キュー溢れ・サンプリングで破棄したログ件数,
+            "tool_cache": ツール結果キャッシュの件数・ヒット率,
+            "warm_up": 起動時ウォームアップのタスクごとの結果（未実行の場合はNone）,
+            "user_index": ユーザー検索インデックスの件数・同期時刻
+        }
+    """
+    logger.info(f"Collecting SAP client diagnostics (tenant={tenant})")
+    
+    try:
+        registry = get_tenant_registry()
+        resources = registry.resources(tenant)
+        
+        return {
+            "success": True,
+            "message": "診断情報を取得しました",
+            "tenant": resources.config.key,
+            "transport": resources.client.transport.stats.snapshot(),
+            "request_timings": resources.client.transport.timings.summary(),
+            "bulkheads": resources.client.bulkheads.snapshot(),
+            "hedging": resources.client.hedger.snapshot() if resources.client.hedger else None,
+            "tenants": registry.snapshot(),
+            "logging": logging_stats(),
+            "tool_cache": get_tool_cache().snapshot(),
+            "warm_up": get_warm_up_status(),
+            "user_index": resources.client.user_index.snapshot()
+        }
+        
+    except SAPClientError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+
+# Made with Bob
@@ -0,0 +1,234 @@
+"""
+SAP SuccessFactors ユーザーエクスポートツール
+全ユーザーをページ単位でストリーミングし、JSONLまたはCSVファイルへ逐次書き込みます
+"""
+
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable
+
+from ..sap_client import SAPSuccessFactorsClient, SAPClientError
+from ..tenants import get_client, get_tenant_registry, TenantResources
+from ..config.settings import get_settings
+from ..jobs import Job, get_job_registry
+from ..scanner import PartitionedUserScanner
+from .user_management import _clean_entity, _parse_fields
+
+logger = logging.getLogger(__name__)
+
+# エクスポート形式
+EXPORT_FORMATS = ("jsonl", "csv")
+
+
+def _csv_value(value: Any) -> Any:
+    """CSVに書き込めない値（ネストした辞書・リスト）をJSON文字列に変換"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+    return value
+
+
+def _resolve_export_path(file_name: Optional[str], file_format: str) -> str:
+    """エクスポート先のパスを決定（エクスポートディレクトリ外への書き込みを防ぐ）"""
+    export_dir = get_settings().export_dir
+    os.makedirs(export_dir, exist_ok=True)
+
+    if not file_name:
+        file_name = f"users_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+
+    return os.path.join(export_dir, os.path.basename(file_name))
+
+
+def export_users_to_file(
+    path: str,
+    file_format: str = "jsonl",
+    select: Optional[List[str]] = None,
+    filter_query: Optional[str] = None,
+    page_size: int = 1000,
+    on_progress: Optional[Callable[[int, float], None]] = None,
+    client: Optional[SAPSuccessFactorsClient] = None,
+    workers: int = 1
+) -> Dict[str, Any]:
+    """全ユーザーをファイルへストリーミング出力
+
+    1ページずつ取得して書き込むため、ユーザー数に関わらずメモリ使用量は一定です。
+    書き込み中のファイルは一時ファイル（.part）とし、完了時にリネームします。
+
+    Args:
+        path: 出力先ファイルパス
+        file_format: "jsonl" または "csv"
+        select: 取得するプロパティ（Noneの場合は全プロパティ、CSVでは1ページ目の列を使用）
+        filter_query: フィルタクエリ（OData形式）
+        page_size: 1ページあたりの取得件数
+        on_progress: ページ書き込みごとに(出力件数, 件数/秒)で呼ばれるコールバック
+        client: 使用するクライアント（省略時はデフォルトテナント）
+        workers: 2以上の場合はuserIdでパーティション分割して並列に取得（出力順は不定）
+
+    Returns:
+        出力結果（path, rows, elapsed_seconds, rows_per_second, bytes）
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"不正なエクスポート形式です: {file_format}（{', '.join(EXPORT_FORMATS)}のいずれか）")
+
+    client = client or get_client()
+    temp_path = f"{path}.part"
+    rows = 0
+    started = time.perf_counter()
+
+    if workers > 1:
+        pages = PartitionedUserScanner(
+            client,
+            max_workers=workers,
+            page_size=page_size,
+            filter_query=filter_query,
+            select=select
+        ).scan_pages()
+    else:
+        pages = client.iter_user_pages(page_size=page_size, filter_query=filter_query, select=select)
+
+    with open(temp_path, 'w', encoding='utf-8', newline='') as output:
+        writer = None
+        for page in pages:
+            for user in page:
+                record = _clean_entity(user)
+                if file_format == "jsonl":
+                    output.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+                    output.write('\n')
+                else:
+                    if writer is None:
+                        columns = select or list(record.keys())
+                        writer = csv.DictWriter(output, fieldnames=columns, extrasaction='ignore')
+                        writer.writeheader()
+                    writer.writerow({key: _csv_value(value) for key, value in record.items()})
+                rows += 1
+
+            output.flush()
+            elapsed = time.perf_counter() - started
+            if on_progress:
+                on_progress(rows, rows / elapsed if elapsed > 0 else 0.0)
+
+    os.replace(temp_path, path)
+    elapsed = time.perf_counter() - started
+    rows_per_second = rows / elapsed if elapsed > 0 else 0.0
+
+    logger.info(f"Exported {rows} users to {path} in {elapsed:.1f}s ({rows_per_second:.0f} rows/s)")
+    return {
+        "path": path,
+        "rows": rows,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_per_second, 1),
+        "bytes": os.path.getsize(path)
+    }
+
+
+def _run_export_job(job: Job, resources: TenantResources, path: str, file_format: str, select, filter_query, page_size, workers) -> Dict[str, Any]:
+    def on_progress(rows: int, rows_per_second: float):
+        job.update(rows=rows, rows_per_second=round(rows_per_second, 1))
+
+    job.update(path=path, rows=0, rows_per_second=0.0)
+    try:
+        return export_users_to_file(
+            path,
+            file_format=file_format,
+            select=select,
+            filter_query=filter_query,
+            page_size=page_size,
+            on_progress=on_progress,
+            client=resources.client,
+            workers=workers
+        )
+    finally:
+        get_tenant_registry().release(resources)
+
+
+def start_user_export(
+    file_name: Optional[str] = None,
+    file_format: str = "jsonl",
+    fields: Optional[str] = None,
+    filter_query: Optional[str] = None,
+    page_size: int = 1000,
+    parallel: bool = False,
+    tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """ユーザーエクスポートをバックグラウンドジョブとして開始
+
+    Args:
+        file_name: 出力ファイル名（エクスポートディレクトリ直下に作成、省略時は日時から生成）
+        file_format: "jsonl" または "csv"
+        fields: 出力するフィールド（カンマ区切り、$selectとして送信）
+        filter_query: フィルタクエリ（OData形式）
+        page_size: 1ページあたりの取得件数
+        parallel: userIdでパーティション分割して並列に取得するか（出力順は不定）
+        tenant: テナントキー（省略時はデフォルトテナント）
+
+    Returns:
+        開始したジョブ情報を含む辞書
+    """
+    logger.info(f"Starting user export: format={file_format}, fields={fields}")
+
+    if file_format not in EXPORT_FORMATS:
+        return {
+            "success": False,
+            "message": f"不正なエクスポート形式です: {file_format}（{', '.join(EXPORT_FORMATS)}のいずれか）"
+        }
+
+    try:
+        # ジョブの実行中にテナントの接続が解放されないよう、使用中として確保する
+        resources = get_tenant_registry().acquire(tenant)
+    except SAPClientError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+
+    try:
+        path = _resolve_export_path(file_name, file_format)
+        job = get_job_registry().submit(
+            "export_users",
+            _run_export_job,
+            resources,
+            path,
+            file_format,
+            _parse_fields(fields),
+            filter_query,
+            page_size,
+            get_settings().sap_scan_workers if parallel else 1
+        )
+    except Exception:
+        get_tenant_registry().release(resources)
+        raise
+
+    return {
+        "success": True,
+        "message": f"ユーザーのエクスポートを開始しました（ジョブID: {job.id}）",
+        "job": job.to_dict()
+    }
+
+
+def get_job_status(job_id: str) -> Dict[str, Any]:
+    """バックグラウンドジョブの状態を取得
+
+    Args:
+        job_id: ジョブID
+
+    Returns:
+        ジョブ状態を含む辞書
+    """
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return {
+            "success": False,
+            "message": f"ジョブ '{job_id}' が見つかりません"
+        }
+
+    return {
+        "success": True,
+        "message": f"ジョブの状態: {job.status}",
+        "job": job.to_dict()
+    }
+
+# Made with Bob
@@ -0,0 +1,79 @@
+"""
+SAP SuccessFactors ユーザー検索ツール
+同期したユーザーのスナップショットに対するプロセス内のインデックスで検索し、
+substringof等のフィルタクエリをSuccessFactorsに送らずに結果を返します
+"""
+
+import logging
+import time
+from typing import Dict, Any, Optional
+
+from ..sap_client import SAPClientError
+from ..tenants import get_client
+from .user_management import shape_entities, _parse_fields
+
+logger = logging.getLogger(__name__)
+
+
+def search_users(
+    query: str,
+    limit: int = 20,
+    fields: Optional[str] = None,
+    tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """ユーザーをuserId・ユーザー名・氏名・メールアドレスで検索
+
+    空白区切りの各語が、いずれかのプロパティの単語と完全一致・前方一致・あいまい一致する
+    ユーザーをスコア順に返します。最初の呼び出しでユーザーを同期してインデックスを作成し、
+    以降は一定間隔で変更分のみを同期します。
+
+    Args:
+        query: 検索語（例: "yamada", "tar yam", "taro.yamada@example.com"）
+        limit: 返す最大件数
+        fields: 出力するフィールド（カンマ区切り、省略時は同期したすべてのプロパティ）
+        tenant: テナントキー（省略時はデフォルトテナント）
+
+    Returns:
+        スコア順のユーザー一覧とインデックスの状態を含む辞書
+    """
+    logger.info(f"Searching users: query={query!r}, limit={limit}")
+
+    if not query or not query.strip():
+        return {
+            "success": False,
+            "message": "検索語を指定してください"
+        }
+
+    try:
+        client = get_client(tenant)
+        index = client.user_index
+        index.ensure_fresh(client)
+
+        started = time.perf_counter()
+        matches, total = index.search(query, limit=limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        shaped = shape_entities([record for record, _ in matches], fields=_parse_fields(fields))
+        for item, (_, score) in zip(shaped["data"], matches):
+            item["score"] = score
+
+        logger.info(f"Found {total} user(s) for {query!r} in {elapsed_ms:.1f}ms")
+        return {
+            "success": True,
+            "message": f"{total}件のユーザーが見つかりました" + (f"（上位{len(matches)}件を返します）" if total > len(matches) else ""),
+            "total_matches": total,
+            "count": len(matches),
+            "data": shaped["data"],
+            "search_ms": round(elapsed_ms, 2),
+            "index": index.snapshot()
+        }
+
+    except SAPClientError as e:
+        logger.error(f"Failed to search users: {str(e)}")
+        return {
+            "success": False,
+            "message": f"ユーザーの検索に失敗しました: {str(e)}",
+            "error": str(e)
+        }
+
+# Made with Bob
@@ -3,14 +3,168 @@ SAP SuccessFactors ユーザー管理ツール
 MCPツールとして公開される関数を定義します
 """
 
+import base64
+import json
 import logging
-from typing import Dict, Any, Optional
-from datetime import datetime
+import re
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import datetime, timezone
 
 from ..sap_client import SAPSuccessFactorsClient, SAPClientError
+from ..records import UserRecord
+from ..tenants import get_client, get_tenant_registry
+from ..config.settings import get_settings
+from ..progress import ToolProgress, NO_PROGRESS
 
 logger = logging.getLogger(__name__)
 
+# OData v2の日付形式: /Date(1700000000000)/ または /Date(1700000000000+0000)/
+_ODATA_DATE_PATTERN = re.compile(r'^/Date\((-?\d+)(?:[+-]\d{4})?\)/$')
+
+# 出力形式
+OUTPUT_FORMATS = ("records", "table")
+
+# 固定の権限グループ名とDynamic Group ID
+ADMIN_ROLE_NAME = "IBM管理者用権限グループ"
+ADMIN_GROUP_ID = "8526"
+
+
+def _clean_value(value: Any) -> Any:
+    """ODataの値からエンベロープ情報を除去し、日付をISO 8601形式に変換"""
+    if isinstance(value, str):
+        match = _ODATA_DATE_PATTERN.match(value)
+        if match:
+            millis = int(match.group(1))
+            return datetime.fromtimestamp(millis / 1000, timezone.utc).isoformat().replace('+00:00', 'Z')
+        return value
+    
+    if isinstance(value, dict):
+        # 展開されたナビゲーションプロパティ: {"results": [...]}
+        if 'results' in value and isinstance(value['results'], list):
+            return [_clean_value(item) for item in value['results']]
+        return _clean_entity(value)
+    
+    if isinstance(value, list):
+        return [_clean_value(item) for item in value]
+    
+    return value
+
+
+def _clean_entity(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """エンティティから__metadataと未展開の__deferredリンクを除去
+    
+    Args:
+        entity: SAP APIから返されたエンティティ
+        
+    Returns:
+        整形されたエンティティ
+    """
+    cleaned = {}
+    for key, value in entity.items():
+        if key == '__metadata':
+            continue
+        if isinstance(value, dict) and '__deferred' in value:
+            continue
+        cleaned[key] = _clean_value(value)
+    return cleaned
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """カンマ区切りのフィールド指定をリストに変換"""
+    if not fields:
+        return None
+    parsed = [field.strip() for field in fields.split(',') if field.strip()]
+    return parsed or None
+
+
+def _encode_cursor(skip: int, filter_query: Optional[str], order_by: Optional[str] = None) -> str:
+    """続きを取得するためのカーソルを生成（並び順を指定して取得した場合は続きも同じ順序で取得する）"""
+    values: Dict[str, Any] = {'skip': skip, 'filter': filter_query}
+    if order_by:
+        values['order'] = order_by
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, Optional[str], Optional[str]]:
+    """カーソルから(skip, filter_query, order_by)を復元
+    
+    Raises:
+        ValueError: カーソルが不正な場合
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return int(payload['skip']), payload.get('filter'), payload.get('order')
+    except Exception as e:
+        raise ValueError(f"不正なカーソルです: {cursor}") from e
+
+
+def shape_entities(
+    entities: List[Dict[str, Any]],
+    fields: Optional[List[str]] = None,
+    output_format: str = "records",
+    max_bytes: int = 0
+) -> Dict[str, Any]:
+    """エンティティ一覧をMCP応答用に整形
+    
+    ODataのエンベロープ情報を除去し、指定フィールドのみを残し、
+    シリアライズ後のサイズが上限を超える手前で打ち切ります。
+    
+    Args:
+        entities: SAP APIから返されたエンティティ、またはUserRecordの一覧
+        fields: 出力するフィールド（Noneの場合は全フィールド）
+        output_format: "records"（辞書のリスト）または "table"（columns + rows）
+        max_bytes: 出力データの最大バイト数（0の場合は無制限）
+        
+    Returns:
+        {"data": [...]} または {"columns": [...], "rows": [...]} に
+        "returned"（出力件数）と "truncated"（打ち切りの有無）を加えた辞書
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"不正な出力形式です: {output_format}（{', '.join(OUTPUT_FORMATS)}のいずれか）")
+    
+    # UserRecordは指定フィールドのみを取り出す（属性で足りる場合は残りのプロパティをデコードしない）
+    cleaned = [
+        _clean_entity(entity.to_dict(fields) if isinstance(entity, UserRecord) else entity)
+        for entity in entities
+    ]
+    
+    if output_format == "table":
+        if fields:
+            columns = list(fields)
+        else:
+            # 出現順を保ったまま全エンティティのキーを集める
+            columns = list(dict.fromkeys(key for entity in cleaned for key in entity))
+        items = [[entity.get(column) for column in columns] for entity in cleaned]
+    else:
+        columns = None
+        if fields:
+            items = [{field: entity.get(field) for field in fields} for entity in cleaned]
+        else:
+            items = cleaned
+    
+    truncated = False
+    if max_bytes > 0:
+        used = 0
+        for index, item in enumerate(items):
+            # 区切り文字分の1バイトを加算
+            used += len(json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8')) + 1
+            # 1件目は上限を超えても返す（カーソルが進まなくなるのを防ぐ）
+            if used > max_bytes and index > 0:
+                items = items[:index]
+                truncated = True
+                break
+    
+    shaped: Dict[str, Any] = {}
+    if output_format == "table":
+        shaped["columns"] = columns
+        shaped["rows"] = items
+    else:
+        shaped["data"] = items
+    shaped["returned"] = len(items)
+    shaped["truncated"] = truncated
+    return shaped
+
 
 def create_sap_user(
     user_id: str,
@@ -21,7 +175,8 @@ def create_sap_user(
     locale: str = "ja_JP",
     timezone: str = "Asia/Tokyo",
     status: str = "active",
-    add_to_admin_role: bool = True
+    add_to_admin_role: bool = True,
+    tenant: Optional[str] = None
 ) -> Dict[str, Any]:
     """SAP SuccessFactorsに新規ユーザーを作成
     
@@ -38,6 +193,7 @@ def create_sap_user(
         timezone: タイムゾーン（デフォルト: Asia/Tokyo）
         status: ステータス（デフォルト: active）
         add_to_admin_role: IBM管理者用権限グループに追加するか（デフォルト: True）
+        tenant: テナントキー（省略時はデフォルトテナント）
         
     Returns:
         作成結果を含む辞書
@@ -53,7 +209,7 @@ def create_sap_user(
     
     try:
         # SAP APIクライアントの初期化
-        client = SAPSuccessFactorsClient()
+        client = get_client(tenant)
         
         # ユーザーデータの構築
         user_data = {
@@ -99,7 +255,7 @@ def create_sap_user(
         # 権限グループに追加
         if add_to_admin_role:
             logger.info(f"Adding user {user_id} to admin role")
-            role_result = add_user_to_admin_role(user_id)
+            role_result = add_user_to_admin_role(user_id, tenant=tenant)
             
             # 権限追加の結果に応じてメッセージを設定
             if role_result.get('success'):
@@ -136,11 +292,12 @@ def create_sap_user(
         }
 
 
-def get_sap_user(user_id: str) -> Dict[str, Any]:
+def get_sap_user(user_id: str, tenant: Optional[str] = None) -> Dict[str, Any]:
     """SAP SuccessFactorsからユーザー情報を取得
     
     Args:
         user_id: ユーザーID
+        tenant: テナントキー（省略時はデフォルトテナント）
         
     Returns:
         ユーザー情報を含む辞書
@@ -148,7 +305,7 @@ def get_sap_user(user_id: str) -> Dict[str, Any]:
     logger.info(f"Getting SAP user: {user_id}")
     
     try:
-        client = SAPSuccessFactorsClient()
+        client = get_client(tenant)
         user_data = client.get_user(user_id)
         
         if user_data is None:
@@ -162,7 +319,7 @@ def get_sap_user(user_id: str) -> Dict[str, Any]:
             "success": True,
             "user_id": user_id,
             "message": "ユーザー情報を取得しました",
-            "data": user_data
+            "data": _clean_entity(user_data)
         }
         
     except SAPClientError as e:
@@ -175,23 +332,77 @@ def get_sap_user(user_id: str) -> Dict[str, Any]:
         }
 
 
+def get_sap_users(
+    user_ids: List[str],
+    fields: Optional[str] = None,
+    tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """複数のユーザー情報をまとめて取得
+    
+    重複を除き、キャッシュ済みのユーザーはAPIを呼ばずに返し、
+    残りは複数件ずつの$filter（userId in ...）で並行に取得します。
+    
+    Args:
+        user_ids: ユーザーIDのリスト
+        fields: 取得するフィールド（カンマ区切り、省略時は全フィールド）
+        tenant: テナントキー（省略時はデフォルトテナント）
+        
+    Returns:
+        見つかったユーザー（入力順）と見つからなかったユーザーIDを含む辞書
+    """
+    logger.info(f"Getting {len(user_ids)} SAP user(s)")
+    
+    try:
+        client = get_client(tenant)
+        result = client.get_users(
+            user_ids,
+            select=_parse_fields(fields),
+            workers=get_settings().sap_batch_workers
+        )
+        
+        found = len(result['users'])
+        missing = result['missing']
+        return {
+            "success": True,
+            "message": f"{found}件のユーザー情報を取得しました" + (f"（{len(missing)}件見つかりません）" if missing else ""),
+            "found": found,
+            "missing": missing,
+            "cached": result['cached'],
+            "requests": result['requests'],
+            "data": [_clean_entity(user) for user in result['users'].values()]
+        }
+        
+    except SAPClientError as e:
+        logger.error(f"Failed to get users: {str(e)}")
+        return {
+            "success": False,
+            "message": f"ユーザー情報の取得に失敗しました: {str(e)}",
+            "error": str(e)
+        }
+
+
 def update_sap_user(
     user_id: str,
+    tenant: Optional[str] = None,
     **kwargs
 ) -> Dict[str, Any]:
     """SAP SuccessFactorsのユーザー情報を更新
     
+    現在の値と比較し、変更のあるフィールドのみをMERGEで送信します。
+    変更がない場合はAPIを呼び出しません。
+    
     Args:
         user_id: ユーザーID
+        tenant: テナントキー（省略時はデフォルトテナント）
         **kwargs: 更新するフィールド
         
     Returns:
-        更新結果を含む辞書
+        更新結果を含む辞書（changed_fields: 変更前後の値、unchanged_fields, skipped）
     """
     logger.info(f"Updating SAP user: {user_id}")
     
     try:
-        client = SAPSuccessFactorsClient()
+        client = get_client(tenant)
         
         # 更新データの構築
         update_data = {k: v for k, v in kwargs.items() if v is not None}
@@ -203,14 +414,21 @@ def update_sap_user(
                 "message": "更新するデータが指定されていません"
             }
         
-        # ユーザーの更新
-        result = client.update_user(user_id, update_data)
+        # 変更のあるフィールドのみ更新
+        result = client.update_user_fields(user_id, update_data)
+        
+        if result['skipped']:
+            message = f"ユーザー '{user_id}' に変更はありません（更新を省略しました）"
+        else:
+            message = f"ユーザー '{user_id}' を正常に更新しました（{', '.join(result['changed'].keys())}）"
         
         return {
             "success": True,
             "user_id": user_id,
-            "message": f"ユーザー '{user_id}' を正常に更新しました",
-            "data": result
+            "message": message,
+            "changed_fields": result['changed'],
+            "unchanged_fields": result['unchanged'],
+            "skipped": result['skipped']
         }
         
     except SAPClientError as e:
@@ -223,34 +441,155 @@ def update_sap_user(
         }
 
 
+def _list_user_pages(
+    client: SAPSuccessFactorsClient,
+    top: int,
+    skip: int,
+    filter_query: Optional[str],
+    selected_fields: Optional[List[str]],
+    budget: int,
+    progress: ToolProgress
+) -> Dict[str, Any]:
+    """ユーザー一覧をページに分割して順に取得し、取得したページごとに部分結果を送信
+
+    $skipによる個別のリクエスト間では順序が保証されないため、userIdで並べて取得します
+    （ページ間での重複・欠落を防ぐ）。
+    """
+    page_size = max(get_settings().mcp_stream_page_size, 1)
+    users: List[Dict[str, Any]] = []
+    count = None
+    streamed_bytes = 0
+    progress.set_total(top)
+    while len(users) < top:
+        first_page = not users and skip == 0
+        requested = min(page_size, top - len(users))
+        page = client.list_users_page(
+            top=requested,
+            skip=skip + len(users),
+            filter_query=filter_query,
+            select=selected_fields,
+            inline_count=first_page,
+            order_by='userId'
+        )
+        results = page['results']
+        if first_page:
+            count = page['count']
+            if count is not None:
+                progress.set_total(min(top, count))
+        users.extend(results)
+        
+        # 部分結果は最終的な応答と同じ上限バイト数までとする
+        items = []
+        if budget <= 0 or streamed_bytes < budget:
+            items = shape_entities(results, selected_fields, "records", budget - streamed_bytes if budget > 0 else 0)["data"]
+            streamed_bytes += len(json.dumps(items, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        progress.advance(len(results), message=f"{len(users)}件のユーザーを取得しました", items=items)
+        
+        if len(results) < requested:
+            break
+    return {'results': users, 'count': count}
+
+
 def list_sap_users(
     top: int = 10,
     skip: int = 0,
-    filter_query: Optional[str] = None
+    filter_query: Optional[str] = None,
+    fields: Optional[str] = None,
+    output_format: str = "records",
+    max_bytes: int = 0,
+    cursor: Optional[str] = None,
+    tenant: Optional[str] = None,
+    progress: ToolProgress = NO_PROGRESS
 ) -> Dict[str, Any]:
     """SAP SuccessFactorsからユーザー一覧を取得
     
+    ODataのエンベロープ情報（__metadata、__deferred）を除去し、日付をISO 8601形式に変換して返します。
+    出力が上限バイト数を超える場合は打ち切り、続きを取得するためのカーソルを返します。
+    部分結果をストリーミングする場合は、topを設定したページ件数ごとにuserId順で分割して取得し、
+    取得したページから順に部分結果として送信します。
+    
     Args:
         top: 取得件数（デフォルト: 10）
         skip: スキップ件数（デフォルト: 0）
         filter_query: フィルタクエリ（OData形式）
+        fields: 取得するフィールド（カンマ区切り、例: "userId,firstName,email"）
+        output_format: "records"（辞書のリスト）または "table"（columns + rows形式）
+        max_bytes: 出力データの最大バイト数（0の場合は設定値を使用）
+        cursor: 前回の応答のnext_cursor（指定時はskipとfilter_queryより優先）
+        tenant: テナントキー（省略時はデフォルトテナント）
+        progress: 進捗通知（省略時は通知しない）
         
     Returns:
-        ユーザー一覧を含む辞書
+        ユーザー一覧を含む辞書（skip=0の場合は条件に一致する総件数total_countを含む）
     """
+    order_by = None
+    try:
+        if cursor:
+            skip, cursor_filter, order_by = _decode_cursor(cursor)
+            filter_query = cursor_filter
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+    
     logger.info(f"Listing SAP users: top={top}, skip={skip}")
     
     try:
-        client = SAPSuccessFactorsClient()
-        users = client.list_users(top=top, skip=skip, filter_query=filter_query)
+        selected_fields = _parse_fields(fields)
+        budget = max_bytes if max_bytes > 0 else get_settings().mcp_response_max_bytes
         
-        return {
+        client = get_client(tenant)
+        
+        if progress.streaming and top > get_settings().mcp_stream_page_size:
+            order_by = 'userId'
+            page = _list_user_pages(client, top, skip, filter_query, selected_fields, budget, progress)
+        else:
+            # 1ページ目は総件数も同じリクエストで取得する
+            first_page = skip == 0
+            page = client.list_users_page(
+                top=top,
+                skip=skip,
+                filter_query=filter_query,
+                select=selected_fields,
+                inline_count=first_page,
+                order_by=order_by
+            )
+        users = page['results']
+        
+        shaped = shape_entities(users, selected_fields, output_format, budget)
+        returned = shaped["returned"]
+        
+        result = {
             "success": True,
-            "message": f"{len(users)}件のユーザーを取得しました",
-            "count": len(users),
-            "data": users
+            "message": f"{returned}件のユーザーを取得しました",
+            "count": returned,
+            **shaped
         }
         
+        if page['count'] is not None:
+            result["total_count"] = page['count']
+        
+        # 打ち切られた場合、またはページが満杯の場合は続きが存在しうる
+        if shaped["truncated"] or len(users) >= top:
+            result["next_cursor"] = _encode_cursor(skip + returned, filter_query, order_by)
+        
+        if shaped["truncated"]:
+            result["message"] = (
+                f"{returned}件のユーザーを取得しました"
+                f"（出力上限{budget}バイトのため{len(users) - returned}件を省略、next_cursorで続きを取得できます）"
+            )
+        
+        return result
+        
+    except ValueError as e:
+        return {
+            "success": False,
+            "message": str(e),
+            "error": str(e)
+        }
+    
     except SAPClientError as e:
         logger.error(f"Failed to list users: {str(e)}")
         return {
@@ -260,27 +599,67 @@ def list_sap_users(
         }
 
 
-def test_sap_connection() -> Dict[str, Any]:
+def count_sap_users(filter_query: Optional[str] = None, tenant: Optional[str] = None) -> Dict[str, Any]:
+    """条件に一致するユーザー数を取得
+    
+    Args:
+        filter_query: フィルタクエリ（OData形式、例: "status eq 'active'"）
+        tenant: テナントキー（省略時はデフォルトテナント）
+        
+    Returns:
+        ユーザー数を含む辞書
+    """
+    logger.info(f"Counting SAP users: filter={filter_query}")
+    
+    try:
+        client = get_client(tenant)
+        count = client.count_users(filter_query=filter_query)
+        
+        return {
+            "success": True,
+            "message": f"条件に一致するユーザーは{count}件です",
+            "count": count,
+            "filter_query": filter_query
+        }
+        
+    except SAPClientError as e:
+        logger.error(f"Failed to count users: {str(e)}")
+        return {
+            "success": False,
+            "message": f"ユーザー数の取得に失敗しました: {str(e)}",
+            "error": str(e)
+        }
+
+
+def test_sap_connection(force: bool = False, tenant: Optional[str] = None) -> Dict[str, Any]:
     """SAP SuccessFactors API接続をテスト
     
+    バックグラウンドのヘルスプローブがキャッシュした結果を返すため、
+    通常はSAP APIへのリクエストは発生しません。
+    
+    Args:
+        force: キャッシュを無視して実際に接続を確認するか（デフォルト: False）
+        tenant: テナントキー（省略時はデフォルトテナント）
+    
     Returns:
         接続テスト結果を含む辞書
     """
-    logger.info("Testing SAP connection")
+    logger.info(f"Testing SAP connection (force={force})")
     
     try:
-        client = SAPSuccessFactorsClient()
-        success = client.test_connection()
+        status = get_tenant_registry().resources(tenant).health.status(force=force)
         
-        if success:
+        if status['healthy']:
             return {
                 "success": True,
-                "message": "SAP SuccessFactors APIへの接続に成功しました"
+                "message": "SAP SuccessFactors APIへの接続に成功しました",
+                "health": status
             }
         else:
             return {
                 "success": False,
-                "message": "SAP SuccessFactors APIへの接続に失敗しました"
+                "message": "SAP SuccessFactors APIへの接続に失敗しました",
+                "health": status
             }
         
     except Exception as e:
@@ -292,7 +671,7 @@ def test_sap_connection() -> Dict[str, Any]:
         }
 
 
-def add_user_to_admin_role(user_id: str) -> Dict[str, Any]:
+def add_user_to_admin_role(user_id: str, tenant: Optional[str] = None) -> Dict[str, Any]:
     """ユーザーをIBM管理者用権限グループに追加
     
     ユーザー作成後に自動的に管理者権限グループに追加します。
@@ -300,6 +679,7 @@ def add_user_to_admin_role(user_id: str) -> Dict[str, Any]:
     
     Args:
         user_id: 追加するユーザーID
+        tenant: テナントキー（省略時はデフォルトテナント）
         
     Returns:
         追加結果を含む辞書
@@ -313,11 +693,8 @@ def add_user_to_admin_role(user_id: str) -> Dict[str, Any]:
     """
     logger.info(f"Adding user to admin role: {user_id}")
     
-    # 固定の権限グループ名
-    ADMIN_ROLE_NAME = "IBM管理者用権限グループ"
-    
     try:
-        client = SAPSuccessFactorsClient()
+        client = get_client(tenant)
         
         # 権限グループにユーザーを追加
         result = client.add_user_to_permission_role(user_id, ADMIN_ROLE_NAME)
@@ -362,6 +739,72 @@ def add_user_to_admin_role(user_id: str) -> Dict[str, Any]:
         }
 
 
+def reconcile_group_membership(
+    desired_members: List[str],
+    group_id: str = ADMIN_GROUP_ID,
+    group_name: Optional[str] = None,
+    dry_run: bool = False,
+    allow_empty: bool = False,
+    tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """権限グループ（Dynamic Group）のメンバーを指定した一覧と一致させる
+    
+    現在のメンバーとの差分を計算し、追加・削除を1回のupsertでまとめて反映します。
+    既に一致している場合は何も書き込みません。
+    
+    Args:
+        desired_members: あるべきメンバーのユーザー名リスト
+        group_id: グループID（デフォルト: 8526 = IBM管理者用権限グループ）
+        group_name: グループ名（省略時はグループから取得）
+        dry_run: Trueの場合は差分を返すだけで書き込まない
+        allow_empty: 空の一覧（全メンバーの削除）を反映する場合はTrue
+        tenant: テナントキー（省略時はデフォルトテナント）
+        
+    Returns:
+        差分と反映結果を含む辞書
+    """
+    logger.info(f"Reconciling group {group_id} to {len(desired_members)} member(s) (dry_run={dry_run})")
+    
+    if group_id == ADMIN_GROUP_ID and not group_name:
+        group_name = ADMIN_ROLE_NAME
+    
+    try:
+        client = get_client(tenant)
+        result = client.reconcile_dynamic_group(
+            desired_members, group_id, group_name, dry_run=dry_run, allow_empty=allow_empty
+        )
+        
+        added, removed = len(result['to_add']), len(result['to_remove'])
+        if result['status'] == 'converged':
+            message = f"'{result['groupName']}' のメンバーは既に指定した一覧と一致しています"
+        elif result['status'] == 'dry_run':
+            message = f"'{result['groupName']}' の差分: 追加{added}件、削除{removed}件（dry run: 変更していません）"
+        else:
+            message = f"'{result['groupName']}' のメンバーを更新しました（追加{added}件、削除{removed}件）"
+        
+        return {
+            "success": True,
+            "message": message,
+            "data": result
+        }
+        
+    except SAPClientError as e:
+        logger.error(f"Failed to reconcile group membership: {str(e)}")
+        return {
+            "success": False,
+            "message": f"権限グループのメンバー更新に失敗しました: {str(e)}",
+            "error": str(e)
+        }
+    
+    except Exception as e:
+        logger.error(f"Unexpected error: {str(e)}")
+        return {
+            "success": False,
+            "message": f"予期しないエラーが発生しました: {str(e)}",
+            "error": str(e)
+        }
+
+
 def create_sap_user_with_admin_role(
     user_id: str,
     username: str,
@@ -370,7 +813,8 @@ def create_sap_user_with_admin_role(
     email: Optional[str] = None,
     locale: str = "ja_JP",
     timezone: str = "Asia/Tokyo",
-    status: str = "active"
+    status: str = "active",
+    tenant: Optional[str] = None
 ) -> Dict[str, Any]:
     """SAP SuccessFactorsに新規ユーザーを作成し、管理者権限グループに追加
     
@@ -387,6 +831,7 @@ def create_sap_user_with_admin_role(
         locale: ロケール（デフォルト: ja_JP）
         timezone: タイムゾーン（デフォルト: Asia/Tokyo）
         status: ステータス（デフォルト: active）
+        tenant: テナントキー（省略時はデフォルトテナント）
         
     Returns:
         作成結果を含む辞書
@@ -409,7 +854,8 @@ def create_sap_user_with_admin_role(
         email=email,
         locale=locale,
         timezone=timezone,
-        status=status
+        status=status,
+        tenant=tenant
     )
     
     if not user_result['success']:
@@ -425,7 +871,7 @@ def create_sap_user_with_admin_role(
     logger.info(f"User created successfully, adding to admin role: {user_id}")
     
     # ステップ2: 管理者権限グループに追加
-    role_result = add_user_to_admin_role(user_id)
+    role_result = add_user_to_admin_role(user_id, tenant=tenant)
     
     if not role_result['success']:
         logger.warning(f"Role assignment failed for user: {user_id}")
@@ -0,0 +1,589 @@
+"""
+SAP SuccessFactors HTTPトランスポート
+接続プール、DNSキャッシュ、TLSセッション再利用、接続のウォームアップ、
+HTTP/2多重化（オプション）を提供します
+"""
+
+import logging
+import socket
+import ssl
+import threading
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException, Timeout, ConnectionError
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util import connection as urllib3_connection
+
+from .config.settings import get_settings
+from .timing import RequestTimingRecorder
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpxのHTTP/2サポートに必要
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class DNSCache:
+    """名前解決結果をTTL付きでキャッシュする"""
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> str:
+        """ホスト名を解決（キャッシュがあれば再利用）
+
+        Args:
+            host: ホスト名
+            port: ポート番号
+
+        Returns:
+            IPアドレス。解決に失敗した場合は元のホスト名
+        """
+        if self.ttl <= 0:
+            return host
+
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            # 解決できない場合は通常の経路に任せてエラーを発生させる
+            return host
+
+        address = infos[0][4][0]
+        with self._lock:
+            self._entries[key] = (address, now + self.ttl)
+        return address
+
+    def clear(self):
+        """キャッシュをクリア"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 接続確立時間をリクエスト単位で受け渡すためのスレッドローカル
+_connect_timings = threading.local()
+
+
+def _record_connect_timing(name: str, value: float):
+    setattr(_connect_timings, name, value)
+
+
+def _pop_connect_timings() -> Dict[str, Optional[float]]:
+    timings = {
+        'connect_ms': getattr(_connect_timings, 'connect_ms', None),
+        'tls_ms': getattr(_connect_timings, 'tls_ms', None),
+        'tls_session_reused': getattr(_connect_timings, 'tls_session_reused', None),
+    }
+    _connect_timings.connect_ms = None
+    _connect_timings.tls_ms = None
+    _connect_timings.tls_session_reused = None
+    return timings
+
+
+class _SessionReusingSSLContext(ssl.SSLContext):
+    """ホスト単位でTLSセッションを保持し、新規接続時に再開するSSLContext"""
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        hostname = kwargs.get('server_hostname')
+        sessions = self.__dict__.setdefault('_tls_sessions', {})
+        if hostname and kwargs.get('session') is None and hostname in sessions:
+            kwargs['session'] = sessions[hostname]
+
+        ssl_sock = super().wrap_socket(sock, *args, **kwargs)
+        self.remember_session(hostname, ssl_sock)
+        return ssl_sock
+
+    def remember_session(self, hostname: Optional[str], ssl_sock):
+        """再開可能なTLSセッションを保存"""
+        session = getattr(ssl_sock, 'session', None)
+        if hostname and session is not None:
+            self.__dict__.setdefault('_tls_sessions', {})[hostname] = session
+
+
+def _open_socket(conn: HTTPConnection, dns_cache: Optional[DNSCache], default_new_conn):
+    """キャッシュしたIPアドレスへソケットを接続
+
+    解決したIPアドレスは接続先にのみ使用し、接続のhostは変更しません
+    （TLSのSNI・証明書のホスト名検証とHostヘッダーはホスト名のまま）。
+    """
+    address = dns_cache.resolve(conn.host, conn.port) if dns_cache is not None else conn.host
+    if address == conn.host:
+        return default_new_conn()
+    try:
+        return urllib3_connection.create_connection(
+            (address, conn.port),
+            conn.timeout,
+            source_address=conn.source_address,
+            socket_options=conn.socket_options,
+        )
+    except socket.timeout as e:
+        raise ConnectTimeoutError(
+            conn, f"Connection to {conn.host} timed out. (connect timeout={conn.timeout})"
+        ) from e
+    except OSError as e:
+        raise NewConnectionError(conn, f"Failed to establish a new connection: {e}") from e
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """DNSキャッシュを使用し、TCP接続時間を記録するHTTP接続"""
+
+    # トランスポートごとのDNSキャッシュ（_TimedHTTPAdapterが設定したサブクラスで上書き）
+    dns_cache: Optional[DNSCache] = None
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = _open_socket(self, self.dns_cache, super()._new_conn)
+        _record_connect_timing('connect_ms', (time.perf_counter() - started) * 1000)
+        return sock
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """DNSキャッシュを使用し、TCP接続時間とTLSハンドシェイク時間を記録するHTTPS接続"""
+
+    dns_cache: Optional[DNSCache] = None
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = _open_socket(self, self.dns_cache, super()._new_conn)
+        self._sf_connect_ms = (time.perf_counter() - started) * 1000
+        _record_connect_timing('connect_ms', self._sf_connect_ms)
+        return sock
+
+    def connect(self):
+        self._sf_connect_ms = 0.0
+        started = time.perf_counter()
+        super().connect()
+        total_ms = (time.perf_counter() - started) * 1000
+        _record_connect_timing('tls_ms', max(total_ms - self._sf_connect_ms, 0.0))
+        _record_connect_timing('tls_session_reused', getattr(self.sock, 'session_reused', None))
+
+    def close(self):
+        # TLS 1.3ではセッションチケットがハンドシェイク後に届くため、切断前に保存し直す
+        if isinstance(self.ssl_context, _SessionReusingSSLContext) and self.sock is not None:
+            self.ssl_context.remember_session(self.host, self.sock)
+        super().close()
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """計測付き接続クラスとTLSセッション再利用を組み込んだHTTPAdapter"""
+
+    def __init__(self, dns_cache: Optional[DNSCache] = None, **kwargs):
+        # init_poolmanagerはHTTPAdapter.__init__から呼ばれるため先に設定する
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        ssl_context = _SessionReusingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        ssl_context.load_verify_locations(requests.certs.where())
+        pool_kwargs.setdefault('ssl_context', ssl_context)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        # 接続クラスにこのアダプター（トランスポート）のDNSキャッシュを持たせる
+        dns_cache = getattr(self, 'dns_cache', None)
+        http_pool = type('_TimedHTTPConnectionPool', (_TimedHTTPConnectionPool,), {
+            'ConnectionCls': type('_TimedHTTPConnection', (_TimedHTTPConnection,), {'dns_cache': dns_cache}),
+        })
+        https_pool = type('_TimedHTTPSConnectionPool', (_TimedHTTPSConnectionPool,), {
+            'ConnectionCls': type('_TimedHTTPSConnection', (_TimedHTTPSConnection,), {'dns_cache': dns_cache}),
+        })
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': http_pool,
+            'https': https_pool,
+        }
+
+
+class _HTTPXResponse:
+    """httpxのレスポンスをrequests互換のインターフェースで包む"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.content
+        self.text = response.text
+        self.url = str(response.url)
+        self.elapsed = response.elapsed
+        self.ok = response.is_success
+        self.http_version = response.http_version
+
+    def json(self):
+        return self._response.json()
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    return len(body)
+
+
+class TransportStats:
+    """接続・TLS・TTFBの計測値を集計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_sessions_reused = 0
+        self.connect_ms_total = 0.0
+        self.tls_ms_total = 0.0
+        self.ttfb_ms_total = 0.0
+        self.ttfb_ms_max = 0.0
+        self.last: Dict[str, Any] = {}
+
+    def record(self, timings: Dict[str, Any]):
+        with self._lock:
+            self.requests += 1
+            if timings.get('connect_ms') is not None:
+                self.new_connections += 1
+                self.connect_ms_total += timings['connect_ms']
+            if timings.get('tls_ms') is not None:
+                self.tls_ms_total += timings['tls_ms']
+            if timings.get('tls_session_reused'):
+                self.tls_sessions_reused += 1
+            ttfb_ms = timings.get('ttfb_ms') or 0.0
+            self.ttfb_ms_total += ttfb_ms
+            self.ttfb_ms_max = max(self.ttfb_ms_max, ttfb_ms)
+            self.last = dict(timings)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            new_connections = self.new_connections or 1
+            requests_count = self.requests or 1
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'connection_reuse_ratio': round(1 - self.new_connections / requests_count, 3) if self.requests else None,
+                'tls_sessions_reused': self.tls_sessions_reused,
+                'avg_connect_ms': round(self.connect_ms_total / new_connections, 2),
+                'avg_tls_ms': round(self.tls_ms_total / new_connections, 2),
+                'avg_ttfb_ms': round(self.ttfb_ms_total / requests_count, 2),
+                'max_ttfb_ms': round(self.ttfb_ms_max, 2),
+                'last': self.last,
+            }
+
+
+class SAPTransport:
+    """SAP SuccessFactors向けのHTTPトランスポート
+
+    requestsの接続プール（デフォルト）またはhttpxのHTTP/2接続を使用して
+    リクエストを送信し、接続確立・TLS・TTFBの時間を記録します。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        http2: bool = False,
+        pool_maxsize: int = 10,
+        warmup_connections: int = 0,
+        keepalive_interval: int = 0,
+        dns_cache_ttl: int = 300
+    ):
+        """トランスポートの初期化
+
+        Args:
+            base_url: SAP APIのベースURL
+            http2: HTTP/2を使用するか（httpxとh2がインストールされている場合のみ有効）
+            pool_maxsize: ホストあたりの最大プール接続数
+            warmup_connections: ウォームアップで事前に開く接続数
+            keepalive_interval: 接続を温め直す間隔（秒、0で無効）
+            dns_cache_ttl: DNSキャッシュのTTL（秒、0で無効）
+        """
+        self.base_url = base_url
+        self.pool_maxsize = pool_maxsize
+        self.warmup_connections = warmup_connections
+        self.keepalive_interval = keepalive_interval
+        self.stats = TransportStats()
+        self.timings = RequestTimingRecorder()
+        self._keepalive_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        # DNSキャッシュはトランスポート（テナント）ごとに持つ
+        self.dns_cache = DNSCache(ttl=dns_cache_ttl)
+
+        self.headers = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json'
+        }
+
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested but httpx[http2] is not installed, falling back to HTTP/1.1")
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=pool_maxsize,
+                    max_keepalive_connections=pool_maxsize
+                )
+            )
+            self.session = None
+        else:
+            self._client = None
+            self.session = requests.Session()
+            self.session.headers.update(self.headers)
+            self._adapter = _TimedHTTPAdapter(dns_cache=self.dns_cache, pool_connections=4, pool_maxsize=pool_maxsize)
+            self.session.mount('https://', self._adapter)
+            self.session.mount('http://', self._adapter)
+
+        logger.info(
+            f"SAP transport initialized for {base_url} "
+            f"(http2={self.http2}, pool_maxsize={pool_maxsize})"
+        )
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 30,
+        body: Optional[bytes] = None
+    ):
+        """HTTPリクエストを送信
+
+        jsonの代わりにbodyを指定すると、そのままリクエストボディとして送信します
+        （Content-Typeはheadersで指定、$batchのmultipart等）。
+
+        Returns:
+            レスポンス（requests.Response互換）
+
+        Raises:
+            Timeout, ConnectionError, RequestException: 通信エラー
+        """
+        if self.http2:
+            return self._request_httpx(method, url, params, json, headers, timeout, body)
+
+        _pop_connect_timings()
+        started = time.perf_counter()
+        response = self.session.request(
+            method=method,
+            url=url,
+            params=params,
+            json=json,
+            data=body,
+            headers=headers,
+            timeout=timeout
+        )
+        total_ms = (time.perf_counter() - started) * 1000
+        timings = _pop_connect_timings()
+        timings['ttfb_ms'] = response.elapsed.total_seconds() * 1000
+        timings['body_ms'] = max(total_ms - timings['ttfb_ms'], 0.0)
+        timings['http_version'] = 'HTTP/1.1'
+        timings['request_bytes'] = _body_size(response.request.body)
+        timings['response_bytes'] = len(response.content)
+        response.timings = timings
+        self.stats.record(timings)
+        return response
+
+    def _request_httpx(self, method, url, params, json, headers, timeout, body=None):
+        timings: Dict[str, Any] = {'connect_ms': None, 'tls_ms': None, 'tls_session_reused': None}
+        marks: Dict[str, float] = {}
+
+        def trace(event_name, info):
+            marks[event_name] = time.perf_counter()
+
+        started = time.perf_counter()
+        try:
+            response = self._client.request(
+                method,
+                url,
+                params=params,
+                json=json,
+                content=body,
+                headers={**self.headers, **(headers or {})},
+                timeout=timeout,
+                extensions={'trace': trace}
+            )
+        except httpx.TimeoutException as e:
+            raise Timeout(str(e))
+        except httpx.ConnectError as e:
+            raise ConnectionError(str(e))
+        except httpx.HTTPError as e:
+            raise RequestException(str(e))
+
+        if 'connection.connect_tcp.complete' in marks:
+            timings['connect_ms'] = (marks['connection.connect_tcp.complete'] - marks['connection.connect_tcp.started']) * 1000
+        if 'connection.start_tls.complete' in marks:
+            timings['tls_ms'] = (marks['connection.start_tls.complete'] - marks['connection.start_tls.started']) * 1000
+        headers_done = next(
+            (value for key, value in marks.items() if key.endswith('receive_response_headers.complete')),
+            None
+        )
+        finished = time.perf_counter()
+        timings['ttfb_ms'] = ((headers_done or finished) - started) * 1000
+        timings['body_ms'] = (finished - (headers_done or finished)) * 1000
+        timings['http_version'] = response.http_version
+        timings['request_bytes'] = len(response.request.content)
+        timings['response_bytes'] = len(response.content)
+
+        wrapped = _HTTPXResponse(response)
+        wrapped.timings = timings
+        self.stats.record(timings)
+        return wrapped
+
+    def warm_up(self, connections: Optional[int] = None) -> Dict[str, Any]:
+        """接続を事前に確立してプールに格納
+
+        Args:
+            connections: 開く接続数（省略時は設定値）
+
+        Returns:
+            ウォームアップ結果
+        """
+        count = self.warmup_connections if connections is None else connections
+        if count <= 0:
+            return {'opened': 0, 'elapsed_ms': 0.0}
+
+        started = time.perf_counter()
+        if self.http2:
+            # HTTP/2は1本の接続で多重化するため、1回の軽量リクエストで十分
+            try:
+                self._client.head(self.base_url, timeout=10)
+                opened = 1
+            except httpx.HTTPError as e:
+                logger.warning(f"Connection warm-up failed: {str(e)}")
+                opened = 0
+        else:
+            try:
+                opened = self._warm_up_pool(min(count, self.pool_maxsize))
+            except Exception as e:
+                # ウォームアップの失敗で起動は止めない（最初のリクエストで接続する）
+                logger.warning(f"Connection warm-up failed: {str(e)}")
+                opened = 0
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Warmed up {opened} connection(s) to {self.base_url} in {elapsed_ms:.1f}ms")
+        return {'opened': opened, 'elapsed_ms': round(elapsed_ms, 2)}
+
+    def _warm_up_pool(self, count: int) -> int:
+        # 実際のリクエストと同じプールを使うため、環境変数（REQUESTS_CA_BUNDLE等）を反映したverifyを使用
+        verify = self.session.merge_environment_settings(self.base_url, {}, None, None, None)['verify']
+        prepared = requests.Request('HEAD', self.base_url).prepare()
+        pool = self._adapter.get_connection_with_tls_context(prepared, verify)
+        self._adapter.cert_verify(pool, self.base_url, verify, None)
+
+        # プール内の既存接続（切断済みのものは_get_connで破棄される）も含めて取り出す
+        conns: List[Any] = []
+        for _ in range(count):
+            conns.append(pool._get_conn())
+
+        errors: List[Exception] = []
+
+        def open_connection(conn):
+            if conn.sock is None:
+                try:
+                    conn.connect()
+                except Exception as e:
+                    errors.append(e)
+                    conn.close()
+
+        threads = [threading.Thread(target=open_connection, args=(conn,)) for conn in conns]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for conn in conns:
+            pool._put_conn(conn)
+
+        if errors:
+            logger.warning(f"Connection warm-up failed for {len(errors)} connection(s): {str(errors[0])}")
+        return len(conns) - len(errors)
+
+    def start_keepalive(self):
+        """接続を定期的に温め直すバックグラウンドスレッドを開始"""
+        if self.keepalive_interval <= 0 or self._keepalive_thread is not None:
+            return
+
+        def run():
+            while not self._stop_event.wait(self.keepalive_interval):
+                try:
+                    self.warm_up()
+                except Exception as e:
+                    logger.warning(f"Keep-alive warm-up failed: {str(e)}")
+
+        self._keepalive_thread = threading.Thread(target=run, name="sap-transport-keepalive", daemon=True)
+        self._keepalive_thread.start()
+
+    def close(self):
+        """接続を閉じる"""
+        self._stop_event.set()
+        if self._client is not None:
+            self._client.close()
+        if self.session is not None:
+            self.session.close()
+
+
+# グローバルトランスポートインスタンス
+_transport: Optional[SAPTransport] = None
+_transport_lock = threading.Lock()
+
+
+def create_transport(base_url: str) -> SAPTransport:
+    """設定値に従ってトランスポートを作成
+
+    Args:
+        base_url: SAP APIのベースURL
+
+    Returns:
+        新しいトランスポート
+    """
+    settings = get_settings()
+    if settings.sap_cassette_mode:
+        # 記録・再生モード（カセットモジュールがこのモジュールを参照するため遅延インポート）
+        from .cassette import wrap_transport
+        return wrap_transport(base_url, _create_network_transport)
+    return _create_network_transport(base_url)
+
+
+def _create_network_transport(base_url: str) -> SAPTransport:
+    settings = get_settings()
+    return SAPTransport(
+        base_url=base_url,
+        http2=settings.sap_http2_enabled,
+        pool_maxsize=settings.sap_pool_maxsize,
+        warmup_connections=settings.sap_warmup_connections,
+        keepalive_interval=settings.sap_keepalive_interval,
+        dns_cache_ttl=settings.sap_dns_cache_ttl
+    )
+
+
+def get_transport() -> SAPTransport:
+    """デフォルトテナントのトランスポートインスタンスを取得（シングルトンパターン）"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = create_transport(get_settings().sap_api_url)
+    return _transport
+
+# Made with Bob
@@ -0,0 +1,347 @@
+"""
+ユーザー検索インデックス
+同期したユーザーのスナップショットに対するプロセス内の転置インデックスで、
+部分的な名前・userId・メールアドレスによる検索をSuccessFactorsに問い合わせずに行います
+
+- 転置インデックス: トークン -> ユーザーID
+- 前方一致: ソート済みのトークン一覧に対する二分探索
+- あいまい一致: トークンのバイグラム -> トークン（Dice係数で類似度を計算）
+"""
+
+import bisect
+import gc
+import logging
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Set, Tuple, Iterable, TYPE_CHECKING
+
+from .records import UserRecord
+
+if TYPE_CHECKING:
+    from .sap_client import SAPSuccessFactorsClient
+
+logger = logging.getLogger(__name__)
+
+# インデックスの対象プロパティ（同期時の$select）
+INDEXED_FIELDS = ('userId', 'username', 'firstName', 'lastName', 'email')
+SYNC_FIELDS = INDEXED_FIELDS + ('status', 'lastModifiedDateTime')
+
+# 無効化されたユーザーのstatus値（インデックスから除外する）
+_INACTIVE_STATUSES = {'inactive', 'f'}
+
+# あいまい一致とみなす類似度（Dice係数）の下限
+FUZZY_THRESHOLD = 0.6
+
+# 同期の差分取得で、更新日時の境界を取りこぼさないよう遡る秒数
+_SYNC_OVERLAP_SECONDS = 60
+
+_TOKEN_SPLIT = re.compile(r'[\s._\-@,/]+')
+_ODATA_DATE_PATTERN = re.compile(r'^/Date\((-?\d+)(?:[+-]\d{4})?\)/$')
+
+
+def normalize(text: str) -> str:
+    """全角・半角、大文字・小文字の違いを吸収"""
+    return unicodedata.normalize('NFKC', text).casefold().strip()
+
+
+def _tokens(record: UserRecord) -> Set[str]:
+    tokens = set()
+    for field in INDEXED_FIELDS:
+        value = record.get(field)
+        if not isinstance(value, str) or not value:
+            continue
+        value = normalize(value)
+        tokens.add(value)
+        if field == 'email':
+            # ドメインは多くのユーザーで共通のため、アドレス全体とローカル部の単語のみをトークンにする
+            value = value.split('@', 1)[0]
+            tokens.add(value)
+        tokens.update(token for token in _TOKEN_SPLIT.split(value) if token)
+    return tokens
+
+
+def _bigrams(token: str) -> Set[str]:
+    padded = f"^{token}$"
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def _modified_millis(record: UserRecord) -> Optional[int]:
+    match = _ODATA_DATE_PATTERN.match(record.get('lastModifiedDateTime') or '')
+    return int(match.group(1)) if match else None
+
+
+class UserSearchIndex:
+    """ユーザーのスナップショットと検索用インデックス"""
+
+    def __init__(self, refresh_interval: float = 300, full_sync_interval: float = 86400, page_size: int = 1000):
+        """インデックスの初期化
+
+        Args:
+            refresh_interval: 差分同期を行う間隔（秒）
+            full_sync_interval: 全件を取り直す間隔（秒、削除されたユーザーの反映用）
+            page_size: 同期時の1ページあたりの取得件数
+        """
+        self.refresh_interval = refresh_interval
+        self.full_sync_interval = full_sync_interval
+        self.page_size = page_size
+        self._records: Dict[str, UserRecord] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._bigram_index: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._watermark: Optional[int] = None
+        self.synced_at: Optional[float] = None
+        self.full_synced_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.full_synced_at is not None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # インデックスの更新
+
+    def _add_token(self, token: str, user_id: str):
+        postings = self._postings.get(token)
+        if postings is None:
+            self._postings[token] = postings = set()
+            bisect.insort(self._vocabulary, token)
+            if '@' not in token:
+                for bigram in _bigrams(token):
+                    self._bigram_index.setdefault(bigram, set()).add(token)
+        postings.add(user_id)
+
+    def _remove_token(self, token: str, user_id: str):
+        postings = self._postings.get(token)
+        if postings is None:
+            return
+        postings.discard(user_id)
+        if postings:
+            return
+        del self._postings[token]
+        index = bisect.bisect_left(self._vocabulary, token)
+        if index < len(self._vocabulary) and self._vocabulary[index] == token:
+            del self._vocabulary[index]
+        for bigram in _bigrams(token) if '@' not in token else ():
+            tokens = self._bigram_index.get(bigram)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._bigram_index[bigram]
+
+    def put(self, record: UserRecord):
+        """ユーザーを追加・置き換え（無効化されたユーザーは削除）"""
+        if isinstance(record.status, str) and record.status.lower() in _INACTIVE_STATUSES:
+            self.remove(record.user_id)
+            return
+        with self._lock:
+            previous = self._records.get(record.user_id)
+            old_tokens = _tokens(previous) if previous is not None else set()
+            new_tokens = _tokens(record)
+            for token in old_tokens - new_tokens:
+                self._remove_token(token, record.user_id)
+            for token in new_tokens - old_tokens:
+                self._add_token(token, record.user_id)
+            self._records[record.user_id] = record
+
+    def remove(self, user_id: str):
+        with self._lock:
+            previous = self._records.pop(user_id, None)
+            if previous is None:
+                return
+            for token in _tokens(previous):
+                self._remove_token(token, user_id)
+
+    def apply(self, user_id: str, fields: Dict[str, Any]):
+        """書き込みの結果を反映（同期前は何もしない）"""
+        if not self.ready or not user_id:
+            return
+        with self._lock:
+            previous = self._records.get(user_id)
+            record = previous.merged(fields) if previous is not None else UserRecord.from_entity({**fields, 'userId': user_id})
+            self.put(record)
+
+    def _rebuild(self, records: Iterable[UserRecord]):
+        """全件の同期結果でインデックスを作り直す"""
+        new_records: Dict[str, UserRecord] = {}
+        postings: Dict[str, Set[str]] = {}
+        for record in records:
+            if isinstance(record.status, str) and record.status.lower() in _INACTIVE_STATUSES:
+                continue
+            new_records[record.user_id] = record
+            for token in _tokens(record):
+                postings.setdefault(token, set()).add(record.user_id)
+        vocabulary = sorted(postings)
+        bigram_index: Dict[str, Set[str]] = {}
+        for token in vocabulary:
+            if '@' in token:
+                continue
+            for bigram in _bigrams(token):
+                bigram_index.setdefault(bigram, set()).add(token)
+        with self._lock:
+            self._records = new_records
+            self._postings = postings
+            self._vocabulary = vocabulary
+            self._bigram_index = bigram_index
+
+    # 同期
+
+    def sync(self, client: "SAPSuccessFactorsClient", full: bool = False) -> Dict[str, Any]:
+        """SuccessFactorsからユーザーを同期
+
+        前回の同期以降に更新されたユーザーのみを取得し（lastModifiedDateTimeによる差分）、
+        初回とfull_sync_intervalごとには全件を取り直します。
+
+        Returns:
+            同期結果（mode: full / incremental、取得件数、所要時間）
+        """
+        with self._sync_lock:
+            started = time.perf_counter()
+            now = time.time()
+            full = full or not self.ready or now - self.full_synced_at > self.full_sync_interval
+            filter_query = None
+            if not full and self._watermark is not None:
+                since = datetime.fromtimestamp(self._watermark / 1000 - _SYNC_OVERLAP_SECONDS, timezone.utc)
+                filter_query = f"lastModifiedDateTime ge datetime'{since.strftime('%Y-%m-%dT%H:%M:%S')}'"
+
+            records = [
+                UserRecord.from_entity(user)
+                for user in client.iter_users(page_size=self.page_size, filter_query=filter_query, select=list(SYNC_FIELDS))
+            ]
+            modified = [millis for millis in map(_modified_millis, records) if millis is not None]
+            if modified:
+                self._watermark = max(modified + ([self._watermark] if self._watermark is not None else []))
+            if full:
+                self._rebuild(records)
+                # 作り直したインデックスの大量のオブジェクトに対する最初の世代別GCを、
+                # 検索中ではなく同期中に済ませておく
+                gc.collect()
+            else:
+                for record in records:
+                    self.put(record)
+
+            self.synced_at = now
+            if full:
+                self.full_synced_at = now
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            mode = 'full' if full else 'incremental'
+            logger.info(f"User index {mode} sync fetched {len(records)} user(s) in {elapsed_ms:.1f}ms ({len(self)} indexed)")
+            return {'mode': mode, 'fetched': len(records), 'indexed': len(self), 'elapsed_ms': round(elapsed_ms, 2)}
+
+    def ensure_fresh(self, client: "SAPSuccessFactorsClient"):
+        """未同期の場合は同期し、古い場合はバックグラウンドで差分同期を開始
+
+        差分同期の間も、検索は同期済みのインデックスで応答します。
+        """
+        if not self.ready:
+            self.sync(client)
+            return
+        if time.time() - self.synced_at <= self.refresh_interval or self._sync_lock.locked():
+            return
+
+        def refresh():
+            try:
+                self.sync(client)
+            except Exception as e:
+                logger.warning(f"User index refresh failed: {str(e)}")
+
+        threading.Thread(target=refresh, name="user-index-refresh", daemon=True).start()
+
+    # 検索
+
+    def _prefix_tokens(self, term: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, term)
+        end = bisect.bisect_left(self._vocabulary, term + '\uffff')
+        return self._vocabulary[start:end]
+
+    def _fuzzy_tokens(self, term: str) -> List[Tuple[str, float]]:
+        bigrams = _bigrams(term)
+        overlaps: Dict[str, int] = {}
+        for bigram in bigrams:
+            for token in self._bigram_index.get(bigram, ()):
+                overlaps[token] = overlaps.get(token, 0) + 1
+        matches = []
+        for token, overlap in overlaps.items():
+            similarity = 2 * overlap / (len(bigrams) + len(token) + 1)
+            if similarity >= FUZZY_THRESHOLD:
+                matches.append((token, similarity))
+        return matches
+
+    def _term_scores(self, term: str, fuzzy_below: int) -> Dict[str, float]:
+        """1つの検索語に一致したユーザーごとのスコア"""
+        scores: Dict[str, float] = {}
+
+        def add(token: str, score: float):
+            for user_id in self._postings.get(token, ()):
+                if score > scores.get(user_id, 0):
+                    scores[user_id] = score
+
+        add(term, 3.0)
+        for token in self._prefix_tokens(term):
+            if token != term:
+                add(token, 1.0 + len(term) / len(token))
+        # あいまい一致は完全一致・前方一致が少ない場合のみ行う（共通のバイグラムが多い語は候補が膨らむため）。
+        # 短い語はバイグラムの一致が偶然になりやすいため3文字以上に限り、ID等の数字を含む語は対象外とする
+        if len(scores) < fuzzy_below and len(term) >= 3 and '@' not in term and not any(ch.isdigit() for ch in term):
+            for token, similarity in self._fuzzy_tokens(term):
+                add(token, similarity)
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> Tuple[List[Tuple[UserRecord, float]], int]:
+        """ユーザーを検索
+
+        空白区切りの各語がいずれかのプロパティに一致するユーザー（AND）を、
+        完全一致 > 前方一致 > あいまい一致の順にスコア付けして返します。
+        あいまい一致は、完全一致・前方一致がlimit件に満たない語についてのみ探します。
+
+        Returns:
+            ([(レコード, スコア)], 一致した総件数)
+        """
+        normalized = normalize(query)
+        # メールアドレスは分割せずにアドレス全体（またはその前方）として検索する
+        terms = [
+            term
+            for part in normalized.split()
+            for term in ([part] if '@' in part else _TOKEN_SPLIT.split(part))
+            if term
+        ]
+        if not terms:
+            return [], 0
+
+        with self._lock:
+            totals: Optional[Dict[str, float]] = None
+            for term in terms:
+                scores = self._term_scores(term, fuzzy_below=max(limit, 1))
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {user_id: totals[user_id] + score for user_id, score in scores.items() if user_id in totals}
+                if not totals:
+                    return [], 0
+
+            # userId・username・メールアドレス全体との完全一致を最上位にする
+            for user_id in totals:
+                record = self._records[user_id]
+                if normalized in (normalize(record.user_id), normalize(record.username or ''), normalize(record.email or '')):
+                    totals[user_id] += 10.0
+
+            ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:max(limit, 0)]
+            return [(self._records[user_id], round(score, 3)) for user_id, score in ranked], len(totals)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'users': len(self._records),
+                'tokens': len(self._postings),
+                'synced_at': datetime.fromtimestamp(self.synced_at, timezone.utc).isoformat() if self.synced_at else None,
+                'age_seconds': round(time.time() - self.synced_at, 1) if self.synced_at else None
+            }
+
+# Made with Bob
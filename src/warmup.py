@@ -0,0 +1,133 @@
+"""
+起動時ウォームアップ
+デプロイ直後の最初のリクエストが接続確立・$metadata・権限グループの取得を待たないよう、
+起動時にこれらを並行に取得してキャッシュに格納します。
+完了するか制限時間を超えるまで、readinessは準備中（warming_up）として報告されます。
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+from .config.settings import get_settings
+from .sap_client import SAPSuccessFactorsClient
+from .tenants import get_client
+from .health import HealthMonitor
+
+logger = logging.getLogger(__name__)
+
+# 直近のウォームアップ結果
+_status: Optional[Dict[str, Any]] = None
+_status_lock = threading.Lock()
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _warm_up_tasks(client: SAPSuccessFactorsClient) -> List[Tuple[str, Callable[[], Any]]]:
+    settings = get_settings()
+    tasks: List[Tuple[str, Callable[[], Any]]] = [
+        ("connections", lambda: client.transport.warm_up()),
+    ]
+    if settings.warmup_metadata:
+        tasks.append(("metadata", lambda: {'bytes': len(client.get_metadata())}))
+    for group_id in _split(settings.warmup_groups):
+        tasks.append((f"group:{group_id}", lambda group_id=group_id: {'members': client.prefetch_group(group_id)}))
+    if settings.warmup_user_index:
+        tasks.append(("user_index", lambda: client.user_index.sync(client)))
+    for user_id in _split(settings.warmup_users):
+        tasks.append((f"user:{user_id}", lambda user_id=user_id: {'found': client.get_user(user_id) is not None}))
+    return tasks
+
+
+def _run_task(name: str, task: Callable[[], Any]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        detail = task()
+        return {'name': name, 'status': 'ok', 'elapsed_ms': round((time.perf_counter() - started) * 1000, 2), 'detail': detail}
+    except Exception as e:
+        logger.warning(f"Warm-up task {name} failed: {str(e)}")
+        return {'name': name, 'status': 'failed', 'elapsed_ms': round((time.perf_counter() - started) * 1000, 2), 'error': str(e)}
+
+
+def run_warm_up(client: Optional[SAPSuccessFactorsClient] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """ウォームアップを並行に実行
+
+    個々のタスクの失敗はウォームアップ全体を失敗させません（最初のリクエストで改めて取得されます）。
+    制限時間を超えたタスクは待たずに打ち切り、完了したタスクの結果のみを返します。
+
+    Args:
+        client: 対象のクライアント（省略時はデフォルトテナント）
+        timeout: 待つ最大秒数（省略時は設定値）
+
+    Returns:
+        ウォームアップ結果（status: completed / timed_out、タスクごとの結果）
+    """
+    settings = get_settings()
+    timeout = settings.warmup_timeout if timeout is None else timeout
+    client = client or get_client(None)
+    tasks = _warm_up_tasks(client)
+
+    logger.info(f"Starting warm-up with {len(tasks)} task(s) (timeout={timeout}s)")
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=min(len(tasks), 8), thread_name_prefix="sap-warmup")
+    futures = {executor.submit(_run_task, name, task): name for name, task in tasks}
+    done, not_done = wait(futures, timeout=timeout)
+    # 打ち切ったタスクは完了を待たない（完了した時点でキャッシュには格納される）
+    executor.shutdown(wait=False, cancel_futures=True)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    results = [future.result() for future in done]
+    results.extend({'name': futures[future], 'status': 'timed_out'} for future in not_done)
+    order = {name: index for index, (name, _) in enumerate(tasks)}
+    results.sort(key=lambda result: order[result['name']])
+
+    status = {
+        'status': 'timed_out' if not_done else 'completed',
+        'finished_at': datetime.now(timezone.utc).isoformat(),
+        'elapsed_ms': round(elapsed_ms, 2),
+        'tasks': results
+    }
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    logger.info(f"Warm-up {status['status']} in {elapsed_ms:.1f}ms ({len(results) - failed}/{len(results)} task(s) succeeded)")
+
+    global _status
+    with _status_lock:
+        _status = status
+    return status
+
+
+def start_warm_up(monitor: HealthMonitor) -> Optional[threading.Thread]:
+    """バックグラウンドでウォームアップを開始し、完了までreadinessを準備中とする
+
+    Returns:
+        ウォームアップを実行するスレッド（無効の場合はNone）
+    """
+    if not get_settings().warmup_enabled:
+        return None
+
+    monitor.begin_warm_up()
+
+    def run():
+        try:
+            run_warm_up()
+        except Exception as e:
+            logger.error(f"Warm-up crashed: {str(e)}")
+        finally:
+            monitor.end_warm_up()
+
+    thread = threading.Thread(target=run, name="sap-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_warm_up_status() -> Optional[Dict[str, Any]]:
+    """直近のウォームアップ結果（未実行の場合はNone）"""
+    with _status_lock:
+        return _status
+
+# Made with Bob
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+一括更新（$batchチェンジセット）のテスト
+チェンジセットの結果の対応付けと、失敗したチェンジセットを1件ずつ再送する処理を確認します
+SAP SuccessFactorsへの接続は不要です（pytestで実行）
+"""
+
+import json
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の必須項目（テナントには接続しない）
+os.environ.setdefault('SAP_API_URL', 'https://sf.example.com')
+os.environ.setdefault('SAP_COMPANY_ID', 'TESTCO')
+os.environ.setdefault('SAP_USER_ID', 'apiuser')
+os.environ.setdefault('SAP_PASSWORD', 'secret')
+
+import requests
+
+from src.concurrency import RateLimiter, create_bulkheads
+from src.sap_client import SAPSuccessFactorsClient, SAPAPIError
+from src.timing import RequestTimingRecorder
+from src.tools.bulk_operations import _update_chunk
+from src.transport import TransportStats
+
+CRLF = "\r\n"
+
+
+def _http_part(status: str, body: str = "") -> str:
+    return CRLF.join([
+        "Content-Type: application/http",
+        "Content-Transfer-Encoding: binary",
+        "",
+        f"HTTP/1.1 {status}",
+        "Content-Type: application/json",
+        "",
+        body,
+    ])
+
+
+def _batch(parts) -> str:
+    return CRLF.join([line for part in parts for line in ("--batch_1", part)] + ["--batch_1--", ""])
+
+
+def _changeset(statuses) -> str:
+    parts = CRLF.join(
+        [line for status in statuses for line in ("--changeset_1", _http_part(status))] + ["--changeset_1--", ""]
+    )
+    return f"Content-Type: multipart/mixed; boundary=changeset_1{CRLF}{CRLF}{parts}"
+
+
+def _error(message: str) -> str:
+    return json.dumps({'error': {'code': 'COE_GENERAL_BAD_REQUEST', 'message': {'lang': 'en-US', 'value': message}}})
+
+
+class FakeTransport:
+    """$batchに固定のマルチパートレスポンスを返すトランスポート"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.requests = []
+        self.stats = TransportStats()
+        self.timings = RequestTimingRecorder()
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        response = requests.Response()
+        response.status_code = 202
+        response.headers['Content-Type'] = 'multipart/mixed; boundary=batch_1'
+        response._content = self.content.encode('utf-8')
+        response.url = url
+        response.timings = {'ttfb_ms': 1.0}
+        return response
+
+
+def _client(content: str) -> SAPSuccessFactorsClient:
+    return SAPSuccessFactorsClient(
+        transport=FakeTransport(content),
+        rate_limiter=RateLimiter(0),
+        bulkheads=create_bulkheads(None)
+    )
+
+
+class FakeBulkClient:
+    """batch_merge_users・merge_userの呼び出しを記録するクライアント"""
+
+    def __init__(self, batch_results, failing=()):
+        self.batch_results = batch_results
+        self.failing = set(failing)
+        self.merged = []
+
+    def batch_merge_users(self, chunk):
+        if isinstance(self.batch_results, Exception):
+            raise self.batch_results
+        return [dict(result) for result in self.batch_results]
+
+    def merge_user(self, user_id, fields):
+        self.merged.append(user_id)
+        if user_id in self.failing:
+            raise SAPAPIError("ユーザー更新エラー: 400", status_code=400, response_data=_error("Invalid timeZone"))
+        return True
+
+
+CHUNK = [('u1', {'timeZone': 'Asia/Tokyo'}), ('u2', {'timeZone': 'Nowhere'}), ('u3', {'timeZone': 'UTC'})]
+
+
+def test_batch_merge_users_success():
+    """成功したチェンジセットの結果が更新と同じ順序で対応付けられること"""
+    client = _client(_batch([_changeset(["204 No Content", "204 No Content"])]))
+    results = client.batch_merge_users(CHUNK[:2])
+    assert [result['userId'] for result in results] == ['u1', 'u2']
+    assert all(result['success'] and not result['changeset_failed'] for result in results)
+
+    method, url, kwargs = client.transport.requests[0]
+    assert (method, url) == ('POST', 'https://sf.example.com/odata/v2/$batch')
+    assert b"MERGE User('u2') HTTP/1.1" in kwargs['body']
+
+
+def test_batch_merge_users_failed_changeset():
+    """チェンジセット全体が失敗した場合は全件がchangeset_failedになること"""
+    client = _client(_batch([_http_part("400 Bad Request", _error("Invalid timeZone"))]))
+    results = client.batch_merge_users(CHUNK)
+    assert len(results) == 3
+    assert all(result['changeset_failed'] and not result['success'] for result in results)
+    assert {result['error'] for result in results} == {"Invalid timeZone"}
+    assert {result['status_code'] for result in results} == {400}
+
+
+def test_update_chunk_success_drops_changeset_flag():
+    """チェンジセットが成功した場合は再送せず、changeset_failedを結果から除くこと"""
+    client = FakeBulkClient([
+        {'userId': user_id, 'success': True, 'status_code': 204, 'error': None, 'changeset_failed': False}
+        for user_id, _ in CHUNK
+    ])
+    results = _update_chunk(client, CHUNK)
+    assert client.merged == []
+    assert all(result['success'] and 'changeset_failed' not in result for result in results)
+
+
+def test_update_chunk_retries_failed_changeset_individually():
+    """失敗したチェンジセットは1件ずつ再送し、失敗した更新だけが失敗になること"""
+    client = FakeBulkClient(
+        [
+            {'userId': user_id, 'success': False, 'status_code': 400, 'error': 'Invalid timeZone', 'changeset_failed': True}
+            for user_id, _ in CHUNK
+        ],
+        failing={'u2'}
+    )
+    results = _update_chunk(client, CHUNK)
+    assert client.merged == ['u1', 'u2', 'u3']
+    assert [result['userId'] for result in results] == ['u1', 'u2', 'u3']
+    assert [result['success'] for result in results] == [True, False, True]
+    assert all(result['retried'] for result in results)
+    assert results[1]['status_code'] == 400
+    assert 'Invalid timeZone' in results[1]['error']
+
+
+def test_update_chunk_single_update_is_not_retried():
+    """1件だけのチェンジセットの失敗は再送しないこと"""
+    client = FakeBulkClient([
+        {'userId': 'u2', 'success': False, 'status_code': 400, 'error': 'Invalid timeZone', 'changeset_failed': True}
+    ])
+    results = _update_chunk(client, CHUNK[1:2])
+    assert client.merged == []
+    assert results[0]['success'] is False and results[0]['error'] == 'Invalid timeZone'
+
+
+def test_update_chunk_batch_request_error():
+    """$batchリクエスト自体が失敗した場合は全件が失敗になること"""
+    client = FakeBulkClient(SAPAPIError("$batchエラー: 503", status_code=503))
+    results = _update_chunk(client, CHUNK)
+    assert client.merged == []
+    assert [result['status_code'] for result in results] == [503, 503, 503]
+    assert not any(result['success'] for result in results)
+
+# Made with Bob
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+カセット（通信の記録・再生）のテスト
+記録したカセットに個人情報・メンバーIDが平文で残らないこと、記録したカセットを再生できることを確認します
+SAP SuccessFactorsへの接続は不要です（pytestで実行）
+"""
+
+import json
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の必須項目（テナントには接続しない）
+os.environ.setdefault('SAP_API_URL', 'https://sf.example.com')
+os.environ.setdefault('SAP_COMPANY_ID', 'TESTCO')
+os.environ.setdefault('SAP_USER_ID', 'apiuser')
+os.environ.setdefault('SAP_PASSWORD', 'secret')
+
+import requests
+
+from src.cassette import RecordingTransport, ReplayTransport, Redactor, _request_key
+from src.config.settings import get_settings
+from src.concurrency import RateLimiter, create_bulkheads
+from src.sap_client import SAPSuccessFactorsClient
+from src.timing import RequestTimingRecorder
+from src.transport import TransportStats
+
+MEMBERS = ["taro.yamada", "hanako.suzuki", "jiro.sato"]
+
+
+def _group_response():
+    values = [
+        {'filters': {'results': [{'expressions': {'results': [{'values': {'results': [{'fieldValue': member}]}}]}}]}}
+        for member in MEMBERS
+    ]
+    return {'d': {'groupName': 'IBM管理者用権限グループ', 'dgIncludePools': {'results': values}}}
+
+
+class FakeTransport:
+    """記録対象の実トランスポートの代わりに固定のレスポンスを返す"""
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.stats = TransportStats()
+        self.timings = RequestTimingRecorder()
+
+    def request(self, method, url, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(self.payload).encode('utf-8')
+        response.url = url
+        response.timings = {'ttfb_ms': 1.0}
+        return response
+
+
+def _client(transport):
+    return SAPSuccessFactorsClient(
+        transport=transport,
+        rate_limiter=RateLimiter(0),
+        bulkheads=create_bulkheads(None)
+    )
+
+
+def _redactor():
+    fields = get_settings().sap_cassette_redact_fields.split(',')
+    return Redactor(field.strip() for field in fields if field.strip())
+
+
+def test_dynamic_group_cassette_has_no_raw_member_ids(tmp_path):
+    """Dynamic Groupのメンバー取得を記録・再生し、カセットにメンバーIDが残らないこと"""
+    path = str(tmp_path / "group.jsonl")
+    recorder = RecordingTransport(FakeTransport(_group_response()), path, _redactor())
+    recorded = _client(recorder).get_dynamic_group_members("8526")
+    assert recorded == MEMBERS
+
+    with open(path, encoding='utf-8') as f:
+        cassette = f.read()
+    for member in MEMBERS:
+        assert member not in cassette
+    assert "secret" not in cassette
+
+    replayed = _client(ReplayTransport(path, latency_scale=0)).get_dynamic_group_members("8526")
+    assert len(replayed) == len(MEMBERS)
+    assert all(member.startswith("redacted-") for member in replayed)
+    assert replayed == [_redactor().pseudonym(member) for member in MEMBERS]
+
+
+def test_upsert_body_redacts_user_id_and_metadata_uri():
+    """upsertのボディのuserIdと__metadata.uriのキー述語が仮名になること"""
+    body = {
+        '__metadata': {'uri': "User('taro.yamada')", 'type': 'SFOData.User'},
+        'userId': 'taro.yamada',
+        'email': 'taro@example.com',
+        'status': 'active'
+    }
+    redacted = json.dumps(_redactor().redact(body), ensure_ascii=False)
+    assert 'taro' not in redacted
+    assert 'SFOData.User' in redacted and 'active' in redacted
+
+
+def test_request_key_uses_same_pseudonym_as_body():
+    """キー述語の値はボディと同じ仮名になり、仮名でのリクエストも同じキーになること"""
+    redactor = _redactor()
+    key = _request_key('GET', "https://sf.example.com/odata/v2/User('taro.yamada')", {'$format': 'json'})
+    assert 'taro' not in key
+    assert redactor.pseudonym('taro.yamada') in key
+
+    pseudonym = redactor.pseudonym('taro.yamada')
+    assert _request_key('GET', f"https://sf.example.com/odata/v2/User('{pseudonym}')", {'$format': 'json'}) == key
+
+
+def test_filter_literals_are_masked():
+    """$filterの文字列リテラル（userId in ...、エスケープした'を含む値）が仮名になること"""
+    key = _request_key(
+        'GET',
+        "https://sf.example.com/odata/v2/User",
+        {'$filter': "userId in 'a.b','o''neil' and email eq 'x@example.com'"}
+    )
+    assert 'a.b' not in key and 'neil' not in key and 'example.com' not in key
+    assert key.count('redacted-') == 3
+
+# Made with Bob
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OData v2 $batchの構築・解析のテスト
+チェンジセットの構築と、成功・失敗・入れ子のレスポンスの解析を確認します
+SAP SuccessFactorsへの接続は不要です（pytestで実行）
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.odata_batch import build_changeset_batch, parse_batch_response, error_message, _boundary
+
+CRLF = "\r\n"
+
+
+def _http_part(status: str, body: str = "") -> str:
+    lines = [
+        "Content-Type: application/http",
+        "Content-Transfer-Encoding: binary",
+        "",
+        f"HTTP/1.1 {status}",
+        "Content-Type: application/json;charset=utf-8",
+        "",
+        body,
+    ]
+    return CRLF.join(lines)
+
+
+def _multipart(boundary: str, parts) -> str:
+    lines = []
+    for part in parts:
+        lines.extend([f"--{boundary}", part])
+    lines.extend([f"--{boundary}--", ""])
+    return CRLF.join(lines)
+
+
+def _changeset_part(boundary: str, parts) -> str:
+    return f"Content-Type: multipart/mixed; boundary={boundary}{CRLF}{CRLF}" + _multipart(boundary, parts)
+
+
+def _error_body(message: str) -> str:
+    return json.dumps({'error': {'code': 'COE_GENERAL_BAD_REQUEST', 'message': {'lang': 'en-US', 'value': message}}})
+
+
+def test_build_changeset_batch():
+    """操作ごとにContent-IDとリクエスト行を持つ1つのチェンジセットが作られること"""
+    body, content_type = build_changeset_batch([
+        {'method': 'MERGE', 'url': "User('u1')", 'body': {'timeZone': 'Asia/Tokyo'}},
+        {'method': 'MERGE', 'url': "User('u2')", 'body': {'firstName': '太郎'}},
+    ])
+    text = body.decode('utf-8')
+    batch_boundary = _boundary(content_type)
+    assert content_type.startswith("multipart/mixed")
+    assert text.startswith(f"--{batch_boundary}\r\n")
+    assert text.rstrip().endswith(f"--{batch_boundary}--")
+
+    changeset_boundary = text.split("boundary=", 1)[1].split(CRLF, 1)[0]
+    assert changeset_boundary != batch_boundary
+    assert text.count(f"--{changeset_boundary}\r\n") == 2
+    assert "Content-ID: 1" in text and "Content-ID: 2" in text
+    assert "MERGE User('u1') HTTP/1.1" in text
+    assert "MERGE User('u2') HTTP/1.1" in text
+    assert '{"firstName": "太郎"}' in text
+
+
+def test_parse_successful_changeset():
+    """成功したチェンジセットは操作ごとの結果のリストになること"""
+    content = _multipart("batch_1", [
+        _changeset_part("changeset_1", [_http_part("204 No Content"), _http_part("204 No Content")])
+    ])
+    parts = parse_batch_response(content.encode('utf-8'), "multipart/mixed; boundary=batch_1")
+    assert parts == [[{'status_code': 204, 'body': ''}, {'status_code': 204, 'body': ''}]]
+
+
+def test_parse_failed_changeset():
+    """失敗したチェンジセットはチェンジセット全体に対する単一のエラーになること"""
+    content = _multipart("batch_1", [_http_part("400 Bad Request", _error_body("Invalid timeZone"))])
+    parts = parse_batch_response(content.encode('utf-8'), 'multipart/mixed; boundary="batch_1"')
+    assert len(parts) == 1
+    assert isinstance(parts[0], dict)
+    assert parts[0]['status_code'] == 400
+    assert error_message(parts[0]['body']) == "Invalid timeZone"
+
+
+def test_parse_nested_changeset_and_query():
+    """チェンジセットと単独のリクエストが混在するレスポンスを順に解析できること"""
+    user = json.dumps({'d': {'userId': 'u1'}})
+    content = _multipart("batch_1", [
+        _changeset_part("changeset_1", [_http_part("201 Created", user), _http_part("204 No Content")]),
+        _http_part("200 OK", user),
+    ])
+    parts = parse_batch_response(content.encode('utf-8'), "multipart/mixed; boundary=batch_1")
+    assert len(parts) == 2
+    changeset, query = parts
+    assert [part['status_code'] for part in changeset] == [201, 204]
+    assert json.loads(changeset[0]['body']) == {'d': {'userId': 'u1'}}
+    assert query == {'status_code': 200, 'body': user}
+
+
+def test_parse_without_boundary():
+    """boundaryのないContent-TypeはValueErrorになること"""
+    with pytest.raises(ValueError):
+        parse_batch_response(b"", "application/json")
+
+# Made with Bob
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SAP APIクライアントのユーザー取得のテスト
+ユーザーIDの分割（$filterの長さの上限）とページングのリクエストを確認します
+SAP SuccessFactorsへの接続は不要です（pytestで実行）
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の必須項目（テナントには接続しない）
+os.environ.setdefault('SAP_API_URL', 'https://sf.example.com')
+os.environ.setdefault('SAP_COMPANY_ID', 'TESTCO')
+os.environ.setdefault('SAP_USER_ID', 'apiuser')
+os.environ.setdefault('SAP_PASSWORD', 'secret')
+
+import requests
+
+from src.concurrency import RateLimiter, create_bulkheads
+from src.sap_client import SAPSuccessFactorsClient, SAPAPIError, _odata_string
+from src.timing import RequestTimingRecorder
+from src.transport import TransportStats
+
+
+class FakeTransport:
+    """リクエストを記録し、用意したJSONレスポンスを順に返すトランスポート"""
+
+    def __init__(self, payloads=()):
+        self.payloads = list(payloads)
+        self.requests = []
+        self.stats = TransportStats()
+        self.timings = RequestTimingRecorder()
+
+    def request(self, method, url, params=None, **kwargs):
+        self.requests.append((method, url, params))
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(self.payloads.pop(0)).encode('utf-8')
+        response.url = url
+        response.timings = {'ttfb_ms': 1.0}
+        return response
+
+
+def _client(payloads=(), filter_max_chars=None) -> SAPSuccessFactorsClient:
+    client = SAPSuccessFactorsClient(
+        transport=FakeTransport(payloads),
+        rate_limiter=RateLimiter(0),
+        bulkheads=create_bulkheads(None)
+    )
+    if filter_max_chars is not None:
+        client.settings = client.settings.model_copy(update={'sap_filter_max_chars': filter_max_chars})
+    return client
+
+
+def _filter_of(chunk):
+    return "userId in " + ",".join(_odata_string(user_id) for user_id in chunk)
+
+
+def test_user_id_chunks_respect_filter_length():
+    """各チャンクの$filterが上限の文字数以内で、順序と件数が保たれること"""
+    user_ids = [f"user{index:04d}" for index in range(200)] + ["o'neil", "ユーザー", "x" * 40]
+    client = _client(filter_max_chars=120)
+    chunks = client._user_id_chunks(user_ids, chunk_size=100)
+
+    assert [user_id for chunk in chunks for user_id in chunk] == user_ids
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(_filter_of(chunk)) <= 120
+    # 上限まで詰めている（次のIDを加えると上限を超える）
+    for chunk, following in zip(chunks, chunks[1:]):
+        assert len(_filter_of(chunk + following[:1])) >= 120
+
+
+def test_user_id_chunks_respect_chunk_size():
+    """文字数に余裕がある場合はchunk_size件ずつに分割されること"""
+    user_ids = [f"u{index}" for index in range(25)]
+    chunks = _client(filter_max_chars=10000)._user_id_chunks(user_ids, chunk_size=10)
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+
+
+def test_user_id_chunks_oversized_id():
+    """上限を超える長さのIDも単独のチャンクとして取得対象に残ること"""
+    user_ids = ["a", "b" * 50, "c"]
+    chunks = _client(filter_max_chars=30)._user_id_chunks(user_ids, chunk_size=100)
+    assert chunks == [["a"], ["b" * 50], ["c"]]
+
+
+def test_iter_user_pages_orders_and_follows_next():
+    """スナップショットページングのリクエストが順序を固定し、完全なURLの__nextを辿ること"""
+    next_link = "https://sf.example.com/odata/v2/User?$skiptoken=abc&paging=snapshot"
+    client = _client([
+        {'d': {'results': [{'userId': 'u1'}, {'userId': 'u2'}], '__next': next_link}},
+        {'d': {'results': [{'userId': 'u3'}]}},
+    ])
+    pages = list(client.iter_user_pages(page_size=2))
+
+    assert pages == [[{'userId': 'u1'}, {'userId': 'u2'}], [{'userId': 'u3'}]]
+    (_, first_url, first_params), (_, second_url, second_params) = client.transport.requests
+    assert first_url == "https://sf.example.com/odata/v2/User"
+    assert first_params['$orderby'] == 'userId' and first_params['paging'] == 'snapshot'
+    assert second_url == next_link and second_params is None
+
+
+def test_iter_user_pages_skip_fallback_is_ordered():
+    """__nextが返されない場合の$skipによるページングも順序を固定すること"""
+    client = _client([
+        {'d': {'results': [{'userId': 'u1'}, {'userId': 'u2'}]}},
+        {'d': {'results': [{'userId': 'u3'}]}},
+    ])
+    assert len(list(client.iter_user_pages(page_size=2))) == 2
+    _, _, params = client.transport.requests[1]
+    assert params['$orderby'] == 'userId' and params['$skip'] == 2 and params['$top'] == 2
+
+
+def test_iter_user_pages_rejects_foreign_next_link():
+    """接続先と異なるホストの__nextには認証情報を送らずエラーとすること"""
+    client = _client([
+        {'d': {'results': [{'userId': 'u1'}], '__next': "https://other.example.com/odata/v2/User?$skiptoken=abc"}},
+    ])
+    with pytest.raises(SAPAPIError):
+        list(client.iter_user_pages(page_size=1))
+    assert len(client.transport.requests) == 1
+
+# Made with Bob
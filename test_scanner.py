@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+パーティション並列スキャンのテスト
+userIdの区間の分割が隙間・重複なくキー空間を覆うことを確認します
+SAP SuccessFactorsへの接続は不要です（pytestで実行）
+"""
+
+import os
+import sys
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 設定の必須項目（テナントには接続しない）
+os.environ.setdefault('SAP_API_URL', 'https://sf.example.com')
+os.environ.setdefault('SAP_COMPANY_ID', 'TESTCO')
+os.environ.setdefault('SAP_USER_ID', 'apiuser')
+os.environ.setdefault('SAP_PASSWORD', 'secret')
+
+from src.scanner import DEFAULT_ALPHABET, UserPartition
+
+# 分割に使う文字以外（大文字・記号・空文字・非ASCII）も含むuserId
+USER_IDS = [
+    "", "0", "00042", "1", "9zz", "a", "a0", "a_b", "aa", "admin", "az", "b", "b.c", "ba",
+    "m", "sfadmin", "taro.yamada", "z", "zz", "zzz9", "A", "Admin", "_system", "-1", "~", "ユーザー", "é"
+]
+
+
+def _contains(partition: UserPartition, user_id: str) -> bool:
+    return (partition.lower is None or user_id >= partition.lower) \
+        and (partition.upper is None or user_id < partition.upper)
+
+
+def _assert_exact_cover(parent: UserPartition, children):
+    for child in children:
+        assert child.depth == parent.depth + 1
+    for user_id in USER_IDS:
+        if _contains(parent, user_id):
+            assert sum(_contains(child, user_id) for child in children) == 1, user_id
+        else:
+            assert not any(_contains(child, user_id) for child in children), user_id
+
+
+def test_split_root_covers_all_user_ids():
+    """全体の区間の分割が各userIdをちょうど1つの子パーティションに含むこと"""
+    root = UserPartition()
+    children = root.split(DEFAULT_ALPHABET)
+    assert len(children) == len(DEFAULT_ALPHABET) + 1
+    assert children[0].lower is None and children[-1].upper is None
+    for left, right in zip(children, children[1:]):
+        assert left.upper == right.lower
+    _assert_exact_cover(root, children)
+
+
+def test_split_bounded_partition_covers_range():
+    """上限・下限のある区間を再分割しても元の区間と一致すること"""
+    parent = UserPartition("a", "b", depth=1)
+    children = parent.split(DEFAULT_ALPHABET)
+    assert children[0].lower == "a" and children[-1].upper == "b"
+    _assert_exact_cover(parent, children)
+
+    for child in children:
+        grandchildren = child.split(DEFAULT_ALPHABET)
+        if grandchildren:
+            _assert_exact_cover(child, grandchildren)
+
+
+def test_split_respects_upper_bound():
+    """上限を超える境界は使わないこと"""
+    parent = UserPartition("m", "m5")
+    children = parent.split(DEFAULT_ALPHABET)
+    assert [child.lower for child in children] == ["m", "m0", "m1", "m2", "m3", "m4"]
+    assert children[-1].upper == "m5"
+    _assert_exact_cover(parent, children)
+
+
+def test_split_without_bounds_inside_range():
+    """区間内に境界を置けない場合は分割しないこと"""
+    assert UserPartition("a", "a0").split(DEFAULT_ALPHABET) == []
+
+
+def test_to_filter_combines_base_filter():
+    """区間の条件がベースのフィルタとAND結合され、引用符がエスケープされること"""
+    partition = UserPartition("o'neil", "p")
+    assert partition.to_filter("status eq 'active'") == \
+        "(status eq 'active') and userId ge 'o''neil' and userId lt 'p'"
+    assert UserPartition().to_filter() is None
+
+# Made with Bob